@@ -0,0 +1,253 @@
+# admission.py
+# Controle de admissão: limite adaptativo de concorrência (AIMD), orçamento de fila e descarte de carga
+
+import functools
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+from flask import Response, g, has_request_context, request
+
+import metrics
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1").lower() not in ("0", "false", "no")
+# Requisições simultâneas por worker: valor inicial e faixa em que o AIMD pode ajustá-lo
+ADMISSION_INITIAL_LIMIT = float(os.getenv("ADMISSION_INITIAL_LIMIT", "16"))
+ADMISSION_MIN_LIMIT = float(os.getenv("ADMISSION_MIN_LIMIT", "2"))
+ADMISSION_MAX_LIMIT = float(os.getenv("ADMISSION_MAX_LIMIT", "256"))
+# Latência acima da qual o limite é reduzido (multiplicado por ADMISSION_BACKOFF)
+ADMISSION_TARGET_LATENCY_MS = float(os.getenv("ADMISSION_TARGET_LATENCY_MS", "300"))
+ADMISSION_BACKOFF = float(os.getenv("ADMISSION_BACKOFF", "0.9"))
+# Tempo máximo de espera, somando a fila do proxy (X-Request-Start) e a espera por uma vaga aqui
+ADMISSION_QUEUE_BUDGET_MS = float(os.getenv("ADMISSION_QUEUE_BUDGET_MS", "250"))
+# Ocupação (em andamento / limite) a partir da qual as requisições admitidas são degradadas
+ADMISSION_DEGRADE_RATIO = float(os.getenv("ADMISSION_DEGRADE_RATIO", "0.75"))
+# Quanto tempo o envio de logs fica suspenso após uma requisição degradada
+ADMISSION_DEFER_LOG_SECONDS = float(os.getenv("ADMISSION_DEFER_LOG_SECONDS", "10"))
+ADMISSION_RETRY_AFTER_MAX = int(os.getenv("ADMISSION_RETRY_AFTER_MAX", "30"))
+# Só desconta a fila do proxy se ele sobrescrever X-Request-Start; sem proxy, o cabeçalho vem do cliente
+ADMISSION_TRUST_REQUEST_START = os.getenv("ADMISSION_TRUST_REQUEST_START", "0").lower() in ("1", "true", "yes")
+
+# Peso da última medida na média móvel de latência
+_EWMA = 0.2
+# Espera no proxy acima disso não é plausível (relógio dessincronizado ou cabeçalho forjado) e é ignorada
+_ESPERA_PROXY_MAXIMA = 60.0
+
+
+class Permissao(NamedTuple):
+    """Vaga concedida a uma requisição; `degradado` pede o modo econômico (sem coleta de hardware e logs adiados)."""
+
+    inicio: float
+    degradado: bool
+
+
+class Rejeicao(NamedTuple):
+    motivo: str
+    retry_after: int
+
+
+class AdmissionController:
+    """
+    Limite de concorrência adaptativo por processo.
+    Uma requisição entra se houver vaga; senão espera uma vaga pelo que resta do
+    orçamento de fila (descontado o tempo já passado na fila do proxy) e, esgotado
+    o orçamento, é recusada. Com o limite quase ocupado, ou depois de esperar, ela
+    entra degradada.
+    O limite segue AIMD: cada conclusão abaixo da latência-alvo, com o limite em uso,
+    soma 1/limite (cerca de +1 por "janela" de requisições); uma conclusão acima do alvo
+    ou uma recusa por falta de vaga multiplica o limite por ADMISSION_BACKOFF, no máximo uma
+    vez por intervalo de latência-alvo. Recusas pela fila do proxy não mexem no limite: a
+    espera foi medida fora daqui e não diz nada sobre a concorrência deste worker.
+    O Retry-After vem da lei de Little: tempo para escoar as requisições em andamento
+    e na fila com a vazão atual (limite / latência média).
+    """
+
+    def __init__(
+        self,
+        limite_inicial: float = ADMISSION_INITIAL_LIMIT,
+        limite_minimo: float = ADMISSION_MIN_LIMIT,
+        limite_maximo: float = ADMISSION_MAX_LIMIT,
+        latencia_alvo: float = ADMISSION_TARGET_LATENCY_MS / 1000,
+        orcamento_fila: float = ADMISSION_QUEUE_BUDGET_MS / 1000,
+        razao_degradacao: float = ADMISSION_DEGRADE_RATIO,
+        backoff: float = ADMISSION_BACKOFF,
+    ) -> None:
+        self.limite_minimo = limite_minimo
+        self.limite_maximo = limite_maximo
+        self.limite = min(max(limite_inicial, limite_minimo), limite_maximo)
+        self.latencia_alvo = latencia_alvo
+        self.orcamento_fila = orcamento_fila
+        self.razao_degradacao = razao_degradacao
+        self.backoff = backoff
+
+        self._cond = threading.Condition(threading.Lock())
+        self.em_andamento = 0
+        self.aguardando = 0
+        self.latencia_media = latencia_alvo / 2
+        self._ultima_reducao = 0.0
+
+    # ------------------------------------------------------------------ decisões
+    def entrar(self, espera_externa: float = 0.0) -> "Permissao | Rejeicao":
+        """Pede uma vaga; `espera_externa` é o tempo (s) que a requisição já passou na fila do proxy."""
+        agora = time.monotonic()
+        restante = self.orcamento_fila - espera_externa
+        with self._cond:
+            if restante <= 0:
+                return Rejeicao("fila_proxy", self._retry_after())
+
+            esperou = False
+            if self.em_andamento >= int(self.limite):
+                esperou = True
+                prazo = agora + restante
+                self.aguardando += 1
+                try:
+                    while self.em_andamento >= int(self.limite):
+                        falta = prazo - time.monotonic()
+                        if falta <= 0:
+                            self._reduzir(time.monotonic())
+                            return Rejeicao("limite", self._retry_after())
+                        self._cond.wait(falta)
+                finally:
+                    self.aguardando -= 1
+
+            self.em_andamento += 1
+            degradado = (
+                esperou
+                or espera_externa > self.orcamento_fila / 2
+                or self.em_andamento > self.limite * self.razao_degradacao
+            )
+        if esperou:
+            metrics.ADMISSION_QUEUE_SECONDS.observe(time.monotonic() - agora)
+        return Permissao(time.monotonic(), degradado)
+
+    def sair(self, permissao: Permissao) -> None:
+        """Libera a vaga e ajusta o limite pela latência da requisição."""
+        agora = time.monotonic()
+        latencia = agora - permissao.inicio
+        with self._cond:
+            em_uso = self.em_andamento >= self.limite / 2
+            self.em_andamento -= 1
+            self.latencia_media += _EWMA * (latencia - self.latencia_media)
+            if latencia > self.latencia_alvo:
+                self._reduzir(agora)
+            elif em_uso:
+                # Só cresce quando o limite está sendo usado: ociosidade não é sinal de folga
+                self.limite = min(self.limite_maximo, self.limite + 1 / self.limite)
+            self._cond.notify()
+
+    def _reduzir(self, agora: float) -> None:
+        # Uma redução por intervalo de latência-alvo: uma rajada de respostas lentas conta como um sinal só
+        if agora - self._ultima_reducao >= self.latencia_alvo:
+            self.limite = max(self.limite_minimo, self.limite * self.backoff)
+            self._ultima_reducao = agora
+
+    def _retry_after(self) -> int:
+        vazao = self.limite / max(self.latencia_media, 1e-3)
+        segundos = (self.em_andamento + self.aguardando) / vazao
+        return int(min(ADMISSION_RETRY_AFTER_MAX, max(1, math.ceil(segundos))))
+
+    def estado(self) -> Dict[str, float]:
+        with self._cond:
+            return {
+                "limite": round(self.limite, 2),
+                "em_andamento": self.em_andamento,
+                "aguardando": self.aguardando,
+                "latencia_media_ms": round(self.latencia_media * 1000, 1),
+            }
+
+
+def espera_no_proxy(cabecalho: Optional[str], agora: Optional[float] = None) -> float:
+    """
+    Tempo (s) desde `X-Request-Start`, gravado pelo proxy na chegada da requisição
+    (nginx: `proxy_set_header X-Request-Start "t=${msec}";`). Aceita segundos,
+    milissegundos ou microssegundos desde a época; ausente, inválido, no futuro ou
+    acima de _ESPERA_PROXY_MAXIMA conta como 0.
+    """
+    if not cabecalho:
+        return 0.0
+    valor = cabecalho.strip()
+    if valor.startswith("t="):
+        valor = valor[2:]
+    try:
+        inicio = float(valor)
+    except ValueError:
+        return 0.0
+    if not math.isfinite(inicio):
+        return 0.0
+    if inicio > 1e14:
+        inicio /= 1e6
+    elif inicio > 1e11:
+        inicio /= 1e3
+    espera = (agora if agora is not None else time.time()) - inicio
+    return espera if 0.0 < espera <= _ESPERA_PROXY_MAXIMA else 0.0
+
+
+_controlador: Optional[AdmissionController] = None
+_controlador_lock = threading.Lock()
+
+
+def obter_controlador() -> AdmissionController:
+    """Controlador do processo (cada worker do gunicorn tem o seu)."""
+    global _controlador
+    if _controlador is None:
+        with _controlador_lock:
+            if _controlador is None:
+                _controlador = AdmissionController()
+    return _controlador
+
+
+def degradado() -> bool:
+    """True se a requisição atual foi admitida em modo degradado."""
+    return has_request_context() and bool(g.get("admissao_degradada", False))
+
+
+def controlar(rota: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Decorador de view: admite, degrada ou recusa (503 + Retry-After) a requisição.
+    A decisão é contada em hwdiag_admission_decisions_total{rota, decisao}.
+    """
+
+    def decorador(view: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(view)
+        def envolvida(*args: Any, **kwargs: Any) -> Any:
+            if not ADMISSION_ENABLED:
+                return view(*args, **kwargs)
+            controlador = obter_controlador()
+            espera = espera_no_proxy(request.headers.get("X-Request-Start")) if ADMISSION_TRUST_REQUEST_START else 0.0
+            decisao = controlador.entrar(espera)
+            if isinstance(decisao, Rejeicao):
+                metrics.ADMISSION_DECISIONS.inc(rota=rota, decisao="rejeitado")
+                metrics.ADMISSION_REJECTED.inc(rota=rota, motivo=decisao.motivo)
+                resposta = Response(
+                    f"Servidor sobrecarregado. Tente novamente em {decisao.retry_after} s.\n",
+                    status=503,
+                    mimetype="text/plain",
+                )
+                resposta.headers["Retry-After"] = str(decisao.retry_after)
+                resposta.headers["Cache-Control"] = "no-store"
+                return resposta
+
+            metrics.ADMISSION_DECISIONS.inc(rota=rota, decisao="degradado" if decisao.degradado else "admitido")
+            g.admissao_degradada = decisao.degradado
+            try:
+                return view(*args, **kwargs)
+            finally:
+                controlador.sair(decisao)
+
+        return envolvida
+
+    return decorador
+
+
+def _gauge_admissao() -> Dict[Any, float]:
+    if _controlador is None:
+        return {}
+    return {(("estado", campo),): valor for campo, valor in _controlador.estado().items()}
+
+
+metrics.registrar_gauge(
+    "hwdiag_admission_state", "Limite de concorrência, requisições em andamento e na fila do controle de admissão",
+    _gauge_admissao,
+)
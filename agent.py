@@ -0,0 +1,155 @@
+# agent.py
+# Agente da frota: coleta o hardware da máquina, deriva sintomas e envia lotes compactos ao servidor
+#
+# Uso:
+#   python agent.py --servidor http://diagnostico.exemplo:5000
+#   python agent.py --servidor http://127.0.0.1:5000 --uma-vez       # uma amostra, envia e sai
+#   python agent.py --imprimir                                        # só mostra a amostra e os sintomas
+
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Deque, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from fleet import CAMPOS_PERFIL, codificar_lote, montar_lote  # noqa: E402
+from hardware_sampler import coletar_dinamico, perfil_estatico  # noqa: E402
+
+AGENT_SERVER_URL = os.getenv("AGENT_SERVER_URL", "")
+AGENT_TOKEN = os.getenv("AGENT_TOKEN", "")
+AGENT_INTERVAL = float(os.getenv("AGENT_INTERVAL", "10"))  # segundos entre amostras
+AGENT_BATCH_SECONDS = float(os.getenv("AGENT_BATCH_SECONDS", "60"))  # idade máxima de um lote
+AGENT_BATCH_SIZE = int(os.getenv("AGENT_BATCH_SIZE", "100"))  # amostras por lote
+AGENT_BUFFER_MAX = int(os.getenv("AGENT_BUFFER_MAX", "5000"))  # amostras guardadas com o servidor fora
+AGENT_TIMEOUT = float(os.getenv("AGENT_TIMEOUT", "10"))
+
+# Limiares para derivar sintomas
+AGENT_DISK_PERCENT = float(os.getenv("AGENT_DISK_PERCENT", "90"))
+AGENT_MEMORY_PERCENT = float(os.getenv("AGENT_MEMORY_PERCENT", "90"))
+AGENT_TEMP_CELSIUS = float(os.getenv("AGENT_TEMP_CELSIUS", "85"))
+
+
+
+def derivar_sintomas(info: Dict[str, Any]) -> List[str]:
+    """Sintomas candidatos a partir das métricas coletadas na máquina."""
+    sintomas = []
+    if any((d.get("percent") or 0) >= AGENT_DISK_PERCENT for d in info.get("disks") or []):
+        sintomas.append("uso_disco_alto")
+    if (info.get("memory_usage_percent") or 0) >= AGENT_MEMORY_PERCENT:
+        sintomas.append("pouca_memoria")
+    if any((t or 0) >= AGENT_TEMP_CELSIUS for t in (info.get("temperatures") or {}).values()):
+        sintomas.append("superaquecendo")
+    return sintomas
+
+
+def coletar_amostra() -> Dict[str, Any]:
+    """Uma amostra compacta (usa a mesma coleta do servidor, sem bloquear pela janela de CPU)."""
+    info = coletar_dinamico(cpu_interval=None)
+    discos = [d["percent"] for d in info.get("disks") or [] if d.get("percent") is not None]
+    temperaturas = [t for t in (info.get("temperatures") or {}).values() if t is not None]
+    return {
+        "t": round(time.time(), 3),
+        "cpu": info.get("cpu_usage_percent"),
+        "mem": info.get("memory_usage_percent"),
+        "disco": max(discos) if discos else None,
+        "temp": max(temperaturas) if temperaturas else None,
+        "sintomas": derivar_sintomas(info),
+    }
+
+
+class Agent:
+    """Acumula amostras e envia em lotes; com o servidor fora, guarda até AGENT_BUFFER_MAX amostras."""
+
+    def __init__(self, servidor: str, token: str = AGENT_TOKEN, usar_msgpack: Optional[bool] = None) -> None:
+        self.url = servidor.rstrip("/") + "/api/v1/telemetria"
+        self.token = token
+        self.usar_msgpack = usar_msgpack
+        estatico = perfil_estatico()
+        self.host = estatico.get("hostname") or "desconhecido"
+        self.perfil = {campo: estatico.get(campo) for campo in CAMPOS_PERFIL}
+        self.pendentes: Deque[Dict[str, Any]] = collections.deque(maxlen=AGENT_BUFFER_MAX)
+        self._falhas = 0
+
+    def enviar(self) -> bool:
+        """Envia as amostras pendentes em lotes de AGENT_BATCH_SIZE; False se o servidor recusar ou falhar."""
+        while self.pendentes:
+            amostras = [self.pendentes[i] for i in range(min(AGENT_BATCH_SIZE, len(self.pendentes)))]
+            corpo, tipo = codificar_lote(montar_lote(self.host, self.perfil, amostras), self.usar_msgpack)
+            requisicao = urllib.request.Request(self.url, data=corpo, method="POST")
+            requisicao.add_header("Content-Type", tipo)
+            requisicao.add_header("Content-Encoding", "gzip")
+            if self.token:
+                requisicao.add_header("Authorization", f"Bearer {self.token}")
+            try:
+                with urllib.request.urlopen(requisicao, timeout=AGENT_TIMEOUT) as resposta:
+                    resposta.read()
+            except urllib.error.HTTPError as e:
+                if 400 <= e.code < 500 and e.code not in (408, 429):
+                    # Lote rejeitado (formato, autenticação): reenviar não adianta
+                    print(f"lote rejeitado ({e.code}): {e.read()[:200]!r}", file=sys.stderr)
+                    for _ in amostras:
+                        self.pendentes.popleft()
+                    continue
+                self._falhas += 1
+                return False
+            except (urllib.error.URLError, OSError):
+                self._falhas += 1
+                return False
+            for _ in amostras:
+                self.pendentes.popleft()
+            self._falhas = 0
+        return True
+
+    def executar(self, intervalo: float = AGENT_INTERVAL, idade_lote: float = AGENT_BATCH_SECONDS) -> None:
+        proximo_envio = time.monotonic() + idade_lote
+        while True:
+            self.pendentes.append(coletar_amostra())
+            agora = time.monotonic()
+            if len(self.pendentes) >= AGENT_BATCH_SIZE or agora >= proximo_envio:
+                if not self.enviar():
+                    # Servidor fora: espera mais a cada falha seguida (até 10 lotes)
+                    proximo_envio = agora + idade_lote * min(2 ** self._falhas, 10)
+                else:
+                    proximo_envio = agora + idade_lote
+            time.sleep(intervalo)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Agente de telemetria da frota")
+    parser.add_argument("--servidor", default=AGENT_SERVER_URL, help="URL base do servidor (AGENT_SERVER_URL)")
+    parser.add_argument("--intervalo", type=float, default=AGENT_INTERVAL)
+    parser.add_argument("--lote-segundos", type=float, default=AGENT_BATCH_SECONDS)
+    parser.add_argument("--json", action="store_true", help="envia JSON mesmo com msgpack instalado")
+    parser.add_argument("--uma-vez", action="store_true", help="coleta uma amostra, envia e sai")
+    parser.add_argument("--imprimir", action="store_true", help="mostra a amostra sem enviar")
+    args = parser.parse_args()
+
+    if args.imprimir:
+        # A primeira leitura de CPU sem intervalo sai zerada; a segunda já mede desde a anterior
+        coletar_amostra()
+        time.sleep(0.5)
+        print(json.dumps(coletar_amostra(), ensure_ascii=False, indent=2))
+        return 0
+    if not args.servidor:
+        parser.error("informe --servidor ou AGENT_SERVER_URL")
+
+    agente = Agent(args.servidor, usar_msgpack=False if args.json else None)
+    if args.uma_vez:
+        coletar_amostra()
+        time.sleep(0.5)
+        agente.pendentes.append(coletar_amostra())
+        return 0 if agente.enviar() else 1
+    agente.executar(args.intervalo, args.lote_segundos)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,471 @@
+# api.py
+# API JSON de diagnóstico (/api/v1), sem renderização de templates
+
+import hashlib
+import hmac
+import json
+import math
+import os
+import queue
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+from diagnosis_history import (
+    DIAGNOSIS_HISTORY_PAGE_SIZE, HistoryError, duracao_ms, obter_historico_diagnosticos, timestamp_ms,
+)
+from diagnosis_service import montar_log_payload, registrar_historico, salvar_log_s3
+from expert_system import InferenceSession, obter_sistema
+from fleet import FLEET_MAX_BATCH_BYTES, TelemetryError, decodificar_lote, obter_estado, processar_lote
+from hardware_sampler import obter_system_info
+from log_shipper import S3_LOG_BUCKET
+from metric_history import obter_historico
+from offload import executar_bloqueante
+import metrics
+
+API_CACHE_MAX_AGE = int(os.getenv("API_CACHE_MAX_AGE", "60"))
+# Token exigido dos agentes da frota (sem ele, a ingestão fica desligada: 404)
+FLEET_INGEST_TOKEN = os.getenv("FLEET_INGEST_TOKEN", "")
+# Duração máxima de uma conexão SSE (o navegador reconecta sozinho) e intervalo de keep-alive
+HISTORY_STREAM_MAX_SECONDS = float(os.getenv("HISTORY_STREAM_MAX_SECONDS", "300"))
+HISTORY_STREAM_HEARTBEAT = float(os.getenv("HISTORY_STREAM_HEARTBEAT", "15"))
+# Token exigido por /api/history (o histórico traz a descrição livre dos usuários); sem ele, 404
+HISTORY_API_TOKEN = os.getenv("HISTORY_API_TOKEN", "")
+
+api_v1 = Blueprint("api_v1", __name__, url_prefix="/api/v1")
+api_metricas = Blueprint("api_metricas", __name__, url_prefix="/api/metrics")
+api_historico = Blueprint("api_historico", __name__, url_prefix="/api/history")
+
+# Esquema (JSON Schema) da resposta de /api/v1/diagnose, também servido em /api/v1/schema
+DIAGNOSE_SCHEMA: Dict[str, Any] = {
+    "$schema": "https://json-schema.org/draft/2020-12/schema",
+    "title": "DiagnoseResponse",
+    "type": "object",
+    "required": ["versao_regras", "sintomas", "sintomas_legiveis", "desconhecidos", "diagnosticos"],
+    "properties": {
+        "versao_regras": {"type": "string", "description": "Versão da base de regras usada"},
+        "sintomas": {
+            "type": "array",
+            "items": {"type": "string"},
+            "description": "Códigos de sintomas reconhecidos, na ordem do catálogo",
+        },
+        "sintomas_legiveis": {"type": "array", "items": {"type": "string"}},
+        "desconhecidos": {
+            "type": "array",
+            "items": {"type": "string"},
+            "description": "Códigos recebidos que não existem no catálogo (ignorados)",
+        },
+        "diagnosticos": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["diagnostico", "causa_provavel", "recomendacao"],
+                "properties": {
+                    "diagnostico": {"type": "string"},
+                    "causa_provavel": {"type": "string"},
+                    "recomendacao": {"type": "string"},
+                },
+            },
+        },
+        "fatos": {
+            "type": "array",
+            "items": {"type": "string"},
+            "description": "Fatos intermediários concluídos; presente apenas com sugestoes=1",
+        },
+        "sugestoes": {
+            "type": "array",
+            "description": "Regras a uma condição de casar; presente apenas com sugestoes=1",
+            "items": {
+                "type": "object",
+                "required": ["regra", "faltando", "rotulo", "diagnostico", "conclui"],
+                "properties": {
+                    "regra": {"type": "string"},
+                    "faltando": {"type": "string", "description": "Sintoma ou fato que completaria a regra"},
+                    "rotulo": {"type": "string"},
+                    "diagnostico": {"type": ["string", "null"]},
+                    "conclui": {"type": ["string", "null"]},
+                    "via": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Quando falta um fato: sintomas que o concluiriam",
+                    },
+                },
+            },
+        },
+        "hardware": {
+            "type": "object",
+            "description": "Snapshot de hardware do servidor; presente apenas com hardware=1",
+        },
+    },
+}
+
+_VERDADEIRO = ("1", "true", "sim", "yes", "on")
+
+
+def _ler_entrada() -> Tuple[List[str], str, bool]:
+    """
+    Extrai sintomas, descrição e a opção de hardware de GET (query) ou POST (JSON/form).
+    ValueError se o JSON não for um objeto ou `sintomas` não for uma lista de códigos.
+    """
+    if request.method == "POST" and request.is_json:
+        dados = request.get_json(silent=True)
+        if dados is None:
+            dados = {}
+        if not isinstance(dados, dict):
+            raise ValueError("Envie um objeto JSON.")
+        sintomas = dados.get("sintomas") or []
+        if isinstance(sintomas, str):
+            sintomas = [sintomas]
+        if not isinstance(sintomas, list) or not all(isinstance(s, str) for s in sintomas):
+            raise ValueError("'sintomas' deve ser uma lista de códigos de sintomas.")
+        descricao = str(dados.get("descricao") or "")
+        hardware = dados.get("incluir_hardware")
+        if hardware is None:
+            hardware = request.args.get("hardware", "")
+        incluir = hardware is True or str(hardware).lower() in _VERDADEIRO
+        return list(sintomas), descricao.strip(), incluir
+
+    origem = request.form if request.method == "POST" else request.args
+    sintomas = []
+    for valor in origem.getlist("sintomas"):
+        sintomas.extend(s for s in valor.split(",") if s)
+    descricao = origem.get("descricao", "").strip()
+    incluir = (origem.get("hardware") or request.args.get("hardware", "")).lower() in _VERDADEIRO
+    return sintomas, descricao, incluir
+
+
+def _registrar(sintomas: List[str], descricao: str, versao: str, diagnosticos: List[Dict[str, str]],
+               sysinfo: Optional[Dict[str, Any]]) -> None:
+    # Mesmo registro da interface web (diagnosis_service), marcado com a origem
+    if not S3_LOG_BUCKET and not obter_historico_diagnosticos().ativo:
+        return
+    payload = montar_log_payload(sintomas, descricao, diagnosticos, versao, sysinfo)
+    payload["origem"] = "api_v1"
+    registrar_historico(payload)
+    try:
+        salvar_log_s3(payload)
+    except RuntimeError:
+        # Fila cheia: o descarte já é contado em hwdiag_s3_log_failures_total
+        pass
+
+
+@api_v1.route("/diagnose", methods=["GET", "POST"])
+def diagnose() -> Response:
+    """
+    Diagnóstico em JSON.
+    GET  /api/v1/diagnose?sintomas=lento&sintomas=pouca_memoria[&hardware=1]
+    POST /api/v1/diagnose  {"sintomas": [...], "descricao": "...", "incluir_hardware": false}
+    Sem hardware, a resposta depende só dos sintomas e da versão das regras: recebe ETag
+    e Cache-Control, e GET com If-None-Match igual responde 304 sem corpo.
+    """
+    try:
+        sintomas, descricao, incluir_hardware = _ler_entrada()
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    incluir_sugestoes = request.args.get("sugestoes", "").lower() in _VERDADEIRO
+
+    regras = obter_sistema().snapshot()
+    conhecidos = [s for s in dict.fromkeys(sintomas) if s in regras.index.bits]
+    desconhecidos = [s for s in dict.fromkeys(sintomas) if s not in regras.index.bits]
+    with metrics.DIAGNOSE_SECONDS.time():
+        resultado = regras.resolve(conhecidos)
+    diagnosticos = list(resultado.diagnosticos)
+    metrics.contar_diagnostico("api_v1", conhecidos, diagnosticos)
+
+    sysinfo = None
+    if incluir_hardware:
+        with metrics.SYSINFO_SECONDS.time():
+            sysinfo = obter_system_info()
+
+    etag = None
+    if sysinfo is None:
+        etag = f"{regras.assinatura}-{resultado.mascara:x}"
+        if desconhecidos:
+            # Os códigos desconhecidos aparecem no corpo, então também entram na ETag
+            etag += "-" + hashlib.sha1("\n".join(desconhecidos).encode("utf-8")).hexdigest()[:10]
+        if incluir_sugestoes:
+            etag += "-s"
+        if request.method in ("GET", "HEAD") and request.if_none_match.contains_weak(etag):
+            resposta = Response(status=304)
+            resposta.set_etag(etag)
+            resposta.headers["Cache-Control"] = f"public, max-age={API_CACHE_MAX_AGE}"
+            return resposta
+
+    # Só registra (S3 e histórico) quando o corpo é de fato calculado: 304 não conta como consulta
+    _registrar(sintomas, descricao, regras.versao, diagnosticos, sysinfo)
+    corpo: Dict[str, Any] = {
+        "versao_regras": regras.versao,
+        "sintomas": regras.index.decodificar(resultado.mascara),
+        "sintomas_legiveis": list(resultado.rotulos),
+        "desconhecidos": desconhecidos,
+        "diagnosticos": diagnosticos,
+    }
+    if incluir_sugestoes:
+        sessao = InferenceSession(regras, conhecidos)
+        corpo["fatos"] = sessao.fatos
+        corpo["sugestoes"] = sessao.sugestoes()
+    if sysinfo is not None:
+        corpo["hardware"] = sysinfo
+
+    resposta = jsonify(corpo)
+    if etag is not None:
+        resposta.set_etag(etag)
+        resposta.headers["Cache-Control"] = f"public, max-age={API_CACHE_MAX_AGE}"
+    else:
+        resposta.headers["Cache-Control"] = "no-store"
+    return resposta
+
+
+@api_v1.route("/telemetria", methods=["POST"])
+def telemetria() -> Response:
+    """
+    Ingestão dos lotes enviados por agent.py (msgpack ou JSON, opcionalmente com gzip).
+    Todas as amostras do lote são diagnosticadas de uma vez e o host passa a ter
+    como estado a amostra mais recente.
+    """
+    if not FLEET_INGEST_TOKEN:
+        return jsonify({"erro": "não encontrado"}), 404
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {FLEET_INGEST_TOKEN}"):
+        metrics.TELEMETRY_REJECTED.inc(motivo="token")
+        return jsonify({"erro": "token inválido"}), 401
+    if (request.content_length or 0) > FLEET_MAX_BATCH_BYTES:
+        metrics.TELEMETRY_REJECTED.inc(motivo="tamanho")
+        return jsonify({"erro": "lote maior que o permitido"}), 413
+
+    try:
+        lote = executar_bloqueante(decodificar_lote, request.get_data(cache=False), request.content_type or "",
+                                   request.content_encoding or "")
+    except TelemetryError as e:
+        metrics.TELEMETRY_REJECTED.inc(motivo="formato")
+        return jsonify({"erro": str(e)}), 400
+
+    regras = obter_sistema().snapshot()
+    with metrics.INGEST_SECONDS.time():
+        resultado = processar_lote(lote, regras)
+    if resultado["estado"] is not None:
+        obter_estado().atualizar([resultado["estado"]])
+
+    metrics.TELEMETRY_SAMPLES.inc(resultado["amostras"])
+    for regra, total in resultado["por_regra"].items():
+        metrics.TELEMETRY_BY_RULE.inc(total, regra=regra)
+
+    estado = resultado["estado"] or {}
+    return jsonify(
+        {
+            "versao_regras": regras.versao,
+            "amostras": resultado["amostras"],
+            "sintomas": estado.get("sintomas", []),
+            "diagnosticos": estado.get("diagnosticos", []),
+        }
+    )
+
+
+@api_v1.route("/frota", methods=["GET"])
+def frota() -> Response:
+    """
+    Estado mais recente de cada host da frota.
+    GET /api/v1/frota[?sintoma=pouca_memoria][&regra=lento_memoria][&limite=100]
+    """
+    sintoma = request.args.get("sintoma")
+    regra = request.args.get("regra")
+    try:
+        limite = int(request.args.get("limite", "1000"))
+    except ValueError:
+        return jsonify({"erro": "limite deve ser inteiro"}), 400
+
+    hosts = sorted(obter_estado().hosts().values(), key=lambda e: e["ultimo_ts"] or 0, reverse=True)
+    if sintoma:
+        hosts = [e for e in hosts if sintoma in e["sintomas"]]
+    if regra:
+        hosts = [e for e in hosts if regra in e["diagnosticos"]]
+    resposta = jsonify({"total": len(hosts), "hosts": hosts[:max(limite, 0)]})
+    resposta.headers["Cache-Control"] = "no-store"
+    return resposta
+
+
+@api_v1.route("/frota/<host>", methods=["GET"])
+def frota_host(host: str) -> Response:
+    estado = obter_estado().hosts().get(host)
+    if estado is None:
+        return jsonify({"erro": "host desconhecido"}), 404
+    regras = obter_sistema().snapshot()
+    posicoes = {rule["id"]: posicao for posicao, rule in enumerate(regras.rules)}
+    detalhado = dict(estado)
+    # Textos da versão atual das regras (o estado guarda só os ids)
+    detalhado["diagnosticos_detalhados"] = [
+        regras._formatar(posicoes[i]) for i in estado["diagnosticos"] if i in posicoes
+    ]
+    resposta = jsonify(detalhado)
+    resposta.headers["Cache-Control"] = "no-store"
+    return resposta
+
+
+@api_v1.route("/schema", methods=["GET"])
+def schema() -> Response:
+    """JSON Schema da resposta de /api/v1/diagnose."""
+    resposta = jsonify(DIAGNOSE_SCHEMA)
+    resposta.headers["Cache-Control"] = f"public, max-age={API_CACHE_MAX_AGE}"
+    return resposta
+
+
+def _series_pedidas() -> Optional[List[str]]:
+    series: List[str] = []
+    for valor in request.args.getlist("series"):
+        series.extend(s for s in valor.split(",") if s)
+    return series or None
+
+
+def _parametro_finito(nome: str) -> float:
+    try:
+        valor = float(request.args[nome])
+    except ValueError:
+        raise ValueError(f"'{nome}' deve ser numérico") from None
+    if not math.isfinite(valor):
+        raise ValueError(f"'{nome}' deve ser um número finito")
+    return valor
+
+
+@api_metricas.route("/history", methods=["GET"])
+def historico() -> Response:
+    """
+    Histórico de métricas de hardware deste worker.
+    GET /api/metrics/history?series=cpu,memory&ultimos=600[&resolucao=raw|1m|1h]
+    GET /api/metrics/history?inicio=<unix>&fim=<unix>
+    Cada ponto é [timestamp, média, mínimo, máximo]; com resolucao=auto (padrão),
+    usa a resolução mais fina que ainda cobre o início do intervalo.
+    """
+    try:
+        fim = _parametro_finito("fim") if "fim" in request.args else time.time()
+        if "ultimos" in request.args:
+            ultimos = _parametro_finito("ultimos")
+            if ultimos < 0:
+                raise ValueError("'ultimos' não pode ser negativo")
+            inicio: Optional[float] = fim - ultimos
+            if not math.isfinite(inicio):
+                raise ValueError("'ultimos' fora do intervalo aceito")
+        else:
+            inicio = _parametro_finito("inicio") if "inicio" in request.args else None
+        dados = obter_historico().consultar(
+            _series_pedidas(), inicio, fim, request.args.get("resolucao", "auto")
+        )
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+
+    dados["disponiveis"] = obter_historico().series()
+    resposta = jsonify(dados)
+    resposta.headers["Cache-Control"] = "no-store"
+    return resposta
+
+
+def _intervalo_pedido() -> Tuple[Optional[int], Optional[int]]:
+    """(inicio, fim) em ms UTC a partir de `inicio`/`fim` (ISO 8601 ou unix) ou `ultimos` (segundos)."""
+    fim = timestamp_ms(request.args["fim"]) if "fim" in request.args else None
+    if "ultimos" in request.args:
+        referencia = fim if fim is not None else int(time.time() * 1000)
+        return max(0, referencia - duracao_ms(request.args["ultimos"])), fim
+    inicio = timestamp_ms(request.args["inicio"]) if "inicio" in request.args else None
+    return inicio, fim
+
+
+@api_historico.before_request
+def autorizar_historico() -> Optional[Tuple[Response, int]]:
+    if not HISTORY_API_TOKEN or not obter_historico_diagnosticos().ativo:
+        return jsonify({"erro": "não encontrado"}), 404
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {HISTORY_API_TOKEN}"):
+        return jsonify({"erro": "token inválido"}), 401
+    return None
+
+
+@api_historico.route("", methods=["GET"])
+def historico_diagnosticos() -> Response:
+    """
+    Diagnósticos registrados, do mais recente para o mais antigo (todos os workers).
+    GET /api/history?hostname=srv-01&sintoma=superaquecendo&diagnostico=...&ultimos=604800&limite=50
+    Authorization: Bearer <HISTORY_API_TOKEN>
+    A resposta traz `proximo`; repita a consulta com `cursor=<proximo>` para a página seguinte.
+    """
+    try:
+        inicio, fim = _intervalo_pedido()
+        limite = int(request.args.get("limite", DIAGNOSIS_HISTORY_PAGE_SIZE))
+    except (ValueError, OverflowError) as e:
+        return jsonify({"erro": str(e)}), 400
+    # Sob gevent a consulta roda numa thread nativa, fora do contexto da requisição
+    filtros = {campo: request.args.get(campo) for campo in ("hostname", "sintoma", "diagnostico", "cursor")}
+    try:
+        dados = executar_bloqueante(
+            lambda: obter_historico_diagnosticos().consultar(inicio=inicio, fim=fim, limite=limite, **filtros)
+        )
+    except HistoryError as e:
+        return jsonify({"erro": str(e)}), 400
+
+    resposta = jsonify(dados)
+    resposta.headers["Cache-Control"] = "no-store"
+    return resposta
+
+
+@api_historico.route("/contagens", methods=["GET"])
+def contagens_historico() -> Response:
+    """
+    Quantas vezes cada sintoma (ou diagnóstico) apareceu no intervalo.
+    GET /api/history/contagens?campo=sintoma[&valor=superaquecendo][&ultimos=604800]
+    """
+    campo = request.args.get("campo", "sintoma")
+    valor = request.args.get("valor")
+    try:
+        inicio, fim = _intervalo_pedido()
+        contagens = executar_bloqueante(obter_historico_diagnosticos().contar, campo, valor, inicio, fim)
+    except (HistoryError, OverflowError) as e:
+        return jsonify({"erro": str(e)}), 400
+
+    resposta = jsonify({"campo": campo, "inicio": inicio, "fim": fim, "contagens": contagens})
+    resposta.headers["Cache-Control"] = "no-store"
+    return resposta
+
+
+def _evento_sse(evento: str, dados: Dict[str, Any]) -> str:
+    return f"event: {evento}\ndata: {json.dumps(dados, separators=(',', ':'))}\n\n"
+
+
+@api_metricas.route("/stream", methods=["GET"])
+def stream() -> Response:
+    """
+    Server-Sent Events com cada nova amostra de hardware (evento `amostra`).
+    GET /api/metrics/stream?series=cpu,memory[&ultimos=60]
+    Com `ultimos`, envia antes o histórico bruto recente (evento `historico`).
+    A conexão é encerrada após HISTORY_STREAM_MAX_SECONDS para não prender um
+    worker síncrono (com gevent, cada conexão aberta custa só um greenlet e o
+    limite pode subir); o EventSource do navegador reconecta automaticamente.
+    """
+    historico_metricas = obter_historico()
+    series = _series_pedidas()
+    try:
+        ultimos = float(request.args.get("ultimos", "0"))
+    except ValueError:
+        return jsonify({"erro": "ultimos deve ser numérico"}), 400
+
+    def gerar() -> Iterator[str]:
+        fila = historico_metricas.assinar()
+        try:
+            yield "retry: 3000\n\n"
+            if ultimos > 0:
+                yield _evento_sse("historico", historico_metricas.consultar(series, time.time() - ultimos, None, "raw"))
+            limite = time.monotonic() + HISTORY_STREAM_MAX_SECONDS
+            while time.monotonic() < limite:
+                try:
+                    amostra = fila.get(timeout=HISTORY_STREAM_HEARTBEAT)
+                except queue.Empty:
+                    # Comentário SSE: mantém proxies e balanceadores com a conexão aberta
+                    yield ": keep-alive\n\n"
+                    continue
+                valores = amostra["valores"]
+                if series is not None:
+                    valores = {nome: v for nome, v in valores.items() if nome in series}
+                yield _evento_sse("amostra", {"ts": amostra["ts"], "valores": valores})
+        finally:
+            historico_metricas.cancelar(fila)
+
+    resposta = Response(stream_with_context(gerar()), mimetype="text/event-stream")
+    resposta.headers["Cache-Control"] = "no-cache"
+    resposta.headers["X-Accel-Buffering"] = "no"
+    return resposta
@@ -1,314 +1,136 @@
 # app.py
+# Interface web Flask (templates Jinja2) e APIs; a interface Streamlit fica em streamlit_app.py
 import os
-import json
-import datetime
-import html
 
-from flask import Flask, render_template, request
+from flask import Flask, Response, jsonify, render_template, request
 from dotenv import load_dotenv
-import boto3
-import psutil
-import platform
-
-try:
-    import streamlit as st
-except ImportError:
-    st = None
-
-from expert_system import HardwareExpertSystem
 
 # Carregar variáveis de ambiente do .env em ambiente local
+# (antes dos módulos locais, que leem a configuração ao serem importados)
 load_dotenv()
 
+from diagnosis_service import get_system_info, montar_log_payload, registrar_historico, salvar_log_s3  # noqa: E402
+from expert_system import obter_sistema  # noqa: E402
+from log_shipper import obter_shipper  # noqa: E402
+from api import api_historico, api_metricas, api_v1  # noqa: E402
+import admission  # noqa: E402
+from metric_history import obter_historico  # noqa: E402
+import metrics  # noqa: E402
+import profiler  # noqa: E402
+import web_cache  # noqa: E402
+
 app = Flask(__name__)
-expert_system = HardwareExpertSystem()
-
-AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
-S3_LOG_BUCKET = os.getenv("S3_LOG_BUCKET")  # bucket para logs de diagnósticos
-
-SYMPTOMS = [
-    {
-        "value": "nao_liga",
-        "label": "Computador não liga",
-        "icon": "🔌",
-        "hint": "Nenhuma reação ao pressionar o botão de energia",
-    },
-    {
-        "value": "reinicia_sozinho",
-        "label": "Reinicia sozinho",
-        "icon": "🔄",
-        "hint": "Reinicializações inesperadas durante o uso",
-    },
-    {
-        "value": "superaquecendo",
-        "label": "Superaquecendo",
-        "icon": "🔥",
-        "hint": "Carcaça quente ou ventiladores sempre no máximo",
-    },
-    {
-        "value": "lento",
-        "label": "Muito lento",
-        "icon": "🐢",
-        "hint": "Programas demoram a abrir ou travam",
-    },
-    {
-        "value": "uso_disco_alto",
-        "label": "Uso de disco muito alto",
-        "icon": "💽",
-        "hint": "Indicador de disco sempre em 100%",
-    },
-    {
-        "value": "pouca_memoria",
-        "label": "Pouca memória disponível",
-        "icon": "🧠",
-        "hint": "Alertas de memória insuficiente ao abrir apps",
-    },
-    {
-        "value": "sem_video",
-        "label": "Sem vídeo",
-        "icon": "🖥️",
-        "hint": "Monitor sem sinal ou tela preta",
-    },
-    {
-        "value": "ruidos",
-        "label": "Ruídos estranhos",
-        "icon": "🔉",
-        "hint": "Cliques, chiados ou vibrações incomuns",
-    },
-]
-
-SYMPTOM_LABELS = {item["value"]: item["label"] for item in SYMPTOMS}
-
-CUSTOM_CSS = ""
-
-if st is not None:
-    # Configuração da página deve ser a primeira chamada Streamlit quando disponível
-    st.set_page_config(
-        page_title="Diagnóstico de Hardware Cloud",
-        page_icon="🖥️",
-        layout="wide"
-    )
-    CUSTOM_CSS = """
-<style>
-:root {
-    --surface-color: rgba(15, 23, 42, 0.72);
-    --surface-border: rgba(148, 163, 184, 0.18);
-    --accent-color: #38bdf8;
-    --accent-gradient: linear-gradient(135deg, #2563eb 0%, #38bdf8 100%);
-}
-[data-testid="stAppViewContainer"] {
-    background: radial-gradient(circle at top left, rgba(56, 189, 248, 0.15), transparent 55%), #0f172a;
-    color: #e2e8f0;
-}
-.hero-card {
-    border-radius: 18px;
-    padding: 24px 28px;
-    margin-bottom: 24px;
-    background: rgba(30, 41, 59, 0.72);
-    border: 1px solid var(--surface-border);
-    display: flex;
-    gap: 18px;
-    align-items: center;
-}
-.metric-card, .resource-card, .diagnostic-card {
-    background: var(--surface-color);
-    border-radius: 16px;
-    padding: 18px 20px;
-    border: 1px solid var(--surface-border);
-    box-shadow: 0 24px 40px -32px rgba(15, 23, 42, 0.9);
-}
-.metric-card__icon {
-    font-size: 26px;
-    margin-bottom: 4px;
-}
-.metric-card__title {
-    font-size: 0.85rem;
-    color: #94a3b8;
-    text-transform: uppercase;
-    letter-spacing: 0.04em;
-}
-.metric-card__value {
-    font-size: 1.8rem;
-    font-weight: 600;
-    margin: 8px 0 4px;
-}
-.metric-card__subtitle {
-    font-size: 0.85rem;
-    color: #cbd5f5;
-}
-.section-caption {
-    color: #94a3b8;
-    margin-bottom: 12px;
-}
-.resource-card__header {
-    font-weight: 600;
-    color: #bae6fd;
-    margin-bottom: 6px;
-}
-.resource-card__value {
-    font-size: 1.1rem;
-    font-weight: 600;
-    margin-bottom: 10px;
-}
-.resource-card__bar {
-    width: 100%;
-    height: 8px;
-    background: rgba(148, 163, 184, 0.25);
-    border-radius: 999px;
-    overflow: hidden;
-}
-.resource-card__bar span {
-    display: block;
-    height: 100%;
-    background: var(--accent-gradient);
-}
-.diagnostic-card {
-    margin-bottom: 12px;
-    font-size: 0.95rem;
-    line-height: 1.5;
-    border-left: 3px solid #38bdf8;
-    padding-left: 12px;
-}
-.diagnostic-card strong {
-    color: #f8fafc;
-}
-</style>
-"""
-def get_system_info():
-    """Retorna informações básicas de hardware do servidor."""
-    info = {}
-
-    info["platform"] = platform.system()
-    info["platform_release"] = platform.release()
-    info["architecture"] = platform.machine()
-    info["hostname"] = platform.node()
-    info["processor"] = platform.processor()
-    info["python_version"] = platform.python_version() # Adicionado para evitar erro
-
-    # CPU
-    info["cpu_count"] = psutil.cpu_count(logical=True)
-    try:
-        freq = psutil.cpu_freq()
-        info["cpu_freq_current"] = freq.current if freq else None
-        info["cpu_freq_min"] = freq.min if freq else None
-        info["cpu_freq_max"] = freq.max if freq else None
-    except Exception:
-        info["cpu_freq_current"] = None
-        info["cpu_freq_min"] = None
-        info["cpu_freq_max"] = None
-    info["cpu_usage_percent"] = psutil.cpu_percent(interval=1)
-
-    # Memória
-    svmem = psutil.virtual_memory()
-    info["total_memory"] = svmem.total
-    info["available_memory"] = svmem.available
-    info["memory_usage_percent"] = svmem.percent
-
-    # Disco
-    partitions = psutil.disk_partitions()
-    disks = []
-    for p in partitions:
-        try:
-            usage = psutil.disk_usage(p.mountpoint)
-        except (PermissionError, FileNotFoundError, OSError, SystemError):
-            # Alguns dispositivos virtuais ou montagens especiais podem falhar ao consultar uso
-            continue
-
-        disks.append(
-            {
-                "device": p.device,
-                "mountpoint": p.mountpoint,
-                "fstype": p.fstype,
-                "total": usage.total,
-                "used": usage.used,
-                "free": usage.free,
-                "percent": usage.percent,
-            }
-        )
-    info["disks"] = disks
-
-    info["boot_time"] = datetime.datetime.fromtimestamp(
-        psutil.boot_time()
-    ).strftime("%Y-%m-%d %H:%M:%S")
-
-    return info
-
-
-def salvar_log_s3(payload: dict) -> None:
-    """Salva log da consulta no S3 (se o bucket estiver configurado)."""
-    if not S3_LOG_BUCKET:
-        # Se não tiver bucket configurado, não faz nada
-        return
-
-    session = boto3.session.Session(region_name=AWS_REGION)
-    s3 = session.client("s3")
-
-    now = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-    key = f"logs/diagnostico_{now}.json"
-
-    body = json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
-
-    s3.put_object(
-        Bucket=S3_LOG_BUCKET,
-        Key=key,
-        Body=body,
-        ContentType="application/json; charset=utf-8",
-    )
+app.register_blueprint(api_v1)
+app.register_blueprint(api_metricas)
+app.register_blueprint(api_historico)
+page_cache = web_cache.configurar(app)
+profiler.configurar(app)
+expert_system = obter_sistema()
+
+BATCH_MAX_CASES = int(os.getenv("BATCH_MAX_CASES", "100000"))  # limite de casos por lote
+
+
+def renderizar(template: str, **contexto) -> str:
+    """render_template com medição de latência por template."""
+    with metrics.RENDER_SECONDS.time(template=template):
+        return render_template(template, **contexto)
+
+
+def _gauge_fila_logs():
+    return {(): obter_shipper().metricas()["fila_atual"]}
+
+
+def _gauge_cache():
+    cache = expert_system.cache_stats()
+    return {
+        (("estado", "entradas"),): cache["tamanho"],
+        (("estado", "acertos"),): cache["acertos"],
+        (("estado", "falhas"),): cache["falhas"],
+    }
+
+
+metrics.registrar_gauge("hwdiag_s3_log_queue_size", "Registros aguardando envio ao S3", _gauge_fila_logs)
+metrics.registrar_gauge(
+    "hwdiag_diagnosis_cache", "Cache de diagnósticos da versão atual das regras", _gauge_cache
+)
+
+
+@app.before_request
+def iniciar_recarga_regras():
+    # Idempotente; inicia a observação da base de regras no primeiro request de cada worker
+    expert_system.iniciar_recarga_automatica()
+    # Idempotente; liga o amostrador de hardware ao histórico de métricas deste worker
+    obter_historico()
 
 
 @app.route("/", methods=["GET"])
 def index():
+    # A página só depende do catálogo de sintomas e da URL sem a query string (que a página
+    # não usa e que, na chave, deixaria qualquer `?x=...` expulsar as entradas do cache)
+    regras = expert_system.snapshot()
+    pagina = page_cache.obter((request.base_url, regras.assinatura), lambda: _renderizar_index(regras))
+    return pagina.responder(web_cache.CACHE_REVALIDAR)
+
+
+def _renderizar_index(regras) -> str:
     page_meta = {
         "description": "Execute diagnósticos de hardware em nuvem selecionando sintomas e recebendo recomendações práticas instantaneamente.",
         "keywords": "diagnostico de hardware, suporte tecnico, computador lento, superaquecimento",
         "og_title": "Diagnóstico de Hardware em Nuvem",
         "og_description": "Descubra possíveis causas para falhas no computador com um assistente especialista e visão do servidor.",
-        "og_url": request.url,
+        "og_url": request.base_url,
         "twitter_card": "summary_large_image",
     }
-    return render_template("index.html", sintomas=SYMPTOMS, meta=page_meta)
+    return renderizar("index.html", sintomas=regras.sintomas, meta=page_meta)
 
 
 @app.route("/diagnosticar", methods=["POST"])
+@admission.controlar("diagnosticar")
 def diagnosticar():
     sintomas_selecionados = request.form.getlist("sintomas")
     descricao_extra = request.form.get("descricao", "").strip()
 
-    # Usa o sistema especialista para obter diagnósticos
-    diagnósticos = expert_system.diagnose(sintomas_selecionados)
+    # Usa o sistema especialista para obter diagnósticos (mesma versão das regras do início ao fim)
+    regras = expert_system.snapshot()
 
-    sintomas_legiveis = [SYMPTOM_LABELS.get(s, s) for s in sintomas_selecionados]
+    # Sintomas citados na descrição livre entram junto com os marcados no formulário
+    with metrics.EXTRACT_SECONDS.time():
+        extraidos = [s for s in regras.extrair_sintomas(descricao_extra) if s not in sintomas_selecionados]
+    sintomas_selecionados = sintomas_selecionados + extraidos
+
+    with metrics.DIAGNOSE_SECONDS.time():
+        resultado = regras.resolve(sintomas_selecionados)
+    diagnósticos = list(resultado.diagnosticos)
+    # Só códigos do catálogo viram rótulo: valores arbitrários do formulário criariam séries sem limite
+    conhecidos = [s for s in sintomas_selecionados if s in regras.index.bits]
+    metrics.contar_diagnostico("formulario", conhecidos, diagnósticos)
+    # Regras que casaram só em parte, da mais provável para a menos provável
+    ranking = regras.ranquear(sintomas_selecionados, parciais=True)
+
+    sintomas_legiveis = list(resultado.rotulos)
+
+    # Sob carga (admissão degradada) não coleta hardware e adia o envio dos logs
+    degradado = admission.degradado()
 
     # Coleta info do hardware do servidor
-    sysinfo = get_system_info()
+    sysinfo = get_system_info(coletar=not degradado)
 
     # Monta payload de log
-    log_payload = {
-        "timestamp_utc": datetime.datetime.utcnow().isoformat() + "Z",
-        "sintomas": sintomas_selecionados,
-        "descricao_extra": descricao_extra,
-        "diagnosticos": diagnósticos,
-        "resumo_hardware": {
-            "hostname": sysinfo["hostname"],
-            "platform": sysinfo["platform"],
-            "platform_release": sysinfo["platform_release"],
-            "cpu_count": sysinfo["cpu_count"],
-            "memory_usage_percent": sysinfo["memory_usage_percent"],
-        },
-    }
+    log_payload = montar_log_payload(
+        sintomas_selecionados, descricao_extra, diagnósticos, regras.versao, sysinfo, extraidos
+    )
+
+    # Histórico local (consultas em /api/history); só enfileira, a gravação é em lote
+    registrar_historico(log_payload)
 
     # Tenta salvar no S3 (se configurado)
     try:
-        salvar_log_s3(log_payload)
-        log_status = "Log registrado em S3 (se configurado corretamente)."
+        salvar_log_s3(log_payload, adiar=admission.ADMISSION_DEFER_LOG_SECONDS if degradado else 0)
+        log_status = "Log enfileirado para envio ao S3 (se configurado corretamente)."
     except Exception as e:
         log_status = f"Não foi possível salvar log no S3: {e}"
 
-    meta_description = "Resultados do diagnóstico: "
-    if sintomas_legiveis:
-        meta_description += ", ".join(sintomas_legiveis)
-    else:
-        meta_description += "nenhum sintoma informado"
+    meta_description = "Resultados do diagnóstico: " + resultado.resumo
 
     if descricao_extra:
         meta_description += f". Observações adicionais: {descricao_extra[:140]}"
@@ -322,200 +144,65 @@ def diagnosticar():
         "twitter_card": "summary_large_image",
     }
 
-    return render_template(
+    return renderizar(
         "result.html",
         sintomas=sintomas_legiveis,
+        extraidos=[regras.symptom_labels.get(s, s) for s in extraidos],
         descricao_extra=descricao_extra,
         diagnosticos=diagnósticos,
+        ranking=ranking,
+        versao_regras=regras.versao,
         sysinfo=sysinfo,
         log_status=log_status,
         meta=page_meta,
     )
 
 
-def main():
-    if st is None:
-        raise RuntimeError("Streamlit não está instalado. Execute `pip install streamlit` para usar a interface Streamlit.")
-
-    st.title("🖥️ Diagnóstico de Hardware e Rede")
-    st.markdown("---")
-    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
-
-    # Informações do Sistema
-    system_info = get_system_info()
-
-    def render_metric_card(title: str, value: str, subtitle: str, icon: str) -> None:
-        st.markdown(
-            f"""
-            <div class="metric-card">
-                <div class="metric-card__icon">{icon}</div>
-                <div class="metric-card__title">{title}</div>
-                <div class="metric-card__value">{value}</div>
-                <div class="metric-card__subtitle">{subtitle}</div>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-
-    def render_resource_card(title: str, percent: float, icon: str) -> None:
-        safe_percent = max(0, min(100, round(percent)))
-        st.markdown(
-            f"""
-            <div class="resource-card">
-                <div class="resource-card__header">{icon} {title}</div>
-                <div class="resource-card__value">{safe_percent}% em uso</div>
-                <div class="resource-card__bar">
-                    <span style="width:{safe_percent}%"></span>
-                </div>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-
-    cpu_usage = system_info["cpu_usage_percent"]
-    memory_usage = system_info["memory_usage_percent"]
-    root_usage = psutil.disk_usage(os.path.abspath(os.sep))
-    uptime_delta = datetime.datetime.now() - datetime.datetime.strptime(system_info["boot_time"], "%Y-%m-%d %H:%M:%S")
-    uptime_days = uptime_delta.days
-    uptime_hours = uptime_delta.seconds // 3600
-    uptime_minutes = (uptime_delta.seconds % 3600) // 60
-    uptime_label = f"{uptime_days}d {uptime_hours}h" if uptime_days else f"{uptime_hours}h {uptime_minutes}m"
-
-    st.markdown(
-        """
-        <div class="hero-card">
-            <div style="font-size:44px">⚡</div>
-            <div>
-                <h3 style="margin:0; color:#f8fafc">Visão rápida do servidor</h3>
-                <p style="margin:6px 0 0; color:#cbd5f5">
-                    Monitore o estado da máquina e aplique o diagnóstico inteligente de hardware sem sair daqui.
-                </p>
-            </div>
-        </div>
-        """,
-        unsafe_allow_html=True,
-    )
+@app.route("/diagnosticar/batch", methods=["POST"])
+def diagnosticar_batch():
+    """
+    Diagnóstico em lote para reprocessamento de chamados.
+    Entrada: {"casos": [["lento", "pouca_memoria"], ...], "expandir": false}
+    Saída: índices das regras que casaram por caso; com "expandir": true, também
+    a lista de diagnósticos no mesmo formato de /diagnosticar.
+    """
+    dados = request.get_json(silent=True)
+    if not isinstance(dados, dict) or not isinstance(dados.get("casos"), list):
+        return jsonify({"erro": "Envie um JSON com a lista 'casos'."}), 400
+
+    casos = dados["casos"]
+    if len(casos) > BATCH_MAX_CASES:
+        return jsonify({"erro": f"Máximo de {BATCH_MAX_CASES} casos por lote."}), 413
+    if not all(isinstance(c, list) and all(isinstance(s, str) for s in c) for c in casos):
+        return jsonify({"erro": "Cada caso deve ser uma lista de códigos de sintomas."}), 400
+
+    regras = expert_system.snapshot()
+    resultado = regras.diagnose_batch(regras.symptom_matrix(casos))
+
+    # Regras que só concluem fatos intermediários não têm diagnóstico e ficam fora da saída;
+    # os índices de "matches" apontam para a lista "regras"
+    diagnosticas = [p for p in range(len(regras.rules)) if regras.diagnosticavel(p)]
+    coluna = {posicao: i for i, posicao in enumerate(diagnosticas)}
+    resposta = {
+        "versao_regras": regras.versao,
+        "regras": [regras.rules[p]["diagnostico"] for p in diagnosticas],
+        "sintomas": regras.symptom_codes,
+        "total_casos": len(resultado),
+        "matches": [[coluna[p] for p in resultado.indices(i)] for i in range(len(resultado))],
+    }
+    if dados.get("expandir"):
+        resposta["diagnosticos"] = list(resultado)
 
-    metric_cols = st.columns(3)
-    with metric_cols[0]:
-        render_metric_card("Uso de CPU", f"{cpu_usage:.0f}%", "Carga instantânea", "🧠")
-    with metric_cols[1]:
-        render_metric_card(
-            "Memória disponível",
-            f"{system_info['available_memory'] / (1024 ** 3):.1f} GB",
-            f"Uso atual {memory_usage:.0f}%",
-            "🧬",
-        )
-    with metric_cols[2]:
-        render_metric_card(
-            "Tempo de atividade",
-            uptime_label,
-            f"Iniciado em {system_info['boot_time']}",
-            "⏱️",
-        )
-
-    st.markdown("### Diagnóstico de Sintomas")
-    st.markdown(
-        "<p class='section-caption'>Informe os sinais observados para receber recomendações personalizadas.</p>",
-        unsafe_allow_html=True,
-    )
-    sintomas_selecionados = st.multiselect(
-        "Selecione os sintomas que você está enfrentando:",
-        options=[s["value"] for s in SYMPTOMS],
-        format_func=lambda value: SYMPTOM_LABELS.get(value, value),
-    )
+    return jsonify(resposta)
+
+
+@app.route("/metrics", methods=["GET"])
+def metricas():
+    """Métricas de todos os workers no formato de texto do Prometheus."""
+    return Response(metrics.exportar(), mimetype="text/plain; version=0.0.4; charset=utf-8")
 
-    descricao_extra = st.text_area("Descrição adicional do problema:")
-
-    if st.button("Diagnosticar"):
-        if not sintomas_selecionados:
-            st.warning("Por favor, selecione pelo menos um sintoma.")
-        else:
-            with st.spinner("Realizando diagnóstico..."):
-                # Usa o sistema especialista para obter diagnósticos
-                diagnósticos = expert_system.diagnose(sintomas_selecionados)
-
-                # Coleta info do hardware do servidor
-                sysinfo = get_system_info()
-
-                # Monta payload de log
-                log_payload = {
-                    "timestamp_utc": datetime.datetime.utcnow().isoformat() + "Z",
-                    "sintomas": sintomas_selecionados,
-                    "descricao_extra": descricao_extra,
-                    "diagnosticos": diagnósticos,
-                    "resumo_hardware": {
-                        "hostname": sysinfo["hostname"],
-                        "platform": sysinfo["platform"],
-                        "platform_release": sysinfo["platform_release"],
-                        "cpu_count": sysinfo["cpu_count"],
-                        "memory_usage_percent": sysinfo["memory_usage_percent"],
-                    },
-                }
-
-                # Tenta salvar no S3 (se configurado)
-                try:
-                    salvar_log_s3(log_payload)
-                    log_status = "Log registrado em S3 (se configurado corretamente)."
-                except Exception as e:
-                    log_status = f"Não foi possível salvar log no S3: {e}"
-
-                st.success("Diagnóstico realizado com sucesso!")
-                st.subheader("Diagnósticos Sugeridos")
-                for diag in diagnósticos:
-                    st.markdown(
-                        f"<div class='diagnostic-card'>💡 {html.escape(diag)}</div>",
-                        unsafe_allow_html=True,
-                    )
-
-                st.markdown("---")
-                st.write(log_status)
-
-    if st.button("🔄 Atualizar Dados"):
-        st.rerun()
-
-    # Seção de Hardware do Servidor (Oculta por padrão)
-    with st.expander("📊 Visualizar Resumo do Hardware do Servidor", expanded=False):
-        st.subheader("Detalhes do Servidor")
-        col1, col2, col3, col4 = st.columns(4)
-        
-        # Corrigido chaves do dicionário para bater com get_system_info()
-        with col1:
-            st.metric("Sistema", f"{system_info['platform']} {system_info['platform_release']}")
-        with col2:
-            st.metric("Processador", system_info['processor'])
-        with col3:
-            st.metric("Arquitetura", system_info['architecture'])
-        with col4:
-            st.metric("Python", system_info['python_version'])
-
-        st.markdown("#### Uso de Recursos")
-        c1, c2, c3 = st.columns(3)
-        with c1:
-            render_resource_card("CPU", cpu_usage, "🧠")
-        with c2:
-            render_resource_card("Memória", memory_usage, "🧬")
-        with c3:
-            render_resource_card("Disco", root_usage.percent, "💾")
-
-        st.markdown("---")
-        st.markdown("#### Informações Detalhadas")
-        st.write(f"**Hostname:** {system_info['hostname']}")
-        st.write(f"**Núcleos da CPU:** {system_info['cpu_count']}")
-        st.write(f"**Frequência da CPU:** {system_info['cpu_freq_current']} MHz")
-        st.write(f"**Memória Total:** {system_info['total_memory'] / (1024 ** 3):.2f} GB")
-        st.write(f"**Memória Disponível:** {system_info['available_memory'] / (1024 ** 3):.2f} GB")
-        st.write(f"**Disco:**")
-        for disk in system_info["disks"]:
-            st.write(f"  - {disk['device']} ({disk['fstype']}): {disk['total'] / (1024 ** 3):.2f} GB")
-
-    st.markdown("---")
-    
 
 if __name__ == "__main__":
-    # Para rodar a interface visual (Streamlit), execute: streamlit run app.py
-    # O comando abaixo chama a função main() quando executado pelo Streamlit
-    main()
-    
-    # Para rodar a API Flask, descomente a linha abaixo e execute: python app.py
-    # app.run(host="0.0.0.0", port=5000, debug=True)
+    # Servidor de desenvolvimento; em produção use gunicorn (gunicorn.conf.py).
+    # A interface Streamlit fica em streamlit_app.py: streamlit run streamlit_app.py
+    app.run(host="0.0.0.0", port=5000, debug=True)
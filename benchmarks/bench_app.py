@@ -0,0 +1,72 @@
+# benchmarks/bench_app.py
+# Aplicação Flask preparada para benchmarks: S3 falso local e amostrador de hardware real ou fixo
+#
+# Usado por benchmarks/load_test.py, tanto em processo quanto via gunicorn:
+#   BENCH_S3_DIR=/tmp/s3 BENCH_SAMPLER=stub gunicorn -w 3 benchmarks.bench_app:app
+
+import os
+import sys
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# O bucket precisa estar definido antes de importar a aplicação
+os.environ.setdefault("S3_LOG_BUCKET", "bench-logs")
+
+import hardware_sampler  # noqa: E402
+from app import app  # noqa: E402,F401
+from fake_s3 import FakeS3Client  # noqa: E402
+from log_shipper import obter_shipper  # noqa: E402
+
+BENCH_S3_DIR = os.getenv("BENCH_S3_DIR")  # vazio: S3 falso só em memória
+BENCH_SAMPLER = os.getenv("BENCH_SAMPLER", "stub")  # "stub" ou "real"
+
+
+class StubSampler(hardware_sampler.HardwareSampler):
+    """Snapshot fixo, para medir a aplicação sem o custo nem a variação do psutil."""
+
+    SNAPSHOT: Dict[str, Any] = {
+        "platform": "Linux",
+        "platform_release": "bench",
+        "architecture": "x86_64",
+        "hostname": "bench-host",
+        "processor": "bench",
+        "python_version": "3",
+        "cpu_count": 4,
+        "cpu_freq_current": 2400.0,
+        "cpu_freq_min": 800.0,
+        "cpu_freq_max": 3600.0,
+        "cpu_usage_percent": 12.5,
+        "total_memory": 8 * 1024 ** 3,
+        "available_memory": 5 * 1024 ** 3,
+        "memory_usage_percent": 37.5,
+        "disks": [
+            {
+                "device": "/dev/bench",
+                "mountpoint": "/",
+                "fstype": "ext4",
+                "total": 100 * 1024 ** 3,
+                "used": 40 * 1024 ** 3,
+                "free": 60 * 1024 ** 3,
+                "percent": 40.0,
+            }
+        ],
+        "boot_time": "2026-01-01 00:00:00",
+        "sampled_at": "2026-01-01T00:00:00Z",
+        "timings_ms": {"static": {}, "dynamic": {}},
+    }
+
+    def snapshot(self) -> Dict[str, Any]:
+        info = dict(self.SNAPSHOT)
+        info["disks"] = [dict(d) for d in self.SNAPSHOT["disks"]]
+        return info
+
+
+def configurar() -> None:
+    cliente = FakeS3Client(diretorio=BENCH_S3_DIR)
+    obter_shipper().client_factory = lambda: cliente
+    if BENCH_SAMPLER == "stub":
+        hardware_sampler.sampler = StubSampler()
+
+
+configurar()
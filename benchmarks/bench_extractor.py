@@ -0,0 +1,95 @@
+# benchmarks/bench_extractor.py
+# Microbenchmark: extração de sintomas do texto livre (autômato) x busca sinônimo a sinônimo
+#
+# Uso: python benchmarks/bench_extractor.py [--tamanhos 256 2048 8192 65536] [--textos 200]
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from expert_system import carregar_base, KNOWLEDGE_BASE_PATH  # noqa: E402
+from symptom_extractor import SymptomExtractor, normalizar, tokenizar  # noqa: E402
+
+# Texto de enchimento típico de chamado, sem sinônimos de sintomas
+_ENCHIMENTO = (
+    "o cliente relata que desde a semana passada o equipamento apresenta comportamento estranho "
+    "durante o expediente principalmente quando abre planilhas grandes e o navegador com várias abas "
+    "já foi feita limpeza de arquivos temporários e atualização do sistema operacional"
+).split()
+
+
+def gerar_textos(tamanho: int, quantidade: int, termos: List[str], rng: random.Random) -> List[str]:
+    """Descrições com cerca de `tamanho` bytes e um sinônimo a cada ~40 palavras."""
+    textos = []
+    for _ in range(quantidade):
+        palavras: List[str] = []
+        total = 0
+        while total < tamanho:
+            if rng.random() < 0.025:
+                palavra = rng.choice(termos).upper() if rng.random() < 0.3 else rng.choice(termos)
+            else:
+                palavra = rng.choice(_ENCHIMENTO)
+            palavras.append(palavra)
+            total += len(palavra) + 1
+        textos.append(" ".join(palavras))
+    return textos
+
+
+def busca_ingenua(sinonimos: Dict[str, List[str]], texto: str) -> List[str]:
+    """Uma expressão regular por sinônimo sobre o texto normalizado (sem tratar negações)."""
+    normalizado = " " + " ".join(tokenizar(texto)) + " "
+    return [
+        codigo for codigo, termos in sinonimos.items()
+        if any(re.search(" " + re.escape(" ".join(tokenizar(t))) + " ", normalizado) for t in termos)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Extração de sintomas: autômato x busca por sinônimo")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[256, 2048, 8192, 65536])
+    parser.add_argument("--textos", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    base = carregar_base(KNOWLEDGE_BASE_PATH)
+    sinonimos = {item["value"]: [item["label"], *item.get("sinonimos", [])] for item in base["sintomas"]}
+    termos = [t for lista in sinonimos.values() for t in lista if not normalizar(t).startswith(("nao ", "sem "))]
+
+    inicio = time.perf_counter()
+    extrator = SymptomExtractor(sinonimos)
+    print(f"autômato: {len(extrator)} sinônimos, construído em {(time.perf_counter() - inicio) * 1000:.2f} ms")
+
+    rng = random.Random(args.seed)
+    for tamanho in args.tamanhos:
+        textos = gerar_textos(tamanho, args.textos, termos, rng)
+        volume = sum(len(t.encode("utf-8")) for t in textos)
+
+        # Sem negações nos textos gerados, as duas abordagens devem concordar
+        for texto in textos[:50]:
+            assert sorted(extrator.extrair(texto)) == sorted(busca_ingenua(sinonimos, texto))
+
+        inicio = time.perf_counter()
+        for texto in textos:
+            extrator.extrair(texto)
+        automato = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        for texto in textos:
+            busca_ingenua(sinonimos, texto)
+        ingenua = time.perf_counter() - inicio
+
+        print(
+            f"{tamanho:>7} bytes | autômato {automato / len(textos) * 1e6:9.1f} us/texto "
+            f"{volume / automato / 1e6:6.1f} MB/s | por sinônimo {ingenua / len(textos) * 1e6:9.1f} us/texto | "
+            f"{ingenua / automato:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
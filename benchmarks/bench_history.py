@@ -0,0 +1,99 @@
+# benchmarks/bench_history.py
+# Microbenchmark: histórico de diagnósticos em SQLite com milhões de linhas (gravação em lote e consultas paginadas)
+#
+# Uso: python benchmarks/bench_history.py [--linhas 1000000] [--hosts 500] [--banco /tmp/bench_history.sqlite3]
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from diagnosis_history import DiagnosisHistory  # noqa: E402
+from expert_system import carregar_base, KNOWLEDGE_BASE_PATH  # noqa: E402
+
+
+def gerar_payloads(quantidade: int, hosts: int, sintomas: List[str], diagnosticos: List[str],
+                   inicio: float, rng: random.Random) -> List[Dict[str, Any]]:
+    """Payloads no formato de montar_log_payload, um a cada ~0,6 s a partir de `inicio`."""
+    payloads = []
+    for i in range(quantidade):
+        instante = datetime.datetime.utcfromtimestamp(inicio + i * 0.6)
+        payloads.append(
+            {
+                "timestamp_utc": instante.isoformat() + "Z",
+                "sintomas": rng.sample(sintomas, rng.randint(1, 3)),
+                "descricao_extra": "",
+                "diagnosticos": [{"diagnostico": rng.choice(diagnosticos), "causa_provavel": "", "recomendacao": ""}],
+                "versao_regras": "bench",
+                "resumo_hardware": {"hostname": f"host-{rng.randrange(hosts):04d}"},
+            }
+        )
+    return payloads
+
+
+def medir(nome: str, funcao: Callable[[], Any], repeticoes: int = 200) -> Any:
+    resultado = funcao()
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    print(f"{nome:<48} {(time.perf_counter() - inicio) / repeticoes * 1000:8.3f} ms")
+    return resultado
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Histórico de diagnósticos em SQLite: gravação e consultas")
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--hosts", type=int, default=500)
+    parser.add_argument("--lote", type=int, default=500)
+    parser.add_argument("--banco", default="/tmp/bench_history.sqlite3")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for sufixo in ("", "-wal", "-shm"):
+        if os.path.exists(args.banco + sufixo):
+            os.remove(args.banco + sufixo)
+
+    base = carregar_base(KNOWLEDGE_BASE_PATH)
+    sintomas = [item["value"] for item in base["sintomas"]]
+    diagnosticos = [rule["diagnostico"] for rule in base["regras"] if "diagnostico" in rule]
+    rng = random.Random(args.seed)
+    historico = DiagnosisHistory(args.banco, max_lote=args.lote)
+    conexao = historico._conectar()
+
+    inicio_dados = time.time() - args.linhas * 0.6
+    gravacao = 0.0
+    for deslocamento in range(0, args.linhas, 50_000):
+        bloco = gerar_payloads(min(50_000, args.linhas - deslocamento), args.hosts, sintomas, diagnosticos,
+                               inicio_dados + deslocamento * 0.6, rng)
+        inicio = time.perf_counter()
+        for i in range(0, len(bloco), args.lote):
+            historico._gravar_lote(conexao, bloco[i:i + args.lote])
+        gravacao += time.perf_counter() - inicio
+    conexao.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    tamanho = os.path.getsize(args.banco) / 1e6
+    print(f"gravação: {args.linhas} linhas em {gravacao:.1f} s ({args.linhas / gravacao:,.0f} linhas/s, "
+          f"lotes de {args.lote}), banco com {tamanho:.0f} MB")
+
+    semana = int((time.time() - 7 * 86400) * 1000)
+    pagina = medir("últimos 50", lambda: historico.consultar(limite=50))
+    medir("últimos 50 de um host", lambda: historico.consultar(hostname="host-0042", limite=50))
+    medir("últimos 50 com um sintoma", lambda: historico.consultar(sintoma=sintomas[0], limite=50))
+    medir("sintoma + diagnóstico + host", lambda: historico.consultar(
+        sintoma=sintomas[0], diagnostico=diagnosticos[0], hostname="host-0042", limite=50), repeticoes=20)
+
+    # Página profunda: segue o cursor 2000 páginas para trás e mede a seguinte
+    cursor = pagina["proximo"]
+    for _ in range(2000):
+        cursor = historico.consultar(limite=50, cursor=cursor)["proximo"]
+    medir("página 2001 (cursor)", lambda: historico.consultar(limite=50, cursor=cursor))
+    medir(f"contagem de '{sintomas[0]}' na última semana", lambda: historico.contar("sintoma", sintomas[0], semana))
+    medir("contagem de todos os sintomas na semana", lambda: historico.contar("sintoma", None, semana), repeticoes=20)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# benchmarks/bench_rule_index.py
+# Microbenchmark: índice compilado de regras x varredura linear com set.issubset
+#
+# Uso: python benchmarks/bench_rule_index.py [--consultas 2000] [--vocabulario 256]
+
+import argparse
+import os
+import random
+import sys
+import timeit
+from typing import Dict, List, Set
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from expert_system import RuleIndex  # noqa: E402
+
+
+def gerar_regras(quantidade: int, vocabulario: List[str], rng: random.Random) -> List[Dict]:
+    regras = []
+    for i in range(quantidade):
+        tamanho = rng.randint(1, 4)
+        regras.append({"condicoes": set(rng.sample(vocabulario, tamanho)), "diagnostico": f"regra {i}"})
+    return regras
+
+
+def gerar_consultas(quantidade: int, vocabulario: List[str], rng: random.Random) -> List[List[str]]:
+    return [rng.sample(vocabulario, rng.randint(1, 5)) for _ in range(quantidade)]
+
+
+def varredura_linear(regras: List[Dict], sintomas: List[str]) -> List[int]:
+    """Algoritmo anterior de HardwareExpertSystem.diagnose."""
+    conjunto: Set[str] = set(sintomas)
+    return [i for i, regra in enumerate(regras) if regra["condicoes"].issubset(conjunto)]
+
+
+def medir(tamanho: int, consultas: List[List[str]], vocabulario: List[str], rng: random.Random) -> None:
+    regras = gerar_regras(tamanho, vocabulario, rng)
+    indice = RuleIndex(regras)
+
+    for sintomas in consultas[:200]:
+        assert indice.match(sintomas) == varredura_linear(regras, sintomas)
+
+    repeticoes = 3
+    linear = min(
+        timeit.repeat(lambda: [varredura_linear(regras, c) for c in consultas], number=1, repeat=repeticoes)
+    )
+    compilado = min(timeit.repeat(lambda: [indice.match(c) for c in consultas], number=1, repeat=repeticoes))
+
+    por_consulta_linear = linear / len(consultas) * 1e6
+    por_consulta_indice = compilado / len(consultas) * 1e6
+    print(
+        f"{tamanho:>8} regras | linear {por_consulta_linear:10.2f} us/consulta | "
+        f"índice {por_consulta_indice:8.2f} us/consulta | {por_consulta_linear / por_consulta_indice:7.1f}x"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Índice compilado x varredura linear")
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--vocabulario", type=int, default=256)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10, 1000, 100000])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulario = [f"sintoma_{i}" for i in range(args.vocabulario)]
+    consultas = gerar_consultas(args.consultas, vocabulario, rng)
+
+    for tamanho in args.tamanhos:
+        medir(tamanho, consultas, vocabulario, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+# benchmarks/load_test.py
+# Teste de carga ponta a ponta: vazão e latência por rota e por etapa (diagnose, sysinfo, S3, render)
+#
+# Uso:
+#   python benchmarks/load_test.py                              # servidor em processo (werkzeug, threads)
+#   python benchmarks/load_test.py --gunicorn 3                 # gunicorn -w 3, como na EC2
+#   python benchmarks/load_test.py --gunicorn 3 --worker-class gevent
+#   python benchmarks/load_test.py --sampler real --duracao 30 --concorrencia 32
+#   python benchmarks/load_test.py --saida atual.json --comparar base.json --tolerancia 0.15
+
+import argparse
+import datetime
+import http.client
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+
+# Combinações de sintomas comuns em chamados reais (peso relativo)
+MIX_SINTOMAS: List[Tuple[int, List[str]]] = [
+    (30, ["lento", "pouca_memoria"]),
+    (20, ["lento", "uso_disco_alto"]),
+    (12, ["reinicia_sozinho", "superaquecendo"]),
+    (10, ["nao_liga"]),
+    (8, ["sem_video"]),
+    (6, ["ruidos"]),
+    (6, ["lento"]),
+    (4, ["superaquecendo"]),
+    (4, []),
+]
+
+# Rotas exercitadas (peso relativo)
+MIX_ROTAS: List[Tuple[int, str]] = [
+    (25, "GET /"),
+    (60, "POST /diagnosticar"),
+    (15, "GET /api/v1/diagnose"),
+]
+
+# Histogramas de /metrics usados para a quebra por etapa
+ETAPAS = {
+    "diagnose": "hwdiag_diagnose_seconds",
+    "sysinfo": "hwdiag_get_system_info_seconds",
+    "s3": "hwdiag_salvar_log_s3_seconds",
+    "render": "hwdiag_render_template_seconds",
+}
+
+_LINHA_METRICA = re.compile(r'^(?P<nome>[a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(?P<rotulos>[^}]*)\})? (?P<valor>\S+)$')
+
+
+def _sortear(opcoes: List[Tuple[int, Any]], rng: random.Random) -> Any:
+    total = sum(peso for peso, _ in opcoes)
+    alvo = rng.uniform(0, total)
+    for peso, valor in opcoes:
+        alvo -= peso
+        if alvo <= 0:
+            return valor
+    return opcoes[-1][1]
+
+
+def percentil(valores: List[float], p: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posicao = min(len(ordenados) - 1, max(0, int(round(p / 100 * (len(ordenados) - 1)))))
+    return ordenados[posicao]
+
+
+# ---------------------------------------------------------------------- servidor
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _aguardar(host: str, porta: int, timeout: float = 30.0) -> None:
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            conexao = http.client.HTTPConnection(host, porta, timeout=2)
+            conexao.request("GET", "/metrics")
+            conexao.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"servidor não respondeu em {host}:{porta}")
+
+
+class Servidor:
+    """Sobe a aplicação de benchmark em processo (werkzeug) ou com gunicorn."""
+
+    def __init__(self, workers: int, sampler: str, s3_dir: Optional[str], worker_class: str = "sync") -> None:
+        self.workers = workers
+        self.worker_class = worker_class
+        self.sampler = sampler
+        self.s3_dir = s3_dir
+        self.porta = _porta_livre()
+        self._processo: Optional[subprocess.Popen] = None
+        self._servidor: Any = None
+
+    def __enter__(self) -> "Servidor":
+        os.environ["BENCH_SAMPLER"] = self.sampler
+        if self.s3_dir:
+            os.environ["BENCH_S3_DIR"] = self.s3_dir
+        os.environ["METRICS_FLUSH_SECONDS"] = "0.5"
+
+        if self.workers:
+            env = dict(os.environ, METRICS_DIR=os.path.join(self.s3_dir or "/tmp", f"metrics-{self.porta}"))
+            self._processo = subprocess.Popen(
+                [
+                    sys.executable, "-m", "gunicorn",
+                    "-w", str(self.workers),
+                    "-k", self.worker_class,
+                    "-b", f"127.0.0.1:{self.porta}",
+                    "--log-level", "warning",
+                    "benchmarks.bench_app:app",
+                ],
+                cwd=RAIZ,
+                env=env,
+            )
+        else:
+            from werkzeug.serving import WSGIRequestHandler, make_server
+
+            from benchmarks.bench_app import app
+
+            class _SemLog(WSGIRequestHandler):
+                def log_request(self, *args: Any, **kwargs: Any) -> None:
+                    pass
+
+            self._servidor = make_server("127.0.0.1", self.porta, app, threaded=True, request_handler=_SemLog)
+            threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+
+        _aguardar("127.0.0.1", self.porta)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self._processo is not None:
+            self._processo.terminate()
+            self._processo.wait(timeout=30)
+        if self._servidor is not None:
+            self._servidor.shutdown()
+
+
+# ---------------------------------------------------------------------- métricas do servidor
+def coletar_histogramas(porta: int) -> Dict[str, Dict[str, float]]:
+    """Lê /metrics e devolve buckets cumulativos (somados entre rótulos) por histograma."""
+    conexao = http.client.HTTPConnection("127.0.0.1", porta, timeout=10)
+    conexao.request("GET", "/metrics")
+    texto = conexao.getresponse().read().decode("utf-8")
+
+    histogramas: Dict[str, Dict[str, float]] = {}
+    for linha in texto.splitlines():
+        achado = _LINHA_METRICA.match(linha)
+        if not achado or not achado.group("nome").endswith("_bucket"):
+            continue
+        nome = achado.group("nome")[: -len("_bucket")]
+        limite = re.search(r'le="([^"]+)"', achado.group("rotulos") or "")
+        if not limite:
+            continue
+        buckets = histogramas.setdefault(nome, {})
+        buckets[limite.group(1)] = buckets.get(limite.group(1), 0.0) + float(achado.group("valor"))
+    return histogramas
+
+
+def _percentil_histograma(buckets: Dict[str, float], p: float) -> Optional[float]:
+    """Percentil aproximado (limite superior do bucket) a partir de buckets cumulativos."""
+    ordenados = sorted(buckets.items(), key=lambda kv: float("inf") if kv[0] == "+Inf" else float(kv[0]))
+    total = ordenados[-1][1] if ordenados else 0
+    if not total:
+        return None
+    alvo = total * p / 100
+    for limite, acumulado in ordenados:
+        if acumulado >= alvo:
+            return float("inf") if limite == "+Inf" else float(limite)
+    return None
+
+
+def resumir_etapas(antes: Dict[str, Dict[str, float]], depois: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+    etapas: Dict[str, Any] = {}
+    for etapa, nome in ETAPAS.items():
+        delta = {le: v - antes.get(nome, {}).get(le, 0.0) for le, v in depois.get(nome, {}).items()}
+        etapas[etapa] = {
+            "amostras": int(delta.get("+Inf", 0)),
+            "p50_ms": _ms(_percentil_histograma(delta, 50)),
+            "p95_ms": _ms(_percentil_histograma(delta, 95)),
+            "p99_ms": _ms(_percentil_histograma(delta, 99)),
+        }
+    return etapas
+
+
+def _ms(segundos: Optional[float]) -> Optional[float]:
+    if segundos is None or segundos == float("inf"):
+        return segundos
+    return round(segundos * 1000, 3)
+
+
+# ---------------------------------------------------------------------- carga
+class Cliente:
+    """Uma conexão HTTP persistente por thread."""
+
+    def __init__(self, porta: int, rng: random.Random) -> None:
+        self.porta = porta
+        self.rng = rng
+        self.conexao = http.client.HTTPConnection("127.0.0.1", porta, timeout=30)
+
+    def executar(self, rota: str) -> Tuple[int, float]:
+        sintomas = _sortear(MIX_SINTOMAS, self.rng)
+        headers = {"Accept-Encoding": "gzip"}
+        corpo = None
+        if rota == "GET /":
+            metodo, caminho = "GET", "/"
+        elif rota == "POST /diagnosticar":
+            metodo, caminho = "POST", "/diagnosticar"
+            campos = [("sintomas", s) for s in sintomas] + [("descricao", "teste de carga")]
+            corpo = urllib.parse.urlencode(campos)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        else:
+            metodo = "GET"
+            caminho = "/api/v1/diagnose?" + urllib.parse.urlencode([("sintomas", s) for s in sintomas])
+
+        inicio = time.perf_counter()
+        try:
+            self.conexao.request(metodo, caminho, body=corpo, headers=headers)
+            resposta = self.conexao.getresponse()
+            resposta.read()
+            status = resposta.status
+        except (OSError, http.client.HTTPException):
+            self.conexao.close()
+            self.conexao = http.client.HTTPConnection("127.0.0.1", self.porta, timeout=30)
+            status = 0
+        return status, time.perf_counter() - inicio
+
+
+def gerar_carga(porta: int, concorrencia: int, duracao: float, aquecimento: float, seed: int) -> Dict[str, Any]:
+    latencias: Dict[str, List[float]] = {rota: [] for _, rota in MIX_ROTAS}
+    erros: Dict[str, int] = {rota: 0 for _, rota in MIX_ROTAS}
+    lock = threading.Lock()
+    inicio_medicao = time.monotonic() + aquecimento
+    fim = inicio_medicao + duracao
+
+    def trabalhador(indice: int) -> None:
+        rng = random.Random(seed + indice)
+        cliente = Cliente(porta, rng)
+        locais: Dict[str, List[float]] = {rota: [] for _, rota in MIX_ROTAS}
+        falhas: Dict[str, int] = {rota: 0 for _, rota in MIX_ROTAS}
+        while time.monotonic() < fim:
+            rota = _sortear(MIX_ROTAS, rng)
+            status, segundos = cliente.executar(rota)
+            if time.monotonic() < inicio_medicao:
+                continue
+            if 200 <= status < 400:
+                locais[rota].append(segundos)
+            else:
+                falhas[rota] += 1
+        with lock:
+            for rota in locais:
+                latencias[rota].extend(locais[rota])
+                erros[rota] += falhas[rota]
+
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        list(executor.map(trabalhador, range(concorrencia)))
+
+    rotas: Dict[str, Any] = {}
+    total = 0
+    for rota, valores in latencias.items():
+        total += len(valores)
+        rotas[rota] = {
+            "requisicoes": len(valores),
+            "erros": erros[rota],
+            "req_s": round(len(valores) / duracao, 2),
+            "p50_ms": _ms(percentil(valores, 50)),
+            "p95_ms": _ms(percentil(valores, 95)),
+            "p99_ms": _ms(percentil(valores, 99)),
+        }
+    return {"total_req_s": round(total / duracao, 2), "rotas": rotas}
+
+
+# ---------------------------------------------------------------------- comparação
+def comparar(atual: Dict[str, Any], base: Dict[str, Any], tolerancia: float) -> List[str]:
+    """Regressões de vazão (queda) e de latência p95/p99 (alta) acima da tolerância."""
+    regressoes = []
+    if atual["total_req_s"] < base["total_req_s"] * (1 - tolerancia):
+        regressoes.append(f"vazão total {base['total_req_s']} -> {atual['total_req_s']} req/s")
+    for grupo in ("rotas", "etapas"):
+        for nome, valores in atual.get(grupo, {}).items():
+            anterior = base.get(grupo, {}).get(nome)
+            if not anterior:
+                continue
+            for campo in ("p95_ms", "p99_ms"):
+                novo, velho = valores.get(campo), anterior.get(campo)
+                if novo is None or velho in (None, 0):
+                    continue
+                if novo > velho * (1 + tolerancia):
+                    regressoes.append(f"{grupo}/{nome} {campo} {velho} -> {novo}")
+    return regressoes
+
+
+def _commit_atual() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Teste de carga da aplicação Flask")
+    parser.add_argument("--gunicorn", type=int, default=0, metavar="WORKERS",
+                        help="sobe gunicorn com N workers (0 = servidor werkzeug em processo)")
+    parser.add_argument("--worker-class", default="sync", choices=("sync", "gthread", "gevent"),
+                        help="tipo de worker do gunicorn (ver gunicorn.conf.py)")
+    parser.add_argument("--sampler", choices=("stub", "real"), default="stub")
+    parser.add_argument("--concorrencia", type=int, default=16)
+    parser.add_argument("--duracao", type=float, default=10.0)
+    parser.add_argument("--aquecimento", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--s3-dir", default=None, help="diretório do S3 falso (padrão: só memória)")
+    parser.add_argument("--saida", default="bench_load.json")
+    parser.add_argument("--comparar", default=None, help="resultado anterior para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=0.10)
+    args = parser.parse_args()
+
+    with Servidor(args.gunicorn, args.sampler, args.s3_dir, args.worker_class) as servidor:
+        antes = coletar_histogramas(servidor.porta)
+        carga = gerar_carga(servidor.porta, args.concorrencia, args.duracao, args.aquecimento, args.seed)
+        # Espera os workers gravarem as métricas do fim da rodada
+        time.sleep(1.5)
+        depois = coletar_histogramas(servidor.porta)
+
+    resultado = {
+        "gerado_em": datetime.datetime.utcnow().isoformat() + "Z",
+        "commit": _commit_atual(),
+        "configuracao": {
+            "servidor": f"gunicorn -w {args.gunicorn} -k {args.worker_class}" if args.gunicorn else "werkzeug threaded",
+            "sampler": args.sampler,
+            "concorrencia": args.concorrencia,
+            "duracao_s": args.duracao,
+            "seed": args.seed,
+        },
+        "total_req_s": carga["total_req_s"],
+        "rotas": carga["rotas"],
+        # Etapas incluem o aquecimento (as métricas do servidor não distinguem a janela)
+        "etapas": resumir_etapas(antes, depois),
+    }
+
+    with open(args.saida, "w", encoding="utf-8") as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+
+    print(f"{resultado['configuracao']['servidor']}: {resultado['total_req_s']} req/s")
+    for rota, dados in resultado["rotas"].items():
+        print(f"  {rota:<22} {dados['req_s']:>9} req/s  p50 {dados['p50_ms']} ms  "
+              f"p95 {dados['p95_ms']} ms  p99 {dados['p99_ms']} ms  erros {dados['erros']}")
+    for etapa, dados in resultado["etapas"].items():
+        print(f"  etapa {etapa:<16} {dados['amostras']:>9} amostras  p50 <= {dados['p50_ms']} ms  "
+              f"p95 <= {dados['p95_ms']} ms  p99 <= {dados['p99_ms']} ms")
+    print(f"resultado gravado em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            base = json.load(arquivo)
+        regressoes = comparar(resultado, base, args.tolerancia)
+        for regressao in regressoes:
+            print(f"REGRESSÃO: {regressao}")
+        return 1 if regressoes else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+# benchmarks/startup_report.py
+# Custo de inicialização de cada ponto de entrada: tempo de import, memória (RSS) e dependências carregadas
+#
+# Uso:
+#   python benchmarks/startup_report.py
+#   python benchmarks/startup_report.py --repeticoes 10 --saida bench_startup.json
+#   python benchmarks/startup_report.py --saida atual.json --comparar base.json --tolerancia 0.15
+#
+# Cada medição roda num processo Python novo, como um worker do gunicorn recém-criado.
+
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Ponto de entrada -> módulo importado
+ALVOS: Dict[str, str] = {
+    "flask": "app",
+    "streamlit": "streamlit_app",
+    "agente": "agent",
+}
+
+# Pacotes pesados que só devem ser carregados quando usados
+PESADOS = ("streamlit", "pandas", "pyarrow", "numpy", "boto3", "botocore", "psutil", "gevent", "msgpack", "yaml")
+
+# Executado no processo filho: importa o alvo e, no Flask, atende uma primeira requisição
+_SONDA = r"""
+import json, resource, sys, threading, time
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as arquivo:
+            for linha in arquivo:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximo / (1024 * 1024) if sys.platform == "darwin" else maximo / 1024
+
+base_rss, base_modulos = rss_mb(), len(sys.modules)
+inicio = time.perf_counter()
+modulo = __import__(sys.argv[1])
+resultado = {
+    "import_ms": (time.perf_counter() - inicio) * 1000,
+    "rss_mb": rss_mb(),
+    "rss_import_mb": rss_mb() - base_rss,
+    "modulos": len(sys.modules) - base_modulos,
+    "threads": threading.active_count(),
+    "pesados": sorted(p for p in sys.argv[2].split(",") if p in sys.modules),
+}
+app = getattr(modulo, "app", None)
+if app is not None and hasattr(app, "test_client"):
+    inicio = time.perf_counter()
+    resposta = app.test_client().get("/api/v1/diagnose?sintomas=lento&hardware=1")
+    resultado["primeira_requisicao_ms"] = (time.perf_counter() - inicio) * 1000
+    resultado["status"] = resposta.status_code
+    resultado["rss_apos_requisicao_mb"] = rss_mb()
+print(json.dumps(resultado))
+"""
+
+
+def medir(modulo: str) -> Optional[Dict[str, Any]]:
+    """Uma medição num processo novo; None se o módulo não puder ser importado (dependência ausente)."""
+    processo = subprocess.run(
+        [sys.executable, "-c", _SONDA, modulo, ",".join(PESADOS)],
+        cwd=RAIZ,
+        capture_output=True,
+        text=True,
+        # Sem bucket: a primeira requisição não deve depender do S3
+        env=dict(os.environ, S3_LOG_BUCKET=""),
+    )
+    if processo.returncode != 0:
+        print(f"  {modulo}: falhou ({processo.stderr.strip().splitlines()[-1:]})", file=sys.stderr)
+        return None
+    return json.loads(processo.stdout.strip().splitlines()[-1])
+
+
+def resumir(medicoes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Mediana dos campos numéricos; os demais vêm da última medição."""
+    resumo: Dict[str, Any] = dict(medicoes[-1])
+    for campo, valor in medicoes[-1].items():
+        if isinstance(valor, float):
+            resumo[campo] = round(statistics.median(m[campo] for m in medicoes), 1)
+    # Após o import, só a thread principal: seguro para o --preload do gunicorn
+    resumo["preload_seguro"] = resumo["threads"] == 1 and "boto3" not in resumo["pesados"]
+    return resumo
+
+
+def comparar(atual: Dict[str, Any], base: Dict[str, Any], tolerancia: float) -> List[str]:
+    """Regressões de tempo de import, RSS e primeira requisição acima da tolerância."""
+    regressoes = []
+    for alvo, valores in atual["alvos"].items():
+        anterior = base.get("alvos", {}).get(alvo)
+        if not anterior:
+            continue
+        for campo in ("import_ms", "rss_mb", "primeira_requisicao_ms"):
+            novo, velho = valores.get(campo), anterior.get(campo)
+            if novo is None or velho in (None, 0):
+                continue
+            if novo > velho * (1 + tolerancia):
+                regressoes.append(f"{alvo} {campo} {velho} -> {novo}")
+        novos_pesados = set(valores["pesados"]) - set(anterior.get("pesados", []))
+        if novos_pesados:
+            regressoes.append(f"{alvo} passou a importar {', '.join(sorted(novos_pesados))}")
+    return regressoes
+
+
+def _commit_atual() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Tempo de import e memória dos pontos de entrada")
+    parser.add_argument("--alvos", default=",".join(ALVOS), help=f"subconjunto de {', '.join(ALVOS)}")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--saida", default="bench_startup.json")
+    parser.add_argument("--comparar", default=None, help="resultado anterior para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=0.15)
+    args = parser.parse_args()
+
+    alvos: Dict[str, Any] = {}
+    for alvo in args.alvos.split(","):
+        medicoes = [m for m in (medir(ALVOS[alvo]) for _ in range(args.repeticoes)) if m is not None]
+        if medicoes:
+            alvos[alvo] = resumir(medicoes)
+
+    resultado = {
+        "gerado_em": datetime.datetime.utcnow().isoformat() + "Z",
+        "commit": _commit_atual(),
+        "python": sys.version.split()[0],
+        "repeticoes": args.repeticoes,
+        "alvos": alvos,
+    }
+    with open(args.saida, "w", encoding="utf-8") as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+
+    for alvo, dados in alvos.items():
+        linha = (f"  {alvo:<10} import {dados['import_ms']:>7} ms  RSS {dados['rss_mb']:>6} MB "
+                 f"(+{dados['rss_import_mb']} MB, {dados['modulos']} módulos)  threads {dados['threads']}")
+        if "primeira_requisicao_ms" in dados:
+            linha += f"  1ª requisição {dados['primeira_requisicao_ms']} ms -> RSS {dados['rss_apos_requisicao_mb']} MB"
+        print(linha)
+        print(f"  {'':<10} pesados: {', '.join(dados['pesados']) or '-'}  preload seguro: "
+              f"{'sim' if dados['preload_seguro'] else 'não'}")
+    print(f"resultado gravado em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            base = json.load(arquivo)
+        regressoes = comparar(resultado, base, args.tolerancia)
+        for regressao in regressoes:
+            print(f"REGRESSÃO: {regressao}")
+        return 1 if regressoes else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
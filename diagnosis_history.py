@@ -0,0 +1,457 @@
+# diagnosis_history.py
+# Histórico local de diagnósticos em SQLite (WAL), com gravação em lote fora da requisição e consultas paginadas
+
+import atexit
+import datetime
+import json
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from offload import executar_bloqueante
+
+# Arquivo do banco (compartilhado entre os workers); desativado enquanto não for configurado.
+# Use um caminho absoluto fora do diretório da aplicação (o banco guarda a descrição livre dos usuários)
+DIAGNOSIS_HISTORY_DB = os.getenv("DIAGNOSIS_HISTORY_DB", "")
+DIAGNOSIS_HISTORY_QUEUE_SIZE = int(os.getenv("DIAGNOSIS_HISTORY_QUEUE_SIZE", "10000"))
+DIAGNOSIS_HISTORY_BATCH_SIZE = int(os.getenv("DIAGNOSIS_HISTORY_BATCH_SIZE", "500"))
+DIAGNOSIS_HISTORY_FLUSH_SECONDS = float(os.getenv("DIAGNOSIS_HISTORY_FLUSH_SECONDS", "1"))
+# Itens por página de /api/history (padrão e máximo)
+DIAGNOSIS_HISTORY_PAGE_SIZE = int(os.getenv("DIAGNOSIS_HISTORY_PAGE_SIZE", "50"))
+DIAGNOSIS_HISTORY_MAX_PAGE = int(os.getenv("DIAGNOSIS_HISTORY_MAX_PAGE", "500"))
+
+# Maior instante aceito em consultas (unix, segundos): fim do ano 9999
+_TS_MAXIMO = 253402300799
+_INTEIRO_SQLITE = 2 ** 63 - 1
+
+# Espera por um lock de escrita de outro worker antes de desistir do lote
+_BUSY_TIMEOUT_MS = 5000
+
+# Tabelas de índice (sintoma/diagnóstico, ts, id) sem rowid: cada filtro é um intervalo contíguo
+# da chave primária, e contar ou paginar não precisa tocar na tabela principal
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS diagnosticos (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    hostname TEXT NOT NULL,
+    origem TEXT,
+    versao_regras TEXT,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_diagnosticos_ts ON diagnosticos (ts, id);
+CREATE INDEX IF NOT EXISTS ix_diagnosticos_host_ts ON diagnosticos (hostname, ts, id);
+CREATE TABLE IF NOT EXISTS diagnostico_sintomas (
+    sintoma TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    PRIMARY KEY (sintoma, ts, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS diagnostico_regras (
+    diagnostico TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    PRIMARY KEY (diagnostico, ts, id)
+) WITHOUT ROWID;
+"""
+
+# Filtro da API -> (tabela de índice, coluna)
+_FILTROS_INDEXADOS = {
+    "sintoma": ("diagnostico_sintomas", "sintoma"),
+    "diagnostico": ("diagnostico_regras", "diagnostico"),
+}
+
+# Marcador interno usado por flush() para sincronizar com o worker
+_FLUSH = object()
+
+
+class HistoryError(ValueError):
+    """Parâmetro de consulta inválido (cursor, intervalo ou campo)."""
+
+
+def _segundos_em_ms(segundos: float, nome: str) -> int:
+    """Segundos -> ms, recusando infinito, NaN e valores fora de [0, ano 9999]."""
+    if not math.isfinite(segundos) or not 0 <= segundos <= _TS_MAXIMO:
+        raise HistoryError(f"{nome} fora do intervalo aceito")
+    return int(segundos * 1000)
+
+
+def timestamp_ms(valor: Any) -> int:
+    """Milissegundos UTC de um `timestamp_utc` ISO 8601 (com ou sem "Z") ou de um número unix em segundos."""
+    if isinstance(valor, (int, float)):
+        return _segundos_em_ms(float(valor), "timestamp")
+    texto = str(valor).strip()
+    try:
+        segundos: Optional[float] = float(texto)
+    except ValueError:
+        segundos = None
+    if segundos is not None:
+        return _segundos_em_ms(segundos, "timestamp")
+    try:
+        instante = datetime.datetime.fromisoformat(texto.replace("Z", "+00:00"))
+    except ValueError as e:
+        raise HistoryError(f"timestamp inválido: {valor!r}") from e
+    if instante.tzinfo is None:
+        instante = instante.replace(tzinfo=datetime.timezone.utc)
+    return _segundos_em_ms(instante.timestamp(), "timestamp")
+
+
+def duracao_ms(valor: Any) -> int:
+    """Duração em segundos (parâmetro `ultimos`) -> ms."""
+    try:
+        segundos = float(valor)
+    except (TypeError, ValueError):
+        raise HistoryError("ultimos deve ser numérico") from None
+    return _segundos_em_ms(segundos, "ultimos")
+
+
+def _linha(payload: Dict[str, Any]) -> Tuple[int, str, Optional[str], Optional[str], str, List[str], List[str]]:
+    """(ts, hostname, origem, versão, json, sintomas, diagnósticos) de um `log_payload`."""
+    try:
+        ts = timestamp_ms(payload.get("timestamp_utc") or time.time())
+    except HistoryError:
+        ts = int(time.time() * 1000)
+    resumo = payload.get("resumo_hardware") or {}
+    sintomas = [str(s) for s in dict.fromkeys(payload.get("sintomas") or [])]
+    diagnosticos = [
+        str(d["diagnostico"]) for d in payload.get("diagnosticos") or [] if isinstance(d, dict) and d.get("diagnostico")
+    ]
+    return (
+        ts,
+        str(resumo.get("hostname") or ""),
+        payload.get("origem"),
+        payload.get("versao_regras"),
+        json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str),
+        sintomas,
+        list(dict.fromkeys(diagnosticos)),
+    )
+
+
+def codificar_cursor(ts: int, id_: int) -> str:
+    return f"{ts}_{id_}"
+
+
+def decodificar_cursor(cursor: str) -> Tuple[int, int]:
+    try:
+        ts, id_ = (int(parte) for parte in cursor.split("_", 1))
+    except ValueError as e:
+        raise HistoryError("cursor inválido") from e
+    if not (0 <= ts <= _INTEIRO_SQLITE and 0 <= id_ <= _INTEIRO_SQLITE):
+        raise HistoryError("cursor inválido")
+    return ts, id_
+
+
+class DiagnosisHistory:
+    """
+    Histórico de diagnósticos em um arquivo SQLite compartilhado pelos workers.
+    - registrar() só enfileira o payload (sem I/O na requisição); uma thread por
+      processo grava os registros em lotes, uma transação por lote.
+    - WAL: leitores não bloqueiam o escritor nem uns aos outros, e vários processos
+      podem gravar no mesmo arquivo (um de cada vez, esperando até _BUSY_TIMEOUT_MS).
+    - consultar() pagina por chave (ts, id) em ordem decrescente: cada página é uma
+      descida no índice, com custo independente da profundidade, ao contrário de OFFSET.
+    """
+
+    def __init__(
+        self,
+        caminho: str = DIAGNOSIS_HISTORY_DB,
+        max_fila: int = DIAGNOSIS_HISTORY_QUEUE_SIZE,
+        max_lote: int = DIAGNOSIS_HISTORY_BATCH_SIZE,
+        max_idade_lote: float = DIAGNOSIS_HISTORY_FLUSH_SECONDS,
+    ) -> None:
+        self.caminho = caminho
+        self.max_lote = max_lote
+        self.max_idade_lote = max_idade_lote
+
+        self._fila: "queue.Queue[Any]" = queue.Queue(maxsize=max_fila)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._encerrado = False
+        self._esquema_pronto = False
+        # Conexões de leitura reaproveitadas entre requisições (uma por consulta simultânea)
+        self._leitores: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._leitores_pid: Optional[int] = None
+
+        self._metricas: Dict[str, int] = {
+            "enfileirados": 0,
+            "descartados_fila_cheia": 0,
+            "gravados": 0,
+            "lotes": 0,
+            "falhas": 0,
+        }
+
+    @property
+    def ativo(self) -> bool:
+        return bool(self.caminho)
+
+    # ------------------------------------------------------------------ conexões
+    def _conectar(self) -> sqlite3.Connection:
+        conexao = sqlite3.connect(self.caminho, timeout=_BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                                  isolation_level=None)
+        conexao.execute(f"PRAGMA busy_timeout = {_BUSY_TIMEOUT_MS}")
+        conexao.execute("PRAGMA synchronous = NORMAL")
+        if not self._esquema_pronto:
+            # journal_mode fica gravado no arquivo; basta o primeiro processo a abrir
+            conexao.execute("PRAGMA journal_mode = WAL")
+            conexao.executescript(_ESQUEMA)
+            self._esquema_pronto = True
+        return conexao
+
+    def _obter_leitor(self) -> sqlite3.Connection:
+        if self._leitores_pid != os.getpid():
+            # Conexões herdadas de outro processo (fork) não podem ser usadas
+            self._leitores = queue.LifoQueue()
+            self._leitores_pid = os.getpid()
+        try:
+            return self._leitores.get_nowait()
+        except queue.Empty:
+            conexao = self._conectar()
+            conexao.execute("PRAGMA query_only = 1")
+            return conexao
+
+    def _consultar_sql(self, sql: str, parametros: Iterable[Any]) -> List[Tuple[Any, ...]]:
+        conexao = self._obter_leitor()
+        leitores = self._leitores
+        try:
+            return conexao.execute(sql, tuple(parametros)).fetchall()
+        finally:
+            leitores.put(conexao)
+
+    # ------------------------------------------------------------------ escrita
+    def registrar(self, payload: Dict[str, Any]) -> bool:
+        """Enfileira um `log_payload` sem bloquear. Retorna False se ele foi descartado."""
+        if not self.ativo or self._encerrado:
+            return False
+        self._garantir_worker()
+        try:
+            self._fila.put_nowait(payload)
+        except queue.Full:
+            with self._lock:
+                self._metricas["descartados_fila_cheia"] += 1
+            return False
+        with self._lock:
+            self._metricas["enfileirados"] += 1
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Grava tudo que já foi enfileirado. Retorna False em timeout."""
+        if self._thread is None or not self._thread.is_alive():
+            return self._fila.empty()
+        concluido = threading.Event()
+        try:
+            self._fila.put((_FLUSH, concluido), timeout=timeout)
+        except queue.Full:
+            return False
+        return concluido.wait(timeout)
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """Grava o que restou na fila e encerra o worker (registrado no atexit)."""
+        if self._encerrado:
+            return
+        self.flush(timeout)
+        self._encerrado = True
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            try:
+                self._fila.put(None, timeout=timeout)
+            except queue.Full:
+                return
+            thread.join(timeout)
+
+    def metricas(self) -> Dict[str, int]:
+        with self._lock:
+            dados = dict(self._metricas)
+        dados["fila_atual"] = self._fila.qsize()
+        return dados
+
+    def _garantir_worker(self) -> None:
+        # Mesmo esquema do log_shipper: o caminho rápido só compara o pid
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._executar, name="diagnosis-history", daemon=True)
+            self._thread.start()
+
+    def _executar(self) -> None:
+        conexao: Optional[sqlite3.Connection] = None
+        lote: List[Dict[str, Any]] = []
+        inicio_lote = 0.0
+        while True:
+            espera = max(0.0, self.max_idade_lote - (time.monotonic() - inicio_lote)) if lote else None
+            try:
+                item = self._fila.get(timeout=espera)
+            except queue.Empty:
+                item = _FLUSH
+
+            sinal_flush: Optional[threading.Event] = None
+            if isinstance(item, tuple) and item and item[0] is _FLUSH:
+                sinal_flush = item[1]
+                item = _FLUSH
+            if isinstance(item, dict):
+                if not lote:
+                    inicio_lote = time.monotonic()
+                lote.append(item)
+
+            if lote and (len(lote) >= self.max_lote or item is _FLUSH or item is None):
+                try:
+                    if conexao is None:
+                        conexao = self._conectar()
+                    # Com gevent, o commit (fsync) não pode segurar o hub
+                    executar_bloqueante(self._gravar_lote, conexao, lote)
+                except sqlite3.Error:
+                    with self._lock:
+                        self._metricas["falhas"] += len(lote)
+                else:
+                    with self._lock:
+                        self._metricas["gravados"] += len(lote)
+                        self._metricas["lotes"] += 1
+                lote = []
+
+            if sinal_flush is not None:
+                sinal_flush.set()
+            if item is None:
+                if conexao is not None:
+                    conexao.close()
+                return
+
+    @staticmethod
+    def _gravar_lote(conexao: sqlite3.Connection, lote: List[Dict[str, Any]]) -> None:
+        linhas = [_linha(payload) for payload in lote]
+        sintomas: List[Tuple[str, int, int]] = []
+        regras: List[Tuple[str, int, int]] = []
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            for ts, hostname, origem, versao, corpo, codigos, diagnosticos in linhas:
+                id_ = conexao.execute(
+                    "INSERT INTO diagnosticos (ts, hostname, origem, versao_regras, payload) VALUES (?, ?, ?, ?, ?)",
+                    (ts, hostname, origem, versao, corpo),
+                ).lastrowid
+                sintomas.extend((codigo, ts, id_) for codigo in codigos)
+                regras.extend((diagnostico, ts, id_) for diagnostico in diagnosticos)
+            conexao.executemany("INSERT INTO diagnostico_sintomas (sintoma, ts, id) VALUES (?, ?, ?)", sintomas)
+            conexao.executemany("INSERT INTO diagnostico_regras (diagnostico, ts, id) VALUES (?, ?, ?)", regras)
+            conexao.execute("COMMIT")
+        except BaseException:
+            conexao.execute("ROLLBACK")
+            raise
+
+    # ------------------------------------------------------------------ leitura
+    def consultar(
+        self,
+        hostname: Optional[str] = None,
+        sintoma: Optional[str] = None,
+        diagnostico: Optional[str] = None,
+        inicio: Optional[int] = None,
+        fim: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limite: int = DIAGNOSIS_HISTORY_PAGE_SIZE,
+    ) -> Dict[str, Any]:
+        """
+        Diagnósticos do mais recente para o mais antigo, com filtros combináveis.
+        `inicio`/`fim` em ms UTC (fim exclusivo). `cursor` é o `proximo` da página anterior.
+        A consulta percorre o índice mais seletivo disponível, (hostname, ts, id) se houver
+        host, senão a tabela do sintoma ou do diagnóstico, senão (ts, id); os demais
+        filtros são buscas pontuais por linha percorrida.
+        """
+        limite = max(1, min(limite, DIAGNOSIS_HISTORY_MAX_PAGE))
+        filtros = {"sintoma": sintoma, "diagnostico": diagnostico}
+        guia = None
+        if hostname is None:
+            guia = next((campo for campo in ("sintoma", "diagnostico") if filtros[campo] is not None), None)
+
+        condicoes: List[str] = []
+        parametros: List[Any] = []
+        if guia is not None:
+            tabela, coluna = _FILTROS_INDEXADOS[guia]
+            origem = f"{tabela} AS g JOIN diagnosticos AS d ON d.id = g.id"
+            condicoes.append(f"g.{coluna} = ?")
+            parametros.append(filtros[guia])
+            chave = "g"
+        else:
+            origem = "diagnosticos AS d"
+            chave = "d"
+        for campo in ("sintoma", "diagnostico"):
+            if campo != guia and filtros[campo] is not None:
+                tabela, coluna = _FILTROS_INDEXADOS[campo]
+                condicoes.append(f"EXISTS (SELECT 1 FROM {tabela} AS f WHERE f.{coluna} = ? AND f.ts = d.ts AND f.id = d.id)")
+                parametros.append(filtros[campo])
+        if hostname is not None:
+            condicoes.append("d.hostname = ?")
+            parametros.append(hostname)
+        if inicio is not None:
+            condicoes.append(f"{chave}.ts >= ?")
+            parametros.append(inicio)
+        if fim is not None:
+            condicoes.append(f"{chave}.ts < ?")
+            parametros.append(fim)
+        if cursor:
+            condicoes.append(f"({chave}.ts, {chave}.id) < (?, ?)")
+            parametros.extend(decodificar_cursor(cursor))
+
+        where = " AND ".join(condicoes) or "1"
+        sql = (
+            f"SELECT d.id, d.ts, d.payload FROM {origem} WHERE {where} "
+            f"ORDER BY {chave}.ts DESC, {chave}.id DESC LIMIT ?"
+        )
+        # Uma linha a mais indica se existe próxima página
+        linhas = self._consultar_sql(sql, [*parametros, limite + 1])
+
+        itens = []
+        for id_, ts, corpo in linhas[:limite]:
+            registro = json.loads(corpo)
+            registro["id"] = id_
+            itens.append(registro)
+        proximo = codificar_cursor(linhas[limite - 1][1], linhas[limite - 1][0]) if len(linhas) > limite else None
+        return {"itens": itens, "proximo": proximo}
+
+    def contar(
+        self,
+        campo: str,
+        valor: Optional[str] = None,
+        inicio: Optional[int] = None,
+        fim: Optional[int] = None,
+    ) -> Dict[str, int]:
+        """
+        Ocorrências por sintoma ou diagnóstico no intervalo (ms UTC, fim exclusivo).
+        Cada valor é uma contagem sobre um intervalo da chave (valor, ts); sem `valor`,
+        os valores distintos são encontrados saltando pelo índice (um MIN por valor).
+        """
+        if campo not in _FILTROS_INDEXADOS:
+            raise HistoryError(f"campo deve ser um de: {', '.join(_FILTROS_INDEXADOS)}")
+        tabela, coluna = _FILTROS_INDEXADOS[campo]
+        sql_contagem = f"SELECT COUNT(*) FROM {tabela} WHERE {coluna} = ? AND ts >= ? AND ts < ?"
+        intervalo = (inicio if inicio is not None else -(2 ** 63), fim if fim is not None else 2 ** 63 - 1)
+
+        if valor is not None:
+            valores = [valor]
+        else:
+            valores = []
+            anterior = self._consultar_sql(f"SELECT MIN({coluna}) FROM {tabela}", ())[0][0]
+            while anterior is not None:
+                valores.append(anterior)
+                anterior = self._consultar_sql(f"SELECT MIN({coluna}) FROM {tabela} WHERE {coluna} > ?", (anterior,))[0][0]
+
+        contagens = {v: self._consultar_sql(sql_contagem, (v, *intervalo))[0][0] for v in valores}
+        return dict(sorted(((v, n) for v, n in contagens.items() if n), key=lambda item: (-item[1], item[0])))
+
+
+_historico: Optional[DiagnosisHistory] = None
+_historico_lock = threading.Lock()
+
+
+def obter_historico_diagnosticos() -> DiagnosisHistory:
+    """Instância única por processo, configurada pelas variáveis de ambiente."""
+    global _historico
+    if _historico is None:
+        with _historico_lock:
+            if _historico is None:
+                _historico = DiagnosisHistory()
+                atexit.register(_historico.shutdown)
+    return _historico
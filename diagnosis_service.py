@@ -0,0 +1,84 @@
+# diagnosis_service.py
+# Etapas do diagnóstico compartilhadas pelas interfaces Flask (app.py) e Streamlit (streamlit_app.py)
+
+import datetime
+from typing import Any, Dict, List, Optional
+
+from diagnosis_history import obter_historico_diagnosticos
+from hardware_sampler import obter_system_info
+from log_keys import host_local
+from log_shipper import S3_LOG_BUCKET, obter_shipper
+import metrics
+
+
+def get_system_info(coletar: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Retorna informações básicas de hardware do servidor.
+    Lê o último snapshot do amostrador em segundo plano (inclui `sampled_at`),
+    sem bloquear a requisição pela janela de medição de CPU.
+    Com `coletar=False` (requisição degradada) nunca coleta: devolve o último
+    snapshot disponível ou None.
+    """
+    with metrics.SYSINFO_SECONDS.time():
+        return obter_system_info(coletar)
+
+
+def montar_log_payload(
+    sintomas: List[str],
+    descricao_extra: str,
+    diagnosticos: List[Dict[str, str]],
+    versao_regras: str,
+    sysinfo: Optional[Dict[str, Any]],
+    sintomas_extraidos: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Registro de uma consulta no formato gravado no S3.
+    `sintomas_extraidos` (quando houver) são os códigos reconhecidos na descrição, já incluídos em `sintomas`.
+    Sem `sysinfo` (requisição degradada antes da primeira amostra), o resumo traz só o hostname.
+    """
+    if sysinfo is None:
+        resumo_hardware: Dict[str, Any] = {"hostname": host_local()}
+    else:
+        resumo_hardware = {
+            "hostname": sysinfo["hostname"],
+            "platform": sysinfo["platform"],
+            "platform_release": sysinfo["platform_release"],
+            "cpu_count": sysinfo["cpu_count"],
+            "memory_usage_percent": sysinfo["memory_usage_percent"],
+        }
+    payload = {
+        "timestamp_utc": datetime.datetime.utcnow().isoformat() + "Z",
+        "sintomas": sintomas,
+        "descricao_extra": descricao_extra,
+        "diagnosticos": diagnosticos,
+        "versao_regras": versao_regras,
+        "resumo_hardware": resumo_hardware,
+    }
+    if sintomas_extraidos:
+        payload["sintomas_extraidos"] = sintomas_extraidos
+    return payload
+
+
+def registrar_historico(payload: Dict[str, Any]) -> None:
+    """Enfileira o registro da consulta no histórico local (diagnosis_history.py), se ativo."""
+    obter_historico_diagnosticos().registrar(payload)
+
+
+def salvar_log_s3(payload: Dict[str, Any], adiar: float = 0) -> None:
+    """
+    Enfileira o log da consulta para envio em lote ao S3 (se o bucket estiver configurado).
+    O envio acontece em segundo plano; aqui só há custo de enfileiramento.
+    Com `adiar` (segundos), o envio dos lotes fica suspenso por esse tempo para
+    liberar CPU e rede enquanto o servidor está sob carga; o registro não se perde.
+    """
+    if not S3_LOG_BUCKET:
+        # Se não tiver bucket configurado, não faz nada
+        return
+
+    with metrics.S3_LOG_SECONDS.time():
+        shipper = obter_shipper()
+        if adiar:
+            shipper.adiar_envio(adiar)
+        enfileirado = shipper.enviar(payload)
+    if not enfileirado:
+        raise RuntimeError("fila de logs cheia, registro descartado")
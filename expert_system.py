@@ -1,7 +1,618 @@
 # expert_system.py
 # Sistema especialista simples para diagnóstico de hardware
 
-from typing import List, Dict, Set
+import hashlib
+import heapq
+import json
+import os
+import signal
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import (
+    TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple,
+)
+
+from symptom_extractor import SymptomExtractor
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Base de conhecimento (sintomas + regras) versionada fora do código
+KNOWLEDGE_BASE_PATH = os.getenv(
+    "KNOWLEDGE_BASE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge_base.json"),
+)
+KNOWLEDGE_BASE_POLL_SECONDS = float(os.getenv("KNOWLEDGE_BASE_POLL_SECONDS", "5"))
+# Cache de diagnósticos por combinação de sintomas
+DIAGNOSIS_CACHE_SIZE = int(os.getenv("DIAGNOSIS_CACHE_SIZE", "4096"))
+# Pré-calcula todas as 2^n combinações quando o catálogo tem até n sintomas
+DIAGNOSIS_CACHE_PRECOMPUTE_MAX_SYMPTOMS = int(os.getenv("DIAGNOSIS_CACHE_PRECOMPUTE_MAX_SYMPTOMS", "12"))
+# Quantas regras parcialmente satisfeitas o diagnóstico ranqueado devolve
+DIAGNOSIS_TOP_K = int(os.getenv("DIAGNOSIS_TOP_K", "3"))
+
+DIAGNOSTICO_PADRAO: Dict[str, str] = {
+    "diagnostico": "Nenhuma causa específica identificada",
+    "causa_provavel": (
+        "Os sintomas informados não bateram com nenhuma regra específica do sistema especialista."
+    ),
+    "recomendacao": (
+        "Verifique se os sintomas foram descritos corretamente, "
+        "atualize drivers e sistema operacional, e se o problema persistir, "
+        "considere uma análise mais detalhada por um técnico."
+    ),
+}
+
+_CAMPOS_SINTOMA = ("value", "label", "icon", "hint")
+_CAMPOS_REGRA = ("diagnostico", "causa_provavel", "recomendacao")
+
+
+class FrozenDiagnosis(dict):
+    """Diagnóstico somente leitura, compartilhado entre requisições pelo cache."""
+
+    def _imutavel(self, *args: Any, **kwargs: Any) -> None:
+        raise TypeError("diagnóstico em cache é somente leitura")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _imutavel  # type: ignore[assignment]
+
+    def __reduce__(self) -> Tuple[type, Tuple[Dict[str, str]]]:
+        # Cópias e pickle viram dicionários comuns, que podem ser alterados livremente
+        return (dict, (dict(self),))
+
+
+class DiagnosisResult(NamedTuple):
+    """Resultado imutável de uma combinação de sintomas, com os rótulos já resolvidos."""
+
+    mascara: int
+    diagnosticos: Tuple[FrozenDiagnosis, ...]
+    rotulos: Tuple[str, ...]
+    resumo: str
+
+
+class DiagnosisCache:
+    """LRU limitado, indexado pela máscara de bits dos sintomas, com contadores de acerto."""
+
+    def __init__(self, capacidade: int = DIAGNOSIS_CACHE_SIZE) -> None:
+        self.capacidade = max(0, capacidade)
+        self._itens: "OrderedDict[int, DiagnosisResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+
+    def obter(self, mascara: int) -> Optional[DiagnosisResult]:
+        with self._lock:
+            item = self._itens.get(mascara)
+            if item is None:
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(mascara)
+            self.acertos += 1
+            return item
+
+    def guardar(self, item: DiagnosisResult) -> None:
+        if not self.capacidade:
+            return
+        with self._lock:
+            self._itens[item.mascara] = item
+            self._itens.move_to_end(item.mascara)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+                self.remocoes += 1
+
+    def estatisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "tamanho": len(self._itens),
+                "capacidade": self.capacidade,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "remocoes": self.remocoes,
+            }
+
+
+class KnowledgeBaseError(ValueError):
+    """Arquivo da base de conhecimento ausente, mal formado ou inconsistente."""
+
+
+def carregar_base(caminho: str) -> Dict[str, Any]:
+    """Lê a base de conhecimento (JSON, ou YAML se o PyYAML estiver instalado)."""
+    try:
+        with open(caminho, "rb") as arquivo:
+            conteudo = arquivo.read()
+    except OSError as e:
+        raise KnowledgeBaseError(f"não foi possível ler {caminho}: {e}") from e
+
+    try:
+        if caminho.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError as e:
+                raise KnowledgeBaseError("PyYAML não está instalado para ler bases .yaml") from e
+            dados = yaml.safe_load(conteudo)
+        else:
+            dados = json.loads(conteudo.decode("utf-8"))
+    except KnowledgeBaseError:
+        raise
+    except Exception as e:
+        raise KnowledgeBaseError(f"{caminho} inválido: {e}") from e
+
+    if not isinstance(dados, dict):
+        raise KnowledgeBaseError(f"{caminho} deve conter um objeto com 'versao', 'sintomas' e 'regras'")
+    dados.setdefault("_assinatura", hashlib.sha256(conteudo).hexdigest()[:12])
+    return dados
+
+
+def validar_base(dados: Mapping[str, Any]) -> None:
+    """Confere campos obrigatórios, códigos duplicados e condições com sintomas desconhecidos."""
+    if not dados.get("versao"):
+        raise KnowledgeBaseError("campo 'versao' ausente")
+
+    sintomas = dados.get("sintomas")
+    if not isinstance(sintomas, list) or not sintomas:
+        raise KnowledgeBaseError("'sintomas' deve ser uma lista não vazia")
+    codigos = set()
+    for posicao, item in enumerate(sintomas):
+        if not isinstance(item, dict) or any(not item.get(c) for c in ("value", "label")):
+            raise KnowledgeBaseError(f"sintoma #{posicao} sem 'value' ou 'label'")
+        if item["value"] in codigos:
+            raise KnowledgeBaseError(f"sintoma duplicado: {item['value']}")
+        codigos.add(item["value"])
+        sinonimos = item.get("sinonimos", [])
+        if not isinstance(sinonimos, list) or not all(isinstance(t, str) and t.strip() for t in sinonimos):
+            raise KnowledgeBaseError(f"sintoma {item['value']}: 'sinonimos' deve ser uma lista de textos")
+
+    regras = dados.get("regras")
+    if not isinstance(regras, list) or not regras:
+        raise KnowledgeBaseError("'regras' deve ser uma lista não vazia")
+
+    # Fatos intermediários: concluídos por regras e usados como condição por outras
+    fatos: Dict[str, List[str]] = {}
+    for posicao, rule in enumerate(regras):
+        if isinstance(rule, dict) and rule.get("conclui") is not None:
+            fato = rule["conclui"]
+            if not isinstance(fato, str) or not fato:
+                raise KnowledgeBaseError(f"regra {rule.get('id', f'#{posicao}')}: 'conclui' deve ser um texto")
+            if fato in codigos:
+                raise KnowledgeBaseError(f"regra {rule.get('id', f'#{posicao}')}: 'conclui' repete o sintoma {fato}")
+            fatos.setdefault(fato, [])
+
+    for posicao, rule in enumerate(regras):
+        nome = rule.get("id", f"#{posicao}") if isinstance(rule, dict) else f"#{posicao}"
+        if not isinstance(rule, dict):
+            raise KnowledgeBaseError(f"regra {nome} deve ser um objeto")
+        condicoes = rule.get("condicoes")
+        if not isinstance(condicoes, list) or not condicoes:
+            raise KnowledgeBaseError(f"regra {nome}: 'condicoes' deve ser uma lista não vazia")
+        desconhecidos = [c for c in condicoes if c not in codigos and c not in fatos]
+        if desconhecidos:
+            raise KnowledgeBaseError(f"regra {nome}: sintomas desconhecidos {desconhecidos}")
+        # Regras que só concluem um fato podem não ter textos de diagnóstico
+        faltando = [c for c in _CAMPOS_REGRA if not rule.get(c)]
+        if faltando and (rule.get("conclui") is None or len(faltando) < len(_CAMPOS_REGRA)):
+            raise KnowledgeBaseError(f"regra {nome}: campos ausentes {faltando}")
+        peso = rule.get("peso", 1)
+        if isinstance(peso, bool) or not isinstance(peso, (int, float)) or peso <= 0:
+            raise KnowledgeBaseError(f"regra {nome}: 'peso' deve ser um número positivo")
+        if rule.get("conclui") is not None:
+            fatos[rule["conclui"]].extend(c for c in condicoes if c in fatos)
+
+    # Um fato não pode depender (direta ou indiretamente) de si mesmo
+    visitados: Dict[str, int] = {}
+
+    def _visitar(fato: str, caminho: List[str]) -> None:
+        estado = visitados.get(fato, 0)
+        if estado == 2:
+            return
+        if estado == 1:
+            raise KnowledgeBaseError(f"ciclo entre fatos: {' -> '.join(caminho + [fato])}")
+        visitados[fato] = 1
+        for dependencia in fatos[fato]:
+            _visitar(dependencia, caminho + [fato])
+        visitados[fato] = 2
+
+    for fato in fatos:
+        _visitar(fato, [])
+
+
+class RuleIndex:
+    """
+    Índice compilado das regras.
+    Cada sintoma vira uma posição de bit e cada regra vira uma máscara com seus sintomas.
+    As regras são agrupadas pelo sintoma exigido mais raro, então um diagnóstico só
+    confere (com AND de inteiros) as regras dos grupos dos sintomas informados.
+    Fatos intermediários (campo `conclui`) também recebem bits, depois do catálogo;
+    `fechar_mask` encadeia as regras até não surgir fato novo.
+    """
+
+    def __init__(self, rules: Sequence[Mapping], codigos: Sequence[str] = ()) -> None:
+        frequencia: Dict[str, int] = {}
+        for rule in rules:
+            for sintoma in rule["condicoes"]:
+                frequencia[sintoma] = frequencia.get(sintoma, 0) + 1
+
+        # Bits atribuídos em ordem estável: catálogo primeiro, depois ordem de aparição nas regras
+        self.bits: Dict[str, int] = {}
+        for sintoma in codigos:
+            if sintoma not in self.bits:
+                self.bits[sintoma] = len(self.bits)
+        for rule in rules:
+            for sintoma in sorted(rule["condicoes"]):
+                if sintoma not in self.bits:
+                    self.bits[sintoma] = len(self.bits)
+
+        # Fatos concluídos por regras também viram bits
+        for rule in rules:
+            fato = rule.get("conclui")
+            if fato and fato not in self.bits:
+                self.bits[fato] = len(self.bits)
+        # Colunas de diagnose_batch: só sintomas informáveis (fatos são concluídos, nunca informados)
+        concluidos = {rule.get("conclui") for rule in rules if rule.get("conclui")}
+        self.sintomas: List[str] = [s for s in self.bits if s not in concluidos]
+
+        self.masks: List[int] = []
+        self.tamanhos: List[int] = []
+        # Bit do fato concluído por regra (None quando a regra só diagnostica)
+        self.conclusoes: List[Optional[int]] = []
+        # Regras que exigem cada bit (memória alfa das sessões de inferência)
+        self.por_condicao: Dict[int, List[int]] = {}
+        # Regras que concluem cada fato
+        self.produtores: Dict[int, List[int]] = {}
+        self.buckets: Dict[int, List[int]] = {}
+        # Regras sem condições casam com qualquer entrada
+        self.sempre: List[int] = []
+        self._matriz: Optional["np.ndarray"] = None
+
+        for posicao, rule in enumerate(rules):
+            mask = 0
+            for sintoma in rule["condicoes"]:
+                mask |= 1 << self.bits[sintoma]
+                self.por_condicao.setdefault(self.bits[sintoma], []).append(posicao)
+            self.masks.append(mask)
+            self.tamanhos.append(len(rule["condicoes"]))
+            fato = rule.get("conclui")
+            self.conclusoes.append(self.bits[fato] if fato else None)
+            if fato:
+                self.produtores.setdefault(self.bits[fato], []).append(posicao)
+
+            if not rule["condicoes"]:
+                self.sempre.append(posicao)
+                continue
+            mais_raro = min(rule["condicoes"], key=lambda s: (frequencia[s], self.bits[s]))
+            self.buckets.setdefault(self.bits[mais_raro], []).append(posicao)
+
+        # True se alguma regra conclui um fato intermediário (calculado uma vez: fechar_mask roda a cada diagnóstico)
+        self.encadeia = bool(self.produtores)
+
+    @property
+    def codigos(self) -> List[str]:
+        """Sintomas conhecidos, ordenados pela posição de bit."""
+        return list(self.bits)
+
+    def matriz_condicoes(self) -> "np.ndarray":
+        """Matriz (regras x sintomas) com 1 nas condições de cada regra, criada no primeiro uso."""
+        if self._matriz is None:
+            import numpy as np
+
+            matriz = np.zeros((len(self.masks), len(self.bits)), dtype=np.float32)
+            for posicao, mask in enumerate(self.masks):
+                for bit in range(mask.bit_length()):
+                    if mask >> bit & 1:
+                        matriz[posicao, bit] = 1.0
+            self._matriz = matriz
+        return self._matriz
+
+    def decodificar(self, mask: int) -> List[str]:
+        """Códigos dos sintomas presentes na máscara, na ordem dos bits."""
+        codigos = self.codigos
+        return [codigos[bit] for bit in range(mask.bit_length()) if mask >> bit & 1]
+
+    def mascara(self, symptoms: Iterable[str]) -> int:
+        """Máscara dos sintomas informados; sintomas desconhecidos não casam com nenhuma regra."""
+        mask = 0
+        for sintoma in symptoms:
+            bit = self.bits.get(sintoma)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def match_mask(self, mask: int) -> List[int]:
+        """Posições (na ordem original) das regras cujas condições estão contidas na máscara."""
+        encontrados = list(self.sempre)
+        restante = mask
+        while restante:
+            menor = restante & -restante
+            restante ^= menor
+            for posicao in self.buckets.get(menor.bit_length() - 1, ()):
+                regra = self.masks[posicao]
+                if regra & mask == regra:
+                    encontrados.append(posicao)
+        encontrados.sort()
+        return encontrados
+
+    def match(self, symptoms: Iterable[str]) -> List[int]:
+        return self.match_mask(self.mascara(symptoms))
+
+    def fechar_mask(self, mask: int) -> Tuple[int, List[int]]:
+        """
+        Encadeamento para frente: acrescenta à máscara os fatos concluídos pelas regras
+        que casam, até não surgir fato novo. Devolve a máscara final e as regras que casaram.
+        """
+        encontrados = self.match_mask(mask)
+        if not self.encadeia:
+            return mask, encontrados
+        while True:
+            novos = mask
+            for posicao in encontrados:
+                bit = self.conclusoes[posicao]
+                if bit is not None:
+                    novos |= 1 << bit
+            if novos == mask:
+                return mask, encontrados
+            mask = novos
+            encontrados = self.match_mask(mask)
+
+
+class RuleSnapshot:
+    """
+    Base de conhecimento compilada e imutável: catálogo de sintomas, regras e índice.
+    Um snapshot nunca é alterado; a recarga cria outro e troca a referência,
+    então quem já pegou um snapshot termina o diagnóstico com a mesma versão.
+    """
+
+    __slots__ = (
+        "versao", "assinatura", "sintomas", "symptom_labels", "rules", "index", "cache", "extrator", "_padrao",
+    )
+
+    def __init__(self, dados: Mapping[str, Any]) -> None:
+        validar_base(dados)
+        sintomas = tuple(
+            MappingProxyType({campo: item.get(campo, "") for campo in _CAMPOS_SINTOMA})
+            for item in dados["sintomas"]
+        )
+        rules = tuple(
+            MappingProxyType(
+                {
+                    "id": rule.get("id", str(posicao)),
+                    "condicoes": frozenset(rule["condicoes"]),
+                    "conclui": rule.get("conclui"),
+                    "diagnostico": rule.get("diagnostico", ""),
+                    "causa_provavel": rule.get("causa_provavel", ""),
+                    "recomendacao": rule.get("recomendacao", ""),
+                    "peso": float(rule.get("peso", 1)),
+                }
+            )
+            for posicao, rule in enumerate(dados["regras"])
+        )
+        attrs = {
+            "versao": str(dados["versao"]),
+            "assinatura": dados.get("_assinatura") or _assinar(dados),
+            "sintomas": sintomas,
+            "symptom_labels": MappingProxyType({item["value"]: item["label"] for item in sintomas}),
+            "rules": rules,
+            "index": RuleIndex(rules, [item["value"] for item in sintomas]),
+            # Cada snapshot tem o próprio cache: trocar as regras invalida tudo de uma vez
+            "cache": DiagnosisCache(),
+            # Rótulo e sinônimos de cada sintoma, para reconhecê-los no texto livre
+            "extrator": SymptomExtractor(
+                {item["value"]: [item["label"], *item.get("sinonimos", [])] for item in dados["sintomas"]}
+            ),
+            "_padrao": (FrozenDiagnosis(DIAGNOSTICO_PADRAO),),
+        }
+        for nome, valor in attrs.items():
+            object.__setattr__(self, nome, valor)
+
+        combinacoes = 1 << len(sintomas)
+        if len(sintomas) <= DIAGNOSIS_CACHE_PRECOMPUTE_MAX_SYMPTOMS and combinacoes <= self.cache.capacidade:
+            for mascara in range(combinacoes):
+                self.cache.guardar(self._calcular(mascara))
+
+    def __setattr__(self, nome: str, valor: Any) -> None:
+        raise AttributeError("RuleSnapshot é imutável")
+
+    @property
+    def symptom_codes(self) -> List[str]:
+        """Códigos de sintomas informáveis (sem os fatos intermediários), na ordem das colunas de diagnose_batch."""
+        return self.index.sintomas
+
+    def _formatar(self, posicao: int) -> Dict[str, str]:
+        rule = self.rules[posicao]
+        return {
+            "diagnostico": rule["diagnostico"],
+            "causa_provavel": rule["causa_provavel"],
+            "recomendacao": rule["recomendacao"],
+        }
+
+    def diagnosticavel(self, posicao: int) -> bool:
+        """Regras que só concluem um fato intermediário não aparecem como diagnóstico."""
+        return bool(self.rules[posicao]["diagnostico"])
+
+    def _calcular(self, mascara: int) -> DiagnosisResult:
+        _, encontrados = self.index.fechar_mask(mascara)
+        diagnosticos = tuple(
+            FrozenDiagnosis(self._formatar(p)) for p in encontrados if self.diagnosticavel(p)
+        )
+        rotulos = tuple(self.symptom_labels.get(codigo, codigo) for codigo in self.index.decodificar(mascara))
+        return DiagnosisResult(
+            mascara=mascara,
+            diagnosticos=diagnosticos or self._padrao,
+            rotulos=rotulos,
+            resumo=", ".join(rotulos) if rotulos else "nenhum sintoma informado",
+        )
+
+    def resolve(self, symptoms: Iterable[str]) -> DiagnosisResult:
+        """
+        Diagnóstico e rótulos da combinação de sintomas, via cache.
+        A chave é a máscara de bits (independe de ordem e repetições), e os rótulos
+        saem na ordem do catálogo. Códigos fora do catálogo não passam pelo cache.
+        """
+        symptoms = list(symptoms)
+        bits = self.index.bits
+        if any(s not in bits for s in symptoms):
+            resultado = self._calcular(self.index.mascara(symptoms))
+            conhecidos = [self.symptom_labels.get(s, s) for s in dict.fromkeys(symptoms)]
+            return resultado._replace(
+                rotulos=tuple(conhecidos), resumo=", ".join(conhecidos) or "nenhum sintoma informado"
+            )
+
+        mascara = self.index.mascara(symptoms)
+        resultado = self.cache.obter(mascara)
+        if resultado is None:
+            resultado = self._calcular(mascara)
+            self.cache.guardar(resultado)
+        return resultado
+
+    def diagnose(self, symptoms: List[str]) -> List[Dict[str, str]]:
+        """
+        Recebe lista de sintomas (strings) e retorna lista de diagnósticos.
+        Os dicionários são compartilhados pelo cache e não podem ser alterados.
+        """
+        return list(self.resolve(symptoms).diagnosticos)
+
+    def extrair_sintomas(self, texto: str) -> List[str]:
+        """Códigos de sintomas citados no texto livre (ex.: "esquentando e travando" -> superaquecendo, lento)."""
+        return self.extrator.extrair(texto)
+
+    def _rotulo_faltando(self, bit: int, presentes: int, codigos: Sequence[str]) -> str:
+        """Rótulo de uma condição ausente; um fato vira os sintomas que o concluiriam."""
+        codigo = codigos[bit]
+        if codigo in self.symptom_labels:
+            return self.symptom_labels[codigo]
+        alternativas = []
+        for produtor in self.index.produtores.get(bit, ()):
+            alternativas.extend(self.index.decodificar(self.index.masks[produtor] & ~presentes))
+        rotulos = [self.symptom_labels[c] for c in dict.fromkeys(alternativas) if c in self.symptom_labels]
+        return " ou ".join(rotulos) or codigo
+
+    def ranquear(
+        self, symptoms: Iterable[str], k: int = DIAGNOSIS_TOP_K, parciais: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Diagnóstico ranqueado por casamento parcial: as k regras com maior pontuação,
+        onde pontuação = peso da regra x fração das condições presentes.
+        Só as regras que usam algum sintoma informado (ou fato concluído) são contadas,
+        percorrendo o índice invertido sintoma -> regras, e um heap limitado a k escolhe
+        as melhores. Empates ficam com a regra de mais condições presentes e depois a
+        ordem da base. Com `parciais`, regras totalmente satisfeitas ficam de fora.
+        """
+        if k <= 0:
+            return []
+        indice = self.index
+        presentes, _ = indice.fechar_mask(indice.mascara(symptoms))
+        contagem: Dict[int, int] = {}
+        restante = presentes
+        while restante:
+            menor = restante & -restante
+            restante ^= menor
+            for posicao in indice.por_condicao.get(menor.bit_length() - 1, ()):
+                contagem[posicao] = contagem.get(posicao, 0) + 1
+
+        candidatos = (
+            (self.rules[p]["peso"] * casadas / indice.tamanhos[p], casadas, -p)
+            for p, casadas in contagem.items()
+            if self.diagnosticavel(p) and not (parciais and casadas == indice.tamanhos[p])
+        )
+        ranking = []
+        codigos = indice.codigos
+        for pontuacao, casadas, negativo in heapq.nlargest(k, candidatos):
+            posicao = -negativo
+            faltando = indice.masks[posicao] & ~presentes
+            bits_faltando = []
+            while faltando:
+                menor = faltando & -faltando
+                faltando ^= menor
+                bits_faltando.append(menor.bit_length() - 1)
+            item: Dict[str, Any] = {"regra": self.rules[posicao]["id"]}
+            item.update(self._formatar(posicao))
+            item.update({
+                "pontuacao": round(pontuacao, 4),
+                "cobertura": round(casadas / indice.tamanhos[posicao], 4),
+                "completa": not bits_faltando,
+                "faltando": [codigos[b] for b in bits_faltando],
+                "rotulos_faltando": [self._rotulo_faltando(b, presentes, codigos) for b in bits_faltando],
+            })
+            ranking.append(item)
+        return ranking
+
+    def symptom_matrix(self, casos: Iterable[Iterable[str]]) -> "np.ndarray":
+        """Codifica listas de sintomas como matriz booleana (casos x symptom_codes)."""
+        import numpy as np
+
+        casos = list(casos)
+        colunas = {sintoma: coluna for coluna, sintoma in enumerate(self.index.sintomas)}
+        matriz = np.zeros((len(casos), len(colunas)), dtype=bool)
+        for linha, sintomas in enumerate(casos):
+            for sintoma in sintomas:
+                # Fatos intermediários informados como sintoma são ignorados, como códigos desconhecidos
+                coluna = colunas.get(sintoma)
+                if coluna is not None:
+                    matriz[linha, coluna] = True
+        return matriz
+
+    def diagnose_batch(self, sintomas: "np.ndarray", tamanho_bloco: int = 65536) -> "BatchDiagnosis":
+        """
+        Diagnostica vários casos de uma vez.
+        `sintomas` é uma matriz booleana (casos x symptom_codes); uma regra casa com um caso
+        quando o caso não deixa de ter nenhuma das condições dela, calculado como
+        produto de matrizes contra a matriz de condições das regras, em blocos de linhas.
+        Com fatos intermediários, o produto é repetido até nenhum fato novo aparecer.
+        """
+        import numpy as np
+
+        sintomas = np.asarray(sintomas, dtype=bool)
+        if sintomas.ndim != 2 or sintomas.shape[1] != len(self.index.sintomas):
+            raise ValueError(
+                f"matriz de sintomas deve ter formato (casos, {len(self.index.sintomas)}), recebido {sintomas.shape}"
+            )
+
+        condicoes = self.index.matriz_condicoes()
+        casos = sintomas.shape[0]
+        linhas: List["np.ndarray"] = []
+        colunas: List["np.ndarray"] = []
+
+        # Regras que concluem fatos: coluna da regra -> coluna do fato
+        encadeadas = [(p, bit) for p, bit in enumerate(self.index.conclusoes) if bit is not None]
+        origem = np.array([p for p, _ in encadeadas], dtype=np.int64)
+        destino = np.array([bit for _, bit in encadeadas], dtype=np.int64)
+        diagnosticaveis = np.array([self.diagnosticavel(p) for p in range(len(self.rules))], dtype=bool)
+        # Posição de bit de cada coluna de entrada; as colunas dos fatos só acendem pelo encadeamento
+        bits_sintomas = np.array([self.index.bits[s] for s in self.index.sintomas], dtype=np.int64)
+        com_fatos = len(bits_sintomas) != len(self.index.bits)
+
+        for inicio in range(0, casos, tamanho_bloco):
+            bloco = sintomas[inicio:inicio + tamanho_bloco]
+            if com_fatos:
+                completo = np.zeros((bloco.shape[0], len(self.index.bits)), dtype=bool)
+                completo[:, bits_sintomas] = bloco
+                bloco = completo
+            elif encadeadas:
+                bloco = bloco.copy()
+            while True:
+                # Quantas condições de cada regra estão ausentes em cada caso
+                casadas = ((~bloco).astype(np.float32) @ condicoes.T) == 0
+                if not encadeadas:
+                    break
+                # Encadeamento: acende as colunas dos fatos concluídos e repete até estabilizar
+                fatos = np.zeros_like(bloco)
+                np.logical_or.at(fatos.T, destino, casadas[:, origem].T)
+                novos = fatos & ~bloco
+                if not novos.any():
+                    break
+                bloco |= novos
+            linha, coluna = np.nonzero(casadas & diagnosticaveis)
+            linhas.append(linha + inicio)
+            colunas.append(coluna)
+
+        linha_total = np.concatenate(linhas) if linhas else np.zeros(0, dtype=np.int64)
+        regras = np.concatenate(colunas).astype(np.int32) if colunas else np.zeros(0, dtype=np.int32)
+        offsets = np.zeros(casos + 1, dtype=np.int64)
+        np.cumsum(np.bincount(linha_total, minlength=casos), out=offsets[1:])
+        return BatchDiagnosis(self, offsets, regras)
+
+
+def _assinar(dados: Mapping[str, Any]) -> str:
+    conteudo = json.dumps(dados, sort_keys=True, ensure_ascii=False, default=sorted).encode("utf-8")
+    return hashlib.sha256(conteudo).hexdigest()[:12]
 
 
 class HardwareExpertSystem:
@@ -9,101 +620,358 @@ class HardwareExpertSystem:
     Sistema especialista baseado em regras simples.
     Entrada: conjunto de sintomas selecionados pelo usuário.
     Saída: lista de possíveis diagnósticos e recomendações.
+
+    As regras e o catálogo de sintomas vêm de um arquivo versionado
+    (KNOWLEDGE_BASE_PATH). `recarregar()` valida o arquivo e troca o snapshot
+    de forma atômica; leitores nunca esperam pela recarga.
     """
 
-    def __init__(self) -> None:
-        # Cada regra tem:
-        # - condicoes: conjunto de sintomas necessários
-        # - diagnostico: texto descritivo
-        # - causa_provavel: explicação
-        # - recomendacao: ação sugerida
-        self.rules = [
-            {
-                "condicoes": {"nao_liga"},
-                "diagnostico": "Computador não liga",
-                "causa_provavel": "Possível problema na fonte de alimentação, cabo de energia ou botão power.",
-                "recomendacao": (
-                    "Verifique se o cabo está conectado, teste em outra tomada, "
-                    "confira a chave de tensão da fonte e, se possível, teste com outra fonte."
-                ),
-            },
-            {
-                "condicoes": {"reinicia_sozinho", "superaquecendo"},
-                "diagnostico": "Reinicializações devido a superaquecimento",
-                "causa_provavel": "Temperatura alta de CPU ou GPU causando desligamento de segurança.",
-                "recomendacao": (
-                    "Limpe ventoinhas e dissipadores, verifique se os coolers estão girando, "
-                    "troque a pasta térmica se necessário e garanta boa circulação de ar no gabinete."
-                ),
-            },
-            {
-                "condicoes": {"lento", "uso_disco_alto"},
-                "diagnostico": "Desempenho lento por gargalo em disco",
-                "causa_provavel": "Disco rígido antigo, quase cheio ou com muitos acessos simultâneos.",
-                "recomendacao": (
-                    "Considere usar um SSD, liberar espaço em disco, desinstalar programas desnecessários "
-                    "e verificar programas iniciando junto com o sistema."
-                ),
-            },
-            {
-                "condicoes": {"lento", "pouca_memoria"},
-                "diagnostico": "Desempenho lento por falta de memória RAM",
-                "causa_provavel": "Aplicativos consumindo mais RAM do que o disponível.",
-                "recomendacao": (
-                    "Feche programas em segundo plano, aumente a quantidade de RAM "
-                    "ou use versões mais leves dos aplicativos."
-                ),
-            },
-            {
-                "condicoes": {"sem_video"},
-                "diagnostico": "Sem vídeo na tela",
-                "causa_provavel": "Problemas na placa de vídeo, cabo de vídeo ou monitor.",
-                "recomendacao": (
-                    "Teste com outro cabo/monitor, verifique se a placa de vídeo está bem encaixada, "
-                    "e teste a saída de vídeo onboard (se houver)."
-                ),
-            },
-            {
-                "condicoes": {"ruidos"},
-                "diagnostico": "Ruídos estranhos (cliques/chiados)",
-                "causa_provavel": "Possível falha em HD mecânico ou ventoinhas desgastadas.",
-                "recomendacao": (
-                    "Faça backup imediato dos dados, verifique a origem do ruído e considere trocar o componente."
-                ),
-            },
-        ]
+    def __init__(self, caminho: Optional[str] = None, base: Optional[Mapping[str, Any]] = None) -> None:
+        self.caminho = caminho or KNOWLEDGE_BASE_PATH
+        self._lock = threading.Lock()
+        self._mtime: Optional[Tuple[float, int]] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._watcher_pid: Optional[int] = None
+        self._parar = threading.Event()
+
+        if base is not None:
+            self._snapshot = RuleSnapshot(base)
+        else:
+            self._mtime = self._ler_mtime()
+            self._snapshot = RuleSnapshot(carregar_base(self.caminho))
+
+    # ------------------------------------------------------------------ leitura
+    def snapshot(self) -> RuleSnapshot:
+        """Snapshot atual; use o mesmo objeto durante toda a requisição."""
+        return self._snapshot
+
+    @property
+    def versao(self) -> str:
+        return self._snapshot.versao
+
+    @property
+    def rules(self) -> Tuple[Mapping[str, Any], ...]:
+        return self._snapshot.rules
+
+    @property
+    def index(self) -> RuleIndex:
+        return self._snapshot.index
+
+    @property
+    def symptom_codes(self) -> List[str]:
+        return self._snapshot.symptom_codes
 
     def diagnose(self, symptoms: List[str]) -> List[Dict[str, str]]:
         """
         Recebe lista de sintomas (strings) e retorna lista de diagnósticos.
         """
-        symptom_set: Set[str] = set(symptoms)
-        resultados: List[Dict[str, str]] = []
+        return self._snapshot.diagnose(symptoms)
 
-        for rule in self.rules:
-            condicoes = rule["condicoes"]
-            if condicoes.issubset(symptom_set):
-                resultados.append(
-                    {
-                        "diagnostico": rule["diagnostico"],
-                        "causa_provavel": rule["causa_provavel"],
-                        "recomendacao": rule["recomendacao"],
-                    }
-                )
+    def resolve(self, symptoms: Iterable[str]) -> DiagnosisResult:
+        return self._snapshot.resolve(symptoms)
 
-        if not resultados:
-            resultados.append(
-                {
-                    "diagnostico": "Nenhuma causa específica identificada",
-                    "causa_provavel": (
-                        "Os sintomas informados não bateram com nenhuma regra específica do sistema especialista."
-                    ),
-                    "recomendacao": (
-                        "Verifique se os sintomas foram descritos corretamente, "
-                        "atualize drivers e sistema operacional, e se o problema persistir, "
-                        "considere uma análise mais detalhada por um técnico."
-                    ),
-                }
+    def ranquear(
+        self, symptoms: Iterable[str], k: int = DIAGNOSIS_TOP_K, parciais: bool = False
+    ) -> List[Dict[str, Any]]:
+        return self._snapshot.ranquear(symptoms, k, parciais)
+
+    def extrair_sintomas(self, texto: str) -> List[str]:
+        return self._snapshot.extrair_sintomas(texto)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Contadores do cache do snapshot atual (zerados a cada recarga das regras)."""
+        dados: Dict[str, Any] = dict(self._snapshot.cache.estatisticas())
+        dados["versao_regras"] = self._snapshot.versao
+        return dados
+
+    def symptom_matrix(self, casos: Iterable[Iterable[str]]) -> "np.ndarray":
+        return self._snapshot.symptom_matrix(casos)
+
+    def diagnose_batch(self, sintomas: "np.ndarray", tamanho_bloco: int = 65536) -> "BatchDiagnosis":
+        return self._snapshot.diagnose_batch(sintomas, tamanho_bloco)
+
+    def sessao(self, symptoms: Iterable[str] = ()) -> "InferenceSession":
+        """Sessão de inferência incremental sobre o snapshot atual."""
+        return InferenceSession(self._snapshot, symptoms)
+
+    # ------------------------------------------------------------------ recarga
+    def _ler_mtime(self) -> Optional[Tuple[float, int]]:
+        try:
+            estado = os.stat(self.caminho)
+        except OSError:
+            return None
+        return (estado.st_mtime, estado.st_size)
+
+    def recarregar(self) -> RuleSnapshot:
+        """
+        Relê e valida o arquivo e publica o novo snapshot.
+        Em caso de erro o snapshot atual continua valendo e KnowledgeBaseError é propagado.
+        """
+        with self._lock:
+            mtime = self._ler_mtime()
+            novo = RuleSnapshot(carregar_base(self.caminho))
+            self._mtime = mtime
+            self._snapshot = novo
+            return novo
+
+    def recarregar_se_alterado(self) -> bool:
+        """Recarrega apenas se o arquivo mudou desde a última leitura."""
+        if self._ler_mtime() == self._mtime:
+            return False
+        try:
+            self.recarregar()
+        except KnowledgeBaseError:
+            # Mantém a versão atual; só tenta de novo quando o arquivo mudar outra vez
+            self._mtime = self._ler_mtime()
+            return False
+        return True
+
+    def iniciar_recarga_automatica(self, intervalo: float = KNOWLEDGE_BASE_POLL_SECONDS) -> None:
+        """Inicia (uma vez por processo) a thread que observa o arquivo da base e o handler de SIGHUP."""
+        if intervalo <= 0:
+            return
+        if self._watcher is not None and self._watcher.is_alive() and self._watcher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watcher is not None and self._watcher.is_alive() and self._watcher_pid == os.getpid():
+                return
+            self._parar.clear()
+            self._watcher_pid = os.getpid()
+            self._watcher = threading.Thread(
+                target=self._observar, args=(intervalo,), name="knowledge-base-watcher", daemon=True
             )
+            self._watcher.start()
+        # Na thread principal (worker sync do gunicorn, `python app.py`) também atende SIGHUP
+        self.instalar_sighup()
+
+    def parar_recarga_automatica(self) -> None:
+        self._parar.set()
+
+    def _observar(self, intervalo: float) -> None:
+        while not self._parar.wait(intervalo):
+            self.recarregar_se_alterado()
 
+    def instalar_sighup(self) -> bool:
+        """
+        Recarrega a base ao receber SIGHUP. Só é possível na thread principal
+        e em plataformas com SIGHUP; retorna False quando não foi instalado.
+        """
+        if not hasattr(signal, "SIGHUP") or threading.current_thread() is not threading.main_thread():
+            return False
+
+        def _tratar(signum: int, frame: Any) -> None:
+            # A recarga roda fora do handler para não bloquear a thread interrompida
+            threading.Thread(target=self._recarregar_silencioso, daemon=True).start()
+
+        signal.signal(signal.SIGHUP, _tratar)
+        return True
+
+    def _recarregar_silencioso(self) -> None:
+        try:
+            self.recarregar()
+        except KnowledgeBaseError:
+            pass
+
+
+class BatchDiagnosis:
+    """
+    Resultado compacto de diagnose_batch, no formato CSR: as regras do caso i são
+    `regras[offsets[i]:offsets[i + 1]]`. A expansão para a lista de dicionários de
+    `diagnose` só acontece quando pedida.
+    """
+
+    def __init__(self, sistema: RuleSnapshot, offsets: "np.ndarray", regras: "np.ndarray") -> None:
+        self._sistema = sistema
+        self.offsets = offsets
+        self.regras = regras
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def indices(self, caso: int) -> List[int]:
+        """Posições das regras que casaram com o caso, em ordem."""
+        return self.regras[self.offsets[caso]:self.offsets[caso + 1]].tolist()
+
+    def expandir(self, caso: int) -> List[Dict[str, str]]:
+        """Mesmo resultado que `diagnose` devolveria para o caso."""
+        resultados = [self._sistema._formatar(p) for p in self.indices(caso)]
+        if not resultados:
+            resultados.append(dict(DIAGNOSTICO_PADRAO))
         return resultados
+
+    def __iter__(self) -> Iterator[List[Dict[str, str]]]:
+        for caso in range(len(self)):
+            yield self.expandir(caso)
+
+
+class InferenceSession:
+    """
+    Sessão de inferência incremental, no estilo Rete, para quem monta o conjunto de
+    sintomas passo a passo (multiselect do Streamlit, formulário HTML).
+
+    A sessão guarda, para cada regra, quantas condições já estão presentes (memória
+    de casamentos parciais). Incluir ou retirar um sintoma só visita as regras que o
+    usam; regras completas concluem fatos intermediários, que propagam do mesmo jeito,
+    e retirar um sintoma desfaz os fatos que dependiam dele (contagem de suporte).
+    As regras a uma condição de casar ficam num conjunto à parte, então as sugestões
+    custam proporcionalmente a elas, não ao tamanho da base.
+
+    A sessão fica presa ao snapshot em que foi criada e não é thread-safe.
+    """
+
+    def __init__(self, snapshot: RuleSnapshot, symptoms: Iterable[str] = ()) -> None:
+        self.snapshot = snapshot
+        indice = snapshot.index
+        self._indice = indice
+        self._informados = 0
+        self._presentes = 0
+        self._contagem = [0] * len(indice.masks)
+        self._suporte: Dict[int, int] = {}
+        self.ativas: set = set(indice.sempre)
+        # Regras com pelo menos uma condição presente e só uma faltando
+        self.quase: set = set()
+        self.desconhecidos: List[str] = []
+        for bit in (indice.conclusoes[p] for p in indice.sempre):
+            if bit is not None:
+                self._apoiar(bit)
+        self.atualizar(symptoms)
+
+    # ------------------------------------------------------------------ propagação
+    def _inserir(self, bit: int) -> None:
+        self._presentes |= 1 << bit
+        for posicao in self._indice.por_condicao.get(bit, ()):
+            self._contagem[posicao] += 1
+            faltam = self._indice.tamanhos[posicao] - self._contagem[posicao]
+            if faltam == 0:
+                self.quase.discard(posicao)
+                self.ativas.add(posicao)
+                conclusao = self._indice.conclusoes[posicao]
+                if conclusao is not None:
+                    self._apoiar(conclusao)
+            elif faltam == 1:
+                self.quase.add(posicao)
+            else:
+                self.quase.discard(posicao)
+
+    def _retirar(self, bit: int) -> None:
+        self._presentes &= ~(1 << bit)
+        for posicao in self._indice.por_condicao.get(bit, ()):
+            if posicao in self.ativas:
+                self.ativas.discard(posicao)
+                conclusao = self._indice.conclusoes[posicao]
+                if conclusao is not None:
+                    self._desapoiar(conclusao)
+            self._contagem[posicao] -= 1
+            faltam = self._indice.tamanhos[posicao] - self._contagem[posicao]
+            if faltam == 1 and self._contagem[posicao] > 0:
+                self.quase.add(posicao)
+            else:
+                self.quase.discard(posicao)
+
+    def _apoiar(self, bit: int) -> None:
+        self._suporte[bit] = self._suporte.get(bit, 0) + 1
+        if not self._presentes >> bit & 1:
+            self._inserir(bit)
+
+    def _desapoiar(self, bit: int) -> None:
+        self._suporte[bit] -= 1
+        if not self._suporte[bit] and not self._informados >> bit & 1:
+            self._retirar(bit)
+
+    # ------------------------------------------------------------------ API
+    def adicionar(self, sintoma: str) -> None:
+        bit = self._indice.bits.get(sintoma)
+        if bit is None:
+            if sintoma not in self.desconhecidos:
+                self.desconhecidos.append(sintoma)
+            return
+        if self._informados >> bit & 1:
+            return
+        self._informados |= 1 << bit
+        if not self._presentes >> bit & 1:
+            self._inserir(bit)
+
+    def remover(self, sintoma: str) -> None:
+        bit = self._indice.bits.get(sintoma)
+        if bit is None:
+            if sintoma in self.desconhecidos:
+                self.desconhecidos.remove(sintoma)
+            return
+        if not self._informados >> bit & 1:
+            return
+        self._informados &= ~(1 << bit)
+        if not self._suporte.get(bit):
+            self._retirar(bit)
+
+    def atualizar(self, symptoms: Iterable[str]) -> None:
+        """Leva a sessão ao conjunto informado aplicando só a diferença (ex.: valor atual do multiselect)."""
+        desejados = list(dict.fromkeys(symptoms))
+        atuais = set(self.sintomas) | set(self.desconhecidos)
+        for sintoma in atuais - set(desejados):
+            self.remover(sintoma)
+        for sintoma in desejados:
+            self.adicionar(sintoma)
+
+    @property
+    def mascara(self) -> int:
+        """Máscara dos sintomas informados (mesma chave usada por RuleSnapshot.resolve)."""
+        return self._informados
+
+    @property
+    def sintomas(self) -> List[str]:
+        return self._indice.decodificar(self._informados)
+
+    @property
+    def fatos(self) -> List[str]:
+        """Fatos intermediários concluídos a partir dos sintomas informados."""
+        return self._indice.decodificar(self._presentes & ~self._informados)
+
+    def diagnosticos(self) -> List[Dict[str, str]]:
+        """Mesmo resultado de `diagnose` para os sintomas atuais."""
+        posicoes = sorted(p for p in self.ativas if self.snapshot.diagnosticavel(p))
+        if not posicoes:
+            return list(self.snapshot._padrao)
+        return [FrozenDiagnosis(self.snapshot._formatar(p)) for p in posicoes]
+
+    def sugestoes(self) -> List[Dict[str, Any]]:
+        """
+        Regras a uma condição de casar: a condição que falta e o que a regra concluiria.
+        Se o que falta é um fato intermediário, `via` lista os sintomas que o produziriam.
+        """
+        codigos = self._indice.codigos
+        sugestoes = []
+        for posicao in sorted(self.quase):
+            faltando = self._indice.masks[posicao] & ~self._presentes
+            bit = faltando.bit_length() - 1
+            regra = self.snapshot.rules[posicao]
+            sugestao: Dict[str, Any] = {
+                "regra": regra["id"],
+                "faltando": codigos[bit],
+                "rotulo": self.snapshot.symptom_labels.get(codigos[bit], codigos[bit]),
+                "diagnostico": regra["diagnostico"] or None,
+                "conclui": regra["conclui"],
+            }
+            if codigos[bit] not in self.snapshot.symptom_labels:
+                # Produtores do fato a um passo de concluí-lo
+                via = []
+                for produtor in self._indice.produtores.get(bit, ()):
+                    resto = self._indice.masks[produtor] & ~self._presentes
+                    if resto and resto & (resto - 1) == 0:
+                        via.append(codigos[resto.bit_length() - 1])
+                sugestao["via"] = list(dict.fromkeys(via))
+            sugestoes.append(sugestao)
+        return sugestoes
+
+
+_sistema: Optional[HardwareExpertSystem] = None
+_sistema_lock = threading.Lock()
+
+
+def obter_sistema() -> HardwareExpertSystem:
+    """Instância única por processo, compartilhada por Flask e Streamlit."""
+    global _sistema
+    if _sistema is None:
+        with _sistema_lock:
+            if _sistema is None:
+                _sistema = HardwareExpertSystem()
+    return _sistema
@@ -0,0 +1,200 @@
+# fake_s3.py
+# Substituto local do cliente S3 (boto3) para desenvolvimento, benchmarks e testes
+
+import datetime
+import hashlib
+import io
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class FakeS3Error(Exception):
+    """Erro no formato mínimo do botocore (atributo `response` com código)."""
+
+    def __init__(self, codigo: str, mensagem: str) -> None:
+        super().__init__(f"{codigo}: {mensagem}")
+        self.response = {"Error": {"Code": codigo, "Message": mensagem}}
+
+
+class _Paginator:
+    def __init__(self, cliente: "FakeS3Client") -> None:
+        self._cliente = cliente
+
+    def paginate(self, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+        token: Optional[str] = None
+        while True:
+            params = dict(kwargs)
+            params.pop("PaginationConfig", None)
+            if token:
+                params["ContinuationToken"] = token
+            pagina = self._cliente.list_objects_v2(**params)
+            yield pagina
+            if not pagina.get("IsTruncated"):
+                return
+            token = pagina["NextContinuationToken"]
+
+
+class FakeS3Client:
+    """
+    Implementa o subconjunto da API do S3 usado pela aplicação:
+    put_object, get_object, head_object, list_objects_v2, delete_object(s), tags e paginação.
+    Com `diretorio`, os objetos também são gravados em disco (um arquivo por chave),
+    permitindo compartilhar o "bucket" entre processos.
+    """
+
+    def __init__(self, diretorio: Optional[str] = None, falhas: int = 0) -> None:
+        self.diretorio = diretorio
+        # Quantidade de put_object que devem falhar antes de aceitar (simula instabilidade)
+        self.falhas_restantes = falhas
+        self.chamadas_put = 0
+        self._objetos: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------ armazenamento
+    def _caminho(self, bucket: str, chave: str) -> str:
+        return os.path.join(self.diretorio or "", bucket, *chave.split("/"))
+
+    def _gravar(self, bucket: str, chave: str, objeto: Dict[str, Any]) -> None:
+        self._objetos.setdefault(bucket, {})[chave] = objeto
+        if self.diretorio:
+            caminho = self._caminho(bucket, chave)
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            with open(caminho, "wb") as arquivo:
+                arquivo.write(objeto["Body"])
+
+    def _carregar_disco(self, bucket: str) -> None:
+        if not self.diretorio:
+            return
+        raiz = os.path.join(self.diretorio, bucket)
+        memoria = self._objetos.setdefault(bucket, {})
+        for pasta, _, arquivos in os.walk(raiz):
+            for nome in arquivos:
+                caminho = os.path.join(pasta, nome)
+                chave = os.path.relpath(caminho, raiz).replace(os.sep, "/")
+                if chave in memoria:
+                    continue
+                with open(caminho, "rb") as arquivo:
+                    corpo = arquivo.read()
+                memoria[chave] = self._montar_objeto(corpo, {})
+
+    @staticmethod
+    def _montar_objeto(corpo: bytes, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "Body": corpo,
+            "ETag": '"' + hashlib.md5(corpo).hexdigest() + '"',
+            "ContentType": kwargs.get("ContentType", "binary/octet-stream"),
+            "ContentEncoding": kwargs.get("ContentEncoding"),
+            "LastModified": datetime.datetime.now(datetime.timezone.utc),
+        }
+
+    def _obter(self, bucket: str, chave: str) -> Dict[str, Any]:
+        self._carregar_disco(bucket)
+        objeto = self._objetos.get(bucket, {}).get(chave)
+        if objeto is None:
+            raise FakeS3Error("NoSuchKey", f"chave inexistente: {chave}")
+        return objeto
+
+    # ------------------------------------------------------------------ API do S3
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs: Any) -> Dict[str, Any]:
+        with self._lock:
+            self.chamadas_put += 1
+            if self.falhas_restantes > 0:
+                self.falhas_restantes -= 1
+                raise FakeS3Error("SlowDown", "falha simulada")
+            if isinstance(Body, str):
+                Body = Body.encode("utf-8")
+            objeto = self._montar_objeto(bytes(Body), kwargs)
+            self._gravar(Bucket, Key, objeto)
+            return {"ETag": objeto["ETag"]}
+
+    def get_object(self, Bucket: str, Key: str, **kwargs: Any) -> Dict[str, Any]:
+        with self._lock:
+            objeto = self._obter(Bucket, Key)
+            return {
+                "Body": io.BytesIO(objeto["Body"]),
+                "ContentLength": len(objeto["Body"]),
+                "ContentType": objeto["ContentType"],
+                "ContentEncoding": objeto["ContentEncoding"],
+                "ETag": objeto["ETag"],
+                "LastModified": objeto["LastModified"],
+            }
+
+    def head_object(self, Bucket: str, Key: str, **kwargs: Any) -> Dict[str, Any]:
+        with self._lock:
+            objeto = self._obter(Bucket, Key)
+            return {
+                "ContentLength": len(objeto["Body"]),
+                "ETag": objeto["ETag"],
+                "LastModified": objeto["LastModified"],
+            }
+
+    def list_objects_v2(
+        self,
+        Bucket: str,
+        Prefix: str = "",
+        MaxKeys: int = 1000,
+        ContinuationToken: Optional[str] = None,
+        StartAfter: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        with self._lock:
+            self._carregar_disco(Bucket)
+            chaves = sorted(k for k in self._objetos.get(Bucket, {}) if k.startswith(Prefix))
+            inicio = ContinuationToken or StartAfter
+            if inicio:
+                chaves = [k for k in chaves if k > inicio]
+            pagina = chaves[:MaxKeys]
+            conteudo: List[Dict[str, Any]] = []
+            for chave in pagina:
+                objeto = self._objetos[Bucket][chave]
+                conteudo.append(
+                    {
+                        "Key": chave,
+                        "Size": len(objeto["Body"]),
+                        "ETag": objeto["ETag"],
+                        "LastModified": objeto["LastModified"],
+                    }
+                )
+            resposta: Dict[str, Any] = {
+                "Contents": conteudo,
+                "KeyCount": len(conteudo),
+                "IsTruncated": len(chaves) > MaxKeys,
+            }
+            if resposta["IsTruncated"]:
+                resposta["NextContinuationToken"] = pagina[-1]
+            return resposta
+
+    def delete_object(self, Bucket: str, Key: str, **kwargs: Any) -> Dict[str, Any]:
+        with self._lock:
+            self._carregar_disco(Bucket)
+            self._objetos.get(Bucket, {}).pop(Key, None)
+            if self.diretorio:
+                try:
+                    os.remove(self._caminho(Bucket, Key))
+                except FileNotFoundError:
+                    pass
+            return {}
+
+    def delete_objects(self, Bucket: str, Delete: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        removidos = []
+        for item in Delete.get("Objects", []):
+            self.delete_object(Bucket=Bucket, Key=item["Key"])
+            removidos.append({"Key": item["Key"]})
+        return {"Deleted": removidos}
+
+    def put_object_tagging(self, Bucket: str, Key: str, Tagging: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        # Tags ficam só em memória (não vão para o disco)
+        with self._lock:
+            objeto = self._obter(Bucket, Key)
+            objeto["Tags"] = [dict(tag) for tag in Tagging.get("TagSet", [])]
+            return {}
+
+    def get_object_tagging(self, Bucket: str, Key: str, **kwargs: Any) -> Dict[str, Any]:
+        with self._lock:
+            return {"TagSet": list(self._obter(Bucket, Key).get("Tags", []))}
+
+    def get_paginator(self, operacao: str) -> _Paginator:
+        if operacao != "list_objects_v2":
+            raise NotImplementedError(operacao)
+        return _Paginator(self)
@@ -0,0 +1,348 @@
+# fleet.py
+# Telemetria da frota: formato compacto dos lotes enviados pelo agente e estado mais recente por host
+
+import gzip
+import json
+import math
+import os
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+FORMATO_VERSAO = 1
+TIPO_MSGPACK = "application/x-msgpack"
+TIPO_JSON = "application/json"
+
+# Limites do lado do servidor
+FLEET_MAX_BATCH_SAMPLES = int(os.getenv("FLEET_MAX_BATCH_SAMPLES", "10000"))
+FLEET_MAX_BATCH_BYTES = int(os.getenv("FLEET_MAX_BATCH_BYTES", str(8 * 1024 * 1024)))  # já descomprimido
+FLEET_MAX_HOSTS = int(os.getenv("FLEET_MAX_HOSTS", "50000"))
+# Estado compartilhado entre os workers do gunicorn (mesmo esquema de metrics.py);
+# vazio usa `<tmp>/hwdiag-fleet-<pid do master do gunicorn>`
+FLEET_STATE_DIR = os.getenv("FLEET_STATE_DIR", "")
+FLEET_FLUSH_SECONDS = float(os.getenv("FLEET_FLUSH_SECONDS", "2"))
+
+# Colunas numéricas de cada amostra, na ordem do lote
+COLUNAS = ("t", "cpu", "mem", "disco", "temp")
+# Campos do perfil estático guardados no estado do host; o resto do que vier no lote é descartado
+CAMPOS_PERFIL = ("platform", "platform_release", "architecture", "processor", "cpu_count", "boot_time")
+# Tamanho máximo do host, de cada código de sintoma e de cada texto do perfil, e códigos por lote
+_MAX_TEXTO = 256
+_MAX_SINTOMAS = 64
+
+
+class TelemetryError(ValueError):
+    """Lote de telemetria inválido ou fora dos limites."""
+
+
+# ---------------------------------------------------------------------- formato do lote
+def montar_lote(host: str, perfil: Dict[str, Any], amostras: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Lote colunar: cada métrica é uma lista com um valor por amostra e os sintomas
+    viram uma máscara de bits sobre a lista `sintomas` do próprio lote.
+      {"v": 1, "host": "...", "perfil": {...}, "sintomas": ["uso_disco_alto", ...],
+       "t": [...], "cpu": [...], "mem": [...], "disco": [...], "temp": [...], "s": [mascara, ...]}
+    """
+    codigos: List[str] = []
+    for amostra in amostras:
+        for sintoma in amostra.get("sintomas", ()):
+            if sintoma not in codigos:
+                codigos.append(sintoma)
+    bits = {codigo: 1 << i for i, codigo in enumerate(codigos)}
+
+    lote: Dict[str, Any] = {"v": FORMATO_VERSAO, "host": host, "perfil": perfil, "sintomas": codigos}
+    for coluna in COLUNAS:
+        lote[coluna] = [amostra.get(coluna) for amostra in amostras]
+    lote["s"] = [sum(bits[s] for s in set(amostra.get("sintomas", ()))) for amostra in amostras]
+    return lote
+
+
+def codificar_lote(lote: Dict[str, Any], usar_msgpack: Optional[bool] = None) -> Tuple[bytes, str]:
+    """Serializa (msgpack se disponível, senão JSON compacto) e comprime com gzip."""
+    if usar_msgpack is None:
+        usar_msgpack = msgpack is not None
+    if usar_msgpack:
+        corpo, tipo = msgpack.packb(lote, use_bin_type=True), TIPO_MSGPACK
+    else:
+        corpo, tipo = json.dumps(lote, separators=(",", ":")).encode("utf-8"), TIPO_JSON
+    return gzip.compress(corpo, compresslevel=6), tipo
+
+
+def _descomprimir(dados: bytes) -> bytes:
+    """gunzip com limite de tamanho (um lote pequeno não pode virar gigabytes)."""
+    descompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    saida = descompressor.decompress(dados, FLEET_MAX_BATCH_BYTES + 1)
+    if len(saida) > FLEET_MAX_BATCH_BYTES or descompressor.unconsumed_tail:
+        raise TelemetryError("lote maior que o permitido")
+    return saida
+
+
+def decodificar_lote(dados: bytes, tipo: str, codificacao: str = "") -> Dict[str, Any]:
+    """Inverso de codificar_lote, com validação da estrutura e dos limites."""
+    if codificacao == "gzip":
+        try:
+            dados = _descomprimir(dados)
+        except zlib.error as e:
+            raise TelemetryError(f"gzip inválido: {e}") from e
+    elif len(dados) > FLEET_MAX_BATCH_BYTES:
+        raise TelemetryError("lote maior que o permitido")
+
+    tipo = (tipo or "").split(";")[0].strip()
+    try:
+        if tipo == TIPO_MSGPACK:
+            if msgpack is None:
+                raise TelemetryError("msgpack não está instalado no servidor; envie JSON")
+            lote = msgpack.unpackb(dados, raw=False)
+        elif tipo == TIPO_JSON:
+            lote = json.loads(dados.decode("utf-8"))
+        else:
+            raise TelemetryError(f"tipo de conteúdo não suportado: {tipo or '-'}")
+    except TelemetryError:
+        raise
+    except Exception as e:
+        raise TelemetryError(f"lote ilegível: {e}") from e
+
+    if not isinstance(lote, dict) or lote.get("v") != FORMATO_VERSAO:
+        raise TelemetryError("versão do lote não suportada")
+    if not isinstance(lote.get("host"), str) or not lote["host"]:
+        raise TelemetryError("lote sem 'host'")
+    if len(lote["host"]) > _MAX_TEXTO:
+        raise TelemetryError(f"'host' com mais de {_MAX_TEXTO} caracteres")
+    if not isinstance(lote.get("sintomas"), list) or not all(isinstance(s, str) for s in lote["sintomas"]):
+        raise TelemetryError("'sintomas' deve ser uma lista de códigos")
+    if len(lote["sintomas"]) > _MAX_SINTOMAS or any(len(s) > _MAX_TEXTO for s in lote["sintomas"]):
+        raise TelemetryError(f"'sintomas' aceita até {_MAX_SINTOMAS} códigos de até {_MAX_TEXTO} caracteres")
+    lote["perfil"] = _filtrar_perfil(lote.get("perfil"))
+    total = len(lote.get("s") or [])
+    if total > FLEET_MAX_BATCH_SAMPLES:
+        raise TelemetryError(f"máximo de {FLEET_MAX_BATCH_SAMPLES} amostras por lote")
+    for coluna in COLUNAS + ("s",):
+        if not isinstance(lote.get(coluna), list) or len(lote[coluna]) != total:
+            raise TelemetryError(f"coluna '{coluna}' ausente ou com tamanho diferente")
+    # Tipos dos valores: um lote aceito não pode falhar depois no diagnóstico nem no estado do host
+    if not all(type(m) is int and m >= 0 for m in lote["s"]):
+        raise TelemetryError("'s' deve conter máscaras inteiras não negativas")
+    if not all(_numero(t) for t in lote["t"]):
+        raise TelemetryError("'t' deve conter timestamps numéricos finitos")
+    for coluna in COLUNAS[1:]:
+        if not all(v is None or _numero(v) for v in lote[coluna]):
+            raise TelemetryError(f"coluna '{coluna}' deve conter números ou null")
+    return lote
+
+
+def _filtrar_perfil(perfil: Any) -> Dict[str, Any]:
+    """Só os campos de CAMPOS_PERFIL, com valores escalares: o perfil fica em memória e em disco por host."""
+    if perfil is None:
+        return {}
+    if not isinstance(perfil, dict):
+        raise TelemetryError("'perfil' deve ser um objeto")
+    filtrado = {}
+    for campo in CAMPOS_PERFIL:
+        valor = perfil.get(campo)
+        if valor is None or _numero(valor) or (isinstance(valor, str) and len(valor) <= _MAX_TEXTO):
+            filtrado[campo] = valor
+        else:
+            raise TelemetryError(f"'perfil.{campo}' deve ser um número ou um texto de até {_MAX_TEXTO} caracteres")
+    return filtrado
+
+
+def _numero(valor: Any) -> bool:
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool) and math.isfinite(valor)
+
+
+def sintomas_do_lote(lote: Dict[str, Any]) -> List[List[str]]:
+    """Lista de sintomas de cada amostra, a partir das máscaras do lote."""
+    codigos = lote["sintomas"]
+    return [[c for i, c in enumerate(codigos) if int(mascara) >> i & 1] for mascara in lote["s"]]
+
+
+# ---------------------------------------------------------------------- estado por host
+def diretorio_frota() -> str:
+    # Import tardio: o agente (agent.py) usa este módulo sem a parte do servidor
+    from metrics import diretorio_compartilhado
+
+    return diretorio_compartilhado(FLEET_STATE_DIR, "hwdiag-fleet")
+
+
+def recolher_worker(pid: int, diretorio: Optional[str] = None) -> None:
+    """
+    Chamado no master quando um worker termina (hook child_exit de gunicorn.conf.py): junta os
+    hosts de `<pid>.json` em `encerrados.json` (vence o mais recente) e apaga o arquivo.
+    """
+    diretorio = diretorio or diretorio_frota()
+    origem = os.path.join(diretorio, f"{pid}.json")
+    try:
+        with open(origem, encoding="utf-8") as arquivo:
+            estados = json.load(arquivo)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError):
+        estados = []
+    destino = os.path.join(diretorio, "encerrados.json")
+    try:
+        with open(destino, encoding="utf-8") as arquivo:
+            juntos = {estado["host"]: estado for estado in json.load(arquivo)}
+    except (OSError, ValueError):
+        juntos = {}
+    for estado in estados:
+        atual = juntos.get(estado["host"])
+        if atual is None or estado["ultimo_ts"] > atual["ultimo_ts"]:
+            juntos[estado["host"]] = estado
+    temporario = destino + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(list(juntos.values()), arquivo, ensure_ascii=False, separators=(",", ":"))
+    os.replace(temporario, destino)
+    os.remove(origem)
+
+
+class FleetState:
+    """
+    Estado mais recente de cada host (última amostra, sintomas e diagnósticos),
+    limitado a FLEET_MAX_HOSTS (os hosts sem notícia há mais tempo saem primeiro).
+    Cada worker grava o seu estado em `FLEET_STATE_DIR/<pid>.json` em segundo plano;
+    a leitura junta os arquivos e fica com a versão mais nova de cada host.
+    """
+
+    def __init__(self, diretorio: Optional[str] = None, max_hosts: int = FLEET_MAX_HOSTS) -> None:
+        self.diretorio = diretorio or diretorio_frota()
+        self.max_hosts = max_hosts
+        self._hosts: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._alterado = False
+        self._flusher_pid: Optional[int] = None
+
+    def atualizar(self, estados: Iterable[Dict[str, Any]]) -> None:
+        # Antes de alterar: após fork, descarta o estado herdado do processo pai
+        self._garantir_flusher()
+        with self._lock:
+            for estado in estados:
+                atual = self._hosts.pop(estado["host"], None)
+                if atual is not None and atual["ultimo_ts"] > estado["ultimo_ts"]:
+                    # Lote atrasado: mantém a amostra mais nova
+                    estado = atual
+                # Reinserir no fim mantém a ordem "menos recente primeiro" para o descarte
+                self._hosts[estado["host"]] = estado
+            while len(self._hosts) > self.max_hosts:
+                del self._hosts[next(iter(self._hosts))]
+            self._alterado = True
+
+    # -------------------------------------------------------------- persistência
+    def _garantir_flusher(self) -> None:
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            if self._flusher_pid is not None:
+                # Processo filho após fork: o estado do pai pertence ao pai
+                self._hosts.clear()
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._loop_flush, name="fleet-flusher", daemon=True).start()
+
+    def _loop_flush(self) -> None:
+        pid = os.getpid()
+        while self._flusher_pid == pid:
+            time.sleep(FLEET_FLUSH_SECONDS)
+            try:
+                self.gravar()
+            except OSError:
+                pass
+
+    def gravar(self) -> None:
+        with self._lock:
+            if not self._alterado:
+                return
+            hosts = list(self._hosts.values())
+            self._alterado = False
+        os.makedirs(self.diretorio, exist_ok=True)
+        destino = os.path.join(self.diretorio, f"{os.getpid()}.json")
+        temporario = destino + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(hosts, arquivo, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temporario, destino)
+
+    def hosts(self) -> Dict[str, Dict[str, Any]]:
+        """Estado por host somando os arquivos de todos os workers (vence o mais recente)."""
+        with self._lock:
+            juntos = {host: dict(estado) for host, estado in self._hosts.items()}
+        try:
+            arquivos = os.listdir(self.diretorio)
+        except FileNotFoundError:
+            arquivos = []
+        for nome in arquivos:
+            if not nome.endswith(".json") or nome == f"{os.getpid()}.json":
+                continue
+            try:
+                with open(os.path.join(self.diretorio, nome), encoding="utf-8") as arquivo:
+                    estados = json.load(arquivo)
+            except (OSError, ValueError):
+                continue
+            for estado in estados:
+                atual = juntos.get(estado["host"])
+                if atual is None or estado["ultimo_ts"] > atual["ultimo_ts"]:
+                    juntos[estado["host"]] = estado
+        return juntos
+
+
+def processar_lote(lote: Dict[str, Any], regras: Any) -> Dict[str, Any]:
+    """
+    Diagnostica todas as amostras do lote de uma vez. As combinações de sintomas
+    repetidas (o caso comum: a mesma máquina relata o mesmo estado várias vezes)
+    são diagnosticadas uma única vez com `diagnose_batch`.
+    Devolve o estado do host (última amostra) e a contagem de regras casadas no lote.
+    """
+    mascaras = [int(m) for m in lote["s"]]
+    unicas = list(dict.fromkeys(mascaras))
+    codigos = lote["sintomas"]
+    casos = [[c for i, c in enumerate(codigos) if m >> i & 1] for m in unicas]
+    resultado = regras.diagnose_batch(regras.symptom_matrix(casos)) if casos else None
+    posicao = {m: i for i, m in enumerate(unicas)}
+
+    por_regra: Dict[str, int] = {}
+    if resultado is not None:
+        ocorrencias: Dict[int, int] = {}
+        for m in mascaras:
+            ocorrencias[m] = ocorrencias.get(m, 0) + 1
+        for m, vezes in ocorrencias.items():
+            for indice in resultado.indices(posicao[m]):
+                rule_id = regras.rules[indice]["id"]
+                por_regra[rule_id] = por_regra.get(rule_id, 0) + vezes
+
+    estado = None
+    if mascaras:
+        ultima = max(range(len(mascaras)), key=lambda i: lote["t"][i])
+        caso = posicao[mascaras[ultima]]
+        estado = {
+            "host": lote["host"],
+            "ultimo_ts": lote["t"][ultima],
+            "recebido_em": time.time(),
+            "amostras": len(mascaras),
+            "versao_regras": regras.versao,
+            "sintomas": casos[caso],
+            "diagnosticos": [
+                regras.rules[i]["id"] for i in resultado.indices(caso)
+            ] if resultado is not None else [],
+            "metricas": {coluna: lote[coluna][ultima] for coluna in COLUNAS if coluna != "t"},
+            "perfil": _filtrar_perfil(lote.get("perfil")),
+        }
+    return {"estado": estado, "por_regra": por_regra, "amostras": len(mascaras)}
+
+
+_estado: Optional[FleetState] = None
+_estado_lock = threading.Lock()
+
+
+def obter_estado() -> FleetState:
+    """Estado da frota do processo."""
+    global _estado
+    if _estado is None:
+        with _estado_lock:
+            if _estado is None:
+                _estado = FleetState()
+    return _estado
@@ -0,0 +1,86 @@
+# gunicorn.conf.py
+# Configuração do gunicorn (lida automaticamente quando ele é iniciado na raiz do projeto)
+#
+#   gunicorn app:app                              # gthread: 3 workers x 32 threads
+#   GUNICORN_WORKER_CLASS=gevent gunicorn app:app # gevent: milhares de conexões por worker
+#
+# Opções passadas na linha de comando (-w, -b, -k) têm precedência sobre estas.
+
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", "3"))
+
+# sync: uma requisição por processo (comportamento antigo)
+# gthread: GUNICORN_THREADS requisições simultâneas por processo
+# gevent: conexões cooperativas (requer `pip install gevent`); psutil e gzip vão para o pool de offload.py
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "2000"))
+
+# Importa a aplicação uma vez no master e compartilha a memória com os workers (copy-on-write).
+# O import não cria threads nem clientes (S3, psutil, amostrador): tudo começa no primeiro uso em cada worker.
+preload_app = os.getenv("GUNICORN_PRELOAD", "0").lower() in ("1", "true", "yes")
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+if worker_class == "gevent":
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        # Sem gevent instalado, cai para threads em vez de falhar ao subir
+        worker_class = "gthread"
+    else:
+        # O monkey patching acontece no worker, depois do fork: com --preload os locks e filas
+        # criados no import ficariam sem patch
+        preload_app = False
+
+
+# ---------------------------------------------------------------------- hooks
+# metrics.py e fleet.py guardam o estado de cada worker em `<pid>.json` num diretório identificado
+# pelo PID do master; os hooks exportam esse PID e recolhem os arquivos dos workers que terminam.
+def on_starting(server):
+    os.environ["HWDIAG_MASTER_PID"] = str(os.getpid())
+
+
+def worker_exit(server, worker):
+    # Grava o que mudou desde o último flush periódico antes de o worker sair
+    import sys
+
+    try:
+        if "metrics" in sys.modules:
+            sys.modules["metrics"].gravar_estado()
+        if "fleet" in sys.modules and sys.modules["fleet"]._estado is not None:
+            sys.modules["fleet"]._estado.gravar()
+    except OSError as exc:
+        server.log.warning("Não foi possível gravar o estado do worker %s: %s", worker.pid, exc)
+
+
+def child_exit(server, worker):
+    import fleet
+    import metrics
+
+    for recolher in (metrics.recolher_worker, fleet.recolher_worker):
+        try:
+            recolher(worker.pid)
+        except OSError as exc:
+            server.log.warning("Não foi possível recolher o estado do worker %s: %s", worker.pid, exc)
+
+
+def on_exit(server):
+    import shutil
+
+    import fleet
+    import metrics
+
+    # Só os diretórios padrão (por PID do master); os configurados explicitamente são preservados
+    if not metrics.METRICS_DIR:
+        shutil.rmtree(metrics.diretorio_metricas(), ignore_errors=True)
+    if not fleet.FLEET_STATE_DIR:
+        shutil.rmtree(fleet.diretorio_frota(), ignore_errors=True)
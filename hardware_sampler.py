@@ -0,0 +1,321 @@
+# hardware_sampler.py
+# Amostragem de hardware em segundo plano para tirar o psutil do caminho das requisições
+
+import datetime
+import os
+import platform
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from offload import executar_bloqueante
+
+# Intervalo entre amostras e idade máxima aceitável de um snapshot (segundos)
+HW_SAMPLE_INTERVAL = float(os.getenv("HW_SAMPLE_INTERVAL", "2"))
+HW_SAMPLE_MAX_AGE = float(os.getenv("HW_SAMPLE_MAX_AGE", "10"))
+# Validade da lista de partições onde não há /proc/self/mounts para detectar mudanças
+HW_PARTITIONS_TTL = float(os.getenv("HW_PARTITIONS_TTL", "60"))
+
+# Janela curta usada apenas na primeira amostra, para o uso de CPU não sair zerado
+_PRIMEIRA_JANELA_CPU = 0.25
+
+
+class _Cronometro:
+    """Mede quanto tempo cada campo leva para ser coletado (em milissegundos)."""
+
+    def __init__(self) -> None:
+        self.tempos: Dict[str, float] = {}
+
+    def medir(self, campo: str, funcao: Callable[[], Any], padrao: Any = None) -> Any:
+        inicio = time.perf_counter()
+        try:
+            return funcao()
+        except Exception:
+            return padrao
+        finally:
+            self.tempos[campo] = round((time.perf_counter() - inicio) * 1000, 3)
+
+
+_perfil_estatico: Optional[Dict[str, Any]] = None
+_perfil_lock = threading.Lock()
+
+
+def perfil_estatico() -> Dict[str, Any]:
+    """
+    Dados que não mudam enquanto o processo roda (plataforma, processador, CPUs,
+    boot, limites de frequência). Calculado uma única vez; `platform.processor()`
+    pode até criar um subprocesso em algumas distribuições Linux.
+    """
+    global _perfil_estatico
+    if _perfil_estatico is not None:
+        return _perfil_estatico
+
+    with _perfil_lock:
+        if _perfil_estatico is not None:
+            return _perfil_estatico
+
+        # Importado no primeiro uso: o master do gunicorn (--preload) não precisa do psutil
+        import psutil
+
+        cronometro = _Cronometro()
+        info: Dict[str, Any] = {}
+        info["platform"] = cronometro.medir("platform", platform.system)
+        info["platform_release"] = cronometro.medir("platform_release", platform.release)
+        info["architecture"] = cronometro.medir("architecture", platform.machine)
+        info["hostname"] = cronometro.medir("hostname", platform.node)
+        info["processor"] = cronometro.medir("processor", platform.processor)
+        info["python_version"] = cronometro.medir("python_version", platform.python_version)
+        info["cpu_count"] = cronometro.medir("cpu_count", lambda: psutil.cpu_count(logical=True))
+
+        freq = cronometro.medir("cpu_freq_limits", psutil.cpu_freq)
+        info["cpu_freq_min"] = freq.min if freq else None
+        info["cpu_freq_max"] = freq.max if freq else None
+
+        info["boot_time"] = cronometro.medir(
+            "boot_time",
+            lambda: datetime.datetime.fromtimestamp(psutil.boot_time()).strftime("%Y-%m-%d %H:%M:%S"),
+        )
+        info["timings_ms"] = cronometro.tempos
+        _perfil_estatico = info
+        return info
+
+
+class _CacheParticoes:
+    """
+    Lista de partições montadas, relida apenas quando as montagens mudam.
+    No Linux compara o conteúdo de /proc/self/mounts (leitura barata);
+    nas demais plataformas renova após HW_PARTITIONS_TTL segundos.
+    """
+
+    _MOUNTS = "/proc/self/mounts"
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self._assinatura: Optional[int] = None
+        self._lidas_em = 0.0
+        self._particoes: List[Any] = []
+
+    def _ler_assinatura(self) -> Optional[int]:
+        try:
+            with open(self._MOUNTS, "rb") as arquivo:
+                return hash(arquivo.read())
+        except OSError:
+            return None
+
+    def obter(self) -> List[Any]:
+        assinatura = self._ler_assinatura()
+        if assinatura is not None:
+            mudou = assinatura != self._assinatura
+        else:
+            mudou = time.monotonic() - self._lidas_em > self.ttl
+        if mudou or not self._lidas_em:
+            import psutil
+
+            self._particoes = psutil.disk_partitions()
+            self._assinatura = assinatura
+            self._lidas_em = time.monotonic()
+        return self._particoes
+
+
+_particoes = _CacheParticoes(HW_PARTITIONS_TTL)
+
+
+def coletar_dinamico(cpu_interval: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Dados que mudam a cada amostra: frequência atual, uso de CPU, memória e discos.
+    Com cpu_interval=None o uso de CPU é medido desde a chamada anterior, sem bloquear.
+    """
+    import psutil
+
+    cronometro = _Cronometro()
+    info: Dict[str, Any] = {}
+
+    # CPU
+    freq = cronometro.medir("cpu_freq_current", psutil.cpu_freq)
+    info["cpu_freq_current"] = freq.current if freq else None
+    info["cpu_usage_percent"] = cronometro.medir(
+        "cpu_usage_percent", lambda: psutil.cpu_percent(interval=cpu_interval), 0.0
+    )
+
+    # Memória
+    svmem = cronometro.medir("memory", psutil.virtual_memory)
+    info["total_memory"] = svmem.total if svmem else None
+    info["available_memory"] = svmem.available if svmem else None
+    info["memory_usage_percent"] = svmem.percent if svmem else None
+
+    # Disco
+    partitions = cronometro.medir("disk_partitions", _particoes.obter, [])
+
+    def _uso_discos() -> List[Dict[str, Any]]:
+        disks = []
+        for p in partitions:
+            try:
+                usage = psutil.disk_usage(p.mountpoint)
+            except (PermissionError, FileNotFoundError, OSError, SystemError):
+                # Alguns dispositivos virtuais ou montagens especiais podem falhar ao consultar uso
+                continue
+
+            disks.append(
+                {
+                    "device": p.device,
+                    "mountpoint": p.mountpoint,
+                    "fstype": p.fstype,
+                    "total": usage.total,
+                    "used": usage.used,
+                    "free": usage.free,
+                    "percent": usage.percent,
+                }
+            )
+        return disks
+
+    info["disks"] = cronometro.medir("disk_usage", _uso_discos, [])
+
+    # Temperaturas (só Linux/FreeBSD expõem sensores pelo psutil)
+    def _temperaturas() -> Dict[str, float]:
+        leitor = getattr(psutil, "sensors_temperatures", None)
+        if leitor is None:
+            return {}
+        temperaturas = {}
+        for sensor, leituras in leitor().items():
+            for i, leitura in enumerate(leituras):
+                temperaturas[f"{sensor}/{leitura.label or i}"] = leitura.current
+        return temperaturas
+
+    info["temperatures"] = cronometro.medir("temperatures", _temperaturas, {})
+    info["timings_ms"] = cronometro.tempos
+    return info
+
+
+def coletar_system_info(cpu_interval: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Coleta informações básicas de hardware do servidor: o perfil estático (em cache)
+    somado à parte dinâmica. `timings_ms` traz o custo de cada campo por seção.
+    """
+    estatico = perfil_estatico()
+    dinamico = coletar_dinamico(cpu_interval=cpu_interval)
+
+    info: Dict[str, Any] = {k: v for k, v in estatico.items() if k != "timings_ms"}
+    info.update({k: v for k, v in dinamico.items() if k != "timings_ms"})
+    info["timings_ms"] = {"static": dict(estatico["timings_ms"]), "dynamic": dinamico["timings_ms"]}
+    return info
+
+
+class HardwareSampler:
+    """
+    Mantém o último snapshot de hardware, atualizado por uma thread em segundo plano.
+    A thread só é criada no primeiro uso (e recriada após fork), então cada
+    worker do gunicorn tem o seu próprio amostrador.
+    """
+
+    def __init__(
+        self,
+        intervalo: float = HW_SAMPLE_INTERVAL,
+        max_idade: float = HW_SAMPLE_MAX_AGE,
+    ) -> None:
+        self.intervalo = intervalo
+        self.max_idade = max_idade
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._primeira_amostra = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        # (instante monotônico da coleta, dados coletados)
+        self._snapshot: Optional[Tuple[float, Dict[str, Any]]] = None
+        self._ouvintes: List[Callable[[Dict[str, Any]], None]] = []
+
+    def adicionar_ouvinte(self, funcao: Callable[[Dict[str, Any]], None]) -> None:
+        """Registra uma função chamada com cada nova amostra (ex.: histórico de métricas)."""
+        with self._lock:
+            if funcao not in self._ouvintes:
+                self._ouvintes.append(funcao)
+
+    def start(self) -> None:
+        """Inicia a thread de amostragem, se ainda não estiver rodando neste processo."""
+        # Caminho rápido sem Thread.is_alive(), que cede o loop sob gevent a cada requisição;
+        # a thread só termina depois de stop(), que deixa _parar ligado.
+        if self._pid == os.getpid() and self._thread is not None and not self._parar.is_set():
+            return
+
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # Processo filho herdou o estado do pai: descarta o snapshot herdado
+                self._snapshot = None
+                self._primeira_amostra.clear()
+            self._parar.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._executar, name="hardware-sampler", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Interrompe a thread de amostragem."""
+        self._parar.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=self.intervalo + 1)
+
+    def _executar(self) -> None:
+        janela: Optional[float] = min(_PRIMEIRA_JANELA_CPU, self.intervalo)
+        while not self._parar.is_set():
+            try:
+                self._amostrar(cpu_interval=janela)
+                janela = None
+            except Exception:
+                # Uma falha pontual de coleta não pode derrubar o amostrador
+                pass
+            self._parar.wait(self.intervalo)
+
+    def _amostrar(self, cpu_interval: Optional[float] = None) -> Tuple[float, Dict[str, Any]]:
+        # psutil lê /proc e /sys em C: com gevent, roda numa thread nativa do pool
+        info = executar_bloqueante(coletar_system_info, cpu_interval)
+        info["sampled_at"] = datetime.datetime.utcnow().isoformat() + "Z"
+        amostra = (time.monotonic(), info)
+        self._snapshot = amostra
+        self._primeira_amostra.set()
+        for ouvinte in list(self._ouvintes):
+            try:
+                ouvinte(info)
+            except Exception:
+                pass
+        return amostra
+
+    def snapshot(self, coletar: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Retorna uma cópia do último snapshot sem bloquear pela janela de CPU.
+        Se o snapshot estiver mais velho que max_idade, faz uma coleta síncrona
+        não bloqueante (o uso de CPU é medido desde a última amostra).
+        Com `coletar=False` (servidor sob carga) nunca coleta nem espera: devolve o
+        último snapshot, mesmo antigo, ou None se ainda não houver nenhum.
+        """
+        self.start()
+
+        atual = self._snapshot
+        if not coletar:
+            return None if atual is None else self._copiar(atual[1])
+        if atual is None:
+            # Primeiro uso no processo: aguarda brevemente a amostra inicial da thread
+            self._primeira_amostra.wait(timeout=_PRIMEIRA_JANELA_CPU * 4)
+            atual = self._snapshot
+
+        if atual is None or time.monotonic() - atual[0] > self.max_idade:
+            atual = self._amostrar()
+        return self._copiar(atual[1])
+
+    @staticmethod
+    def _copiar(dados: Dict[str, Any]) -> Dict[str, Any]:
+        info = dict(dados)
+        info["disks"] = [dict(d) for d in dados["disks"]]
+        info["temperatures"] = dict(dados.get("temperatures", {}))
+        return info
+
+
+# Amostrador compartilhado pelo processo (Flask e Streamlit)
+sampler = HardwareSampler()
+
+
+def obter_system_info(coletar: bool = True) -> Optional[Dict[str, Any]]:
+    """Atalho para o snapshot do amostrador compartilhado."""
+    return sampler.snapshot(coletar)
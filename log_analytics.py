@@ -0,0 +1,479 @@
+# log_analytics.py
+# Análise incremental dos logs de diagnóstico no S3: listagem e leitura paralelas, agregação e manifesto
+#
+# Uso:
+#   python log_analytics.py --bucket meu-bucket
+#   python log_analytics.py --bucket meu-bucket --desde 2026-10-01 --granularidade hora --json relatorio.json
+#   python log_analytics.py --fake-s3 /tmp/s3 --bucket bench-logs      # S3 falso local (fake_s3.py)
+
+import argparse
+import datetime
+import gzip
+import json
+import os
+import queue
+import re
+import sys
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from log_keys import LOG_PREFIX, interpretar_chave, normalizar_host, prefixo_periodo
+
+ANALYTICS_WORKERS = int(os.getenv("ANALYTICS_WORKERS", "16"))
+ANALYTICS_MANIFEST = os.getenv("ANALYTICS_MANIFEST", "analytics_manifest.json")
+# Partições (dt/hour) mais antigas que isso não recebem mais objetos e saem do manifesto
+ANALYTICS_CLOSE_HOURS = float(os.getenv("ANALYTICS_CLOSE_HOURS", "2"))
+# Prefixo onde log_compaction.py grava as horas arquivadas ('' não lê os compactados)
+ANALYTICS_COMPACTED_PREFIX = os.getenv("ANALYTICS_COMPACTED_PREFIX", os.getenv("COMPACTION_PREFIX", "compactados"))
+
+MANIFEST_VERSION = 1
+GRANULARIDADES = {"dia": 10, "hora": 13}  # tamanho do prefixo ISO usado como período
+HOST_DESCONHECIDO = "desconhecido"
+
+_DIA = re.compile(r"/dt=(\d{4}-\d{2}-\d{2})/")
+_FIM = object()
+
+
+class Agregado:
+    """Contagens por sintoma, diagnóstico, host, período e (host, período, sintoma)."""
+
+    def __init__(self, granularidade: str = "dia") -> None:
+        if granularidade not in GRANULARIDADES:
+            raise ValueError(f"granularidade inválida: {granularidade}")
+        self.granularidade = granularidade
+        self.objetos = 0
+        self.registros = 0
+        self.erros = 0
+        self.por_sintoma: Counter = Counter()
+        self.por_diagnostico: Counter = Counter()
+        self.por_host: Counter = Counter()
+        self.por_periodo: Counter = Counter()
+        self.por_host_periodo_sintoma: Counter = Counter()
+
+    def adicionar(self, registro: Dict[str, Any], chave: Optional[Dict[str, str]] = None) -> None:
+        self.registros += 1
+
+        resumo = registro.get("resumo_hardware") or {}
+        host = resumo.get("hostname") or (chave or {}).get("host")
+        host = normalizar_host(host) if host else HOST_DESCONHECIDO
+
+        timestamp = str(registro.get("timestamp_utc") or "")
+        if len(timestamp) >= 13:
+            periodo = timestamp[: GRANULARIDADES[self.granularidade]]
+        elif chave:
+            periodo = chave["dt"] if self.granularidade == "dia" else f"{chave['dt']}T{chave['hour']}"
+        else:
+            periodo = "desconhecido"
+
+        self.por_host[host] += 1
+        self.por_periodo[periodo] += 1
+        for sintoma in set(registro.get("sintomas") or []):
+            self.por_sintoma[sintoma] += 1
+            self.por_host_periodo_sintoma[(host, periodo, sintoma)] += 1
+        for diagnostico in registro.get("diagnosticos") or []:
+            # Logs antigos guardavam só o texto do diagnóstico
+            nome = diagnostico.get("diagnostico") if isinstance(diagnostico, dict) else diagnostico
+            if nome:
+                self.por_diagnostico[str(nome)] += 1
+
+    def somar(self, outro: "Agregado") -> None:
+        self.objetos += outro.objetos
+        self.registros += outro.registros
+        self.erros += outro.erros
+        self.por_sintoma.update(outro.por_sintoma)
+        self.por_diagnostico.update(outro.por_diagnostico)
+        self.por_host.update(outro.por_host)
+        self.por_periodo.update(outro.por_periodo)
+        self.por_host_periodo_sintoma.update(outro.por_host_periodo_sintoma)
+
+    def para_dict(self) -> Dict[str, Any]:
+        aninhado: Dict[str, Dict[str, Dict[str, int]]] = {}
+        for (host, periodo, sintoma), total in sorted(self.por_host_periodo_sintoma.items()):
+            aninhado.setdefault(host, {}).setdefault(periodo, {})[sintoma] = total
+        return {
+            "granularidade": self.granularidade,
+            "objetos": self.objetos,
+            "registros": self.registros,
+            "erros": self.erros,
+            "por_sintoma": dict(self.por_sintoma.most_common()),
+            "por_diagnostico": dict(self.por_diagnostico.most_common()),
+            "por_host": dict(self.por_host.most_common()),
+            "por_periodo": dict(sorted(self.por_periodo.items())),
+            "por_host_periodo_sintoma": aninhado,
+        }
+
+    @classmethod
+    def de_dict(cls, dados: Dict[str, Any]) -> "Agregado":
+        agregado = cls(dados.get("granularidade", "dia"))
+        agregado.objetos = dados.get("objetos", 0)
+        agregado.registros = dados.get("registros", 0)
+        agregado.erros = dados.get("erros", 0)
+        agregado.por_sintoma.update(dados.get("por_sintoma", {}))
+        agregado.por_diagnostico.update(dados.get("por_diagnostico", {}))
+        agregado.por_host.update(dados.get("por_host", {}))
+        agregado.por_periodo.update(dados.get("por_periodo", {}))
+        for host, periodos in dados.get("por_host_periodo_sintoma", {}).items():
+            for periodo, sintomas in periodos.items():
+                for sintoma, total in sintomas.items():
+                    agregado.por_host_periodo_sintoma[(host, periodo, sintoma)] = total
+        return agregado
+
+
+def ler_registros(chave: str, resposta: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Lê um objeto de log em streaming: NDJSON (com ou sem gzip) linha a linha,
+    ou o formato antigo, um único JSON por objeto (`logs/diagnostico_<ts>.json`).
+    Arquivos de log_compaction (.parquet/.arrow) voltam ao formato dos registros.
+    """
+    corpo = resposta["Body"]
+    if chave.endswith((".parquet", ".arrow")):
+        from log_compaction import ler_tabela, registros_da_tabela
+
+        yield from registros_da_tabela(ler_tabela(corpo.read(), chave))
+        return
+    if chave.endswith(".gz") or resposta.get("ContentEncoding") == "gzip":
+        corpo = gzip.GzipFile(fileobj=corpo, mode="rb")
+
+    if chave.endswith(".json"):
+        dados = json.loads(corpo.read())
+        if isinstance(dados, dict):
+            yield dados
+        return
+
+    linhas = corpo.iter_lines() if hasattr(corpo, "iter_lines") else corpo
+    for linha in linhas:
+        linha = linha.strip()
+        if linha:
+            yield json.loads(linha)
+
+
+def processar_objeto(cliente: Any, bucket: str, chave: str, granularidade: str) -> Agregado:
+    """Baixa e agrega um objeto; falhas contam em `erros` sem interromper a análise."""
+    agregado = Agregado(granularidade)
+    agregado.objetos = 1
+    particao = interpretar_chave(chave)
+    try:
+        resposta = cliente.get_object(Bucket=bucket, Key=chave)
+        for registro in ler_registros(chave, resposta):
+            if isinstance(registro, dict):
+                agregado.adicionar(registro, particao)
+    except Exception:
+        agregado.erros += 1
+    return agregado
+
+
+def processar_compactado(
+    cliente: Any, bucket: str, chave: str, granularidade: str, pendente: Callable[[str], bool]
+) -> Tuple[Agregado, Set[str]]:
+    """
+    Agrega um arquivo de log_compaction contando só as linhas cujo objeto de origem ainda
+    não foi lido; devolve também todas as origens que o arquivo cobre.
+    """
+    agregado = Agregado(granularidade)
+    agregado.objetos = 1
+    try:
+        from log_compaction import ler_tabela, registros_da_tabela
+
+        tabela = ler_tabela(cliente.get_object(Bucket=bucket, Key=chave)["Body"].read(), chave)
+        linhas = list(zip(tabela.column("objeto").to_pylist(), registros_da_tabela(tabela)))
+    except Exception:
+        agregado.erros += 1
+        return agregado, set()
+    for objeto, registro in linhas:
+        if pendente(objeto):
+            agregado.adicionar(registro, interpretar_chave(objeto))
+    # Arquivo relido sem linhas novas não conta como objeto novo
+    agregado.objetos = 1 if agregado.registros else 0
+    return agregado, {objeto for objeto, _ in linhas}
+
+
+def _hora_particao(momento: datetime.datetime, prefixo: str) -> str:
+    """Marca que fica depois de todas as chaves da hora `momento` (hosts usam [A-Za-z0-9._-])."""
+    return f"{prefixo_periodo(momento.date(), momento.hour, prefixo)}~"
+
+
+class Manifesto:
+    """
+    Checkpoint local das análises anteriores:
+    - `marca`: chaves <= marca estão em partições fechadas e já foram processadas
+      (a listagem seguinte começa com StartAfter=marca);
+    - `processados`: chaves já lidas depois da marca (partições ainda abertas);
+    - `agregado`: contagens acumuladas, às quais as próximas execuções somam.
+    """
+
+    def __init__(self, caminho: Optional[str], granularidade: str) -> None:
+        self.caminho = caminho
+        self.marca: Optional[str] = None
+        self.processados: Set[str] = set()
+        self.agregado = Agregado(granularidade)
+        if caminho and os.path.exists(caminho):
+            with open(caminho, encoding="utf-8") as arquivo:
+                dados = json.load(arquivo)
+            if dados.get("versao") != MANIFEST_VERSION:
+                raise ValueError(f"manifesto {caminho} em versão incompatível")
+            if dados["agregado"].get("granularidade") != granularidade:
+                raise ValueError(
+                    f"manifesto {caminho} usa granularidade {dados['agregado'].get('granularidade')!r}; "
+                    "use outro arquivo ou a mesma granularidade"
+                )
+            self.marca = dados.get("marca")
+            self.processados = set(dados.get("processados", []))
+            self.agregado = Agregado.de_dict(dados["agregado"])
+
+    def pendente(self, chave: str) -> bool:
+        return not (self.marca and chave <= self.marca) and chave not in self.processados
+
+    def avancar(self, marca: str) -> None:
+        if self.marca is None or marca > self.marca:
+            self.marca = marca
+        self.processados = {c for c in self.processados if c > self.marca}
+
+    def salvar(self) -> None:
+        if not self.caminho:
+            return
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(
+                {
+                    "versao": MANIFEST_VERSION,
+                    "atualizado_em": datetime.datetime.utcnow().isoformat() + "Z",
+                    "marca": self.marca,
+                    "processados": sorted(self.processados),
+                    "agregado": self.agregado.para_dict(),
+                },
+                arquivo,
+                ensure_ascii=False,
+            )
+        os.replace(temporario, self.caminho)
+
+
+def listar_chaves(cliente: Any, bucket: str, prefixo: str, depois_de: Optional[str] = None) -> Iterator[str]:
+    """Chaves sob `prefixo`, em ordem, paginando list_objects_v2."""
+    params: Dict[str, Any] = {"Bucket": bucket, "Prefix": prefixo}
+    if depois_de and depois_de > prefixo:
+        params["StartAfter"] = depois_de
+    for pagina in cliente.get_paginator("list_objects_v2").paginate(**params):
+        for objeto in pagina.get("Contents", []):
+            yield objeto["Key"]
+
+
+def _prefixos_por_dia(inicio: datetime.date, fim: datetime.date, prefixo: str) -> List[str]:
+    dias = (fim - inicio).days
+    return [prefixo_periodo(inicio + datetime.timedelta(days=i), None, prefixo) for i in range(dias + 1)]
+
+
+class LogAnalytics:
+    """
+    Lista e lê os logs em paralelo e soma as contagens ao manifesto.
+    Com um ponto de partida (marca do manifesto ou `desde`), a listagem é dividida
+    por dia e feita em paralelo; os downloads começam à medida que as páginas chegam.
+
+    Horas já arquivadas por log_compaction (que por padrão apaga as fontes) são lidas de
+    `compactados` antes dos logs; as origens cobertas por eles não são lidas de novo.
+    """
+
+    def __init__(
+        self,
+        cliente: Any,
+        bucket: str,
+        prefixo: str = LOG_PREFIX,
+        workers: int = ANALYTICS_WORKERS,
+        granularidade: str = "dia",
+        manifesto: Optional[str] = ANALYTICS_MANIFEST,
+        fechamento_horas: float = ANALYTICS_CLOSE_HOURS,
+        agora: Optional[Callable[[], datetime.datetime]] = None,
+        compactados: Optional[str] = ANALYTICS_COMPACTED_PREFIX,
+    ) -> None:
+        self.cliente = cliente
+        self.bucket = bucket
+        self.prefixo = prefixo.rstrip("/")
+        self.workers = workers
+        self.granularidade = granularidade
+        self.manifesto = Manifesto(manifesto, granularidade)
+        self.fechamento = datetime.timedelta(hours=fechamento_horas)
+        self._agora = agora or datetime.datetime.utcnow
+        self.compactados: Optional[str] = None
+        if compactados:
+            from log_compaction import SCHEMA_VERSION
+
+            self.compactados = f"{compactados.rstrip('/')}/v{SCHEMA_VERSION}"
+            # `--prefixo compactados/v1` já analisa só o arquivo
+            if self.prefixo == self.compactados:
+                self.compactados = None
+
+    def _dia_da_marca(self) -> Optional[datetime.date]:
+        achado = _DIA.search(self.manifesto.marca or "")
+        return datetime.date.fromisoformat(achado.group(1)) if achado else None
+
+    def _fontes(
+        self, desde: Optional[datetime.date], ate: Optional[datetime.date], prefixo: Optional[str] = None
+    ) -> List[Tuple[str, Optional[str]]]:
+        """Pares (prefixo, StartAfter) a listar."""
+        prefixo = prefixo or self.prefixo
+        # A marca é uma chave de `self.prefixo`; em outro prefixo ela só define o dia inicial
+        marca = self.manifesto.marca if prefixo == self.prefixo else None
+        dia_marca = self._dia_da_marca()
+        inicio = max(d for d in (desde, dia_marca) if d) if (desde or dia_marca) else None
+        if inicio is None:
+            return [(f"{prefixo}/", marca)]
+        fim = ate or self._agora().date()
+        return [(p, marca) for p in _prefixos_por_dia(inicio, fim, prefixo)]
+
+    def _listar(self, fontes: List[Tuple[str, Optional[str]]], executor: ThreadPoolExecutor) -> Iterator[str]:
+        """Lista as fontes em paralelo, entregando as chaves conforme as páginas chegam."""
+        chaves: "queue.Queue[Any]" = queue.Queue(maxsize=self.workers * 1000)
+
+        def listar(prefixo: str, marca: Optional[str]) -> None:
+            try:
+                for chave in listar_chaves(self.cliente, self.bucket, prefixo, marca):
+                    chaves.put(chave)
+            finally:
+                chaves.put(_FIM)
+
+        tarefas = [executor.submit(listar, prefixo, marca) for prefixo, marca in fontes]
+        restantes = len(tarefas)
+        while restantes:
+            chave = chaves.get()
+            if chave is _FIM:
+                restantes -= 1
+                continue
+            yield chave
+        for tarefa in tarefas:
+            # Propaga erros de listagem (credenciais, bucket inexistente)
+            tarefa.result()
+
+    def executar(
+        self,
+        desde: Optional[datetime.date] = None,
+        ate: Optional[datetime.date] = None,
+    ) -> Agregado:
+        """Processa os objetos novos e devolve o agregado desta execução (o acumulado fica no manifesto)."""
+        inicio_execucao = self._agora()
+        dia_marca = self._dia_da_marca()
+        # Só avança a marca se a listagem começou nela (ou no início do prefixo);
+        # um --desde posterior deixaria dias sem ler antes da nova marca
+        cobre_tudo = desde is None or (dia_marca is not None and desde <= dia_marca)
+        novo = Agregado(self.granularidade)
+        lidos: List[str] = []
+        cobertas: Set[str] = set()
+
+        def concluir(futuro: "Future[Agregado]", chave: str) -> None:
+            parcial = futuro.result()
+            novo.somar(parcial)
+            if not parcial.erros:
+                lidos.append(chave)
+
+        fontes = self._fontes(desde, ate)
+        arquivadas = self._fontes(desde, ate, self.compactados) if self.compactados else []
+        with ThreadPoolExecutor(max_workers=self.workers) as downloads, \
+                ThreadPoolExecutor(max_workers=min(max(len(fontes), len(arquivadas)), self.workers)) as listagens:
+            if arquivadas:
+                # Arquivos compactados primeiro: as origens que eles cobrem ficam fora da listagem dos logs.
+                # Eles são relidos desde o dia da marca; as linhas de origens já contadas são ignoradas.
+                compactados = []
+                for chave in self._listar(arquivadas, listagens):
+                    achado = _DIA.search(chave)
+                    if desde and achado and achado.group(1) < desde.isoformat():
+                        continue
+                    compactados.append(downloads.submit(
+                        processar_compactado, self.cliente, self.bucket, chave, self.granularidade,
+                        self.manifesto.pendente,
+                    ))
+                for futuro in compactados:
+                    parcial, origens = futuro.result()
+                    novo.somar(parcial)
+                    lidos.extend(o for o in origens if self.manifesto.pendente(o))
+                    cobertas.update(origens)
+
+            pendentes: Dict["Future[Agregado]", str] = {}
+            for chave in self._listar(fontes, listagens):
+                if not self.manifesto.pendente(chave) or chave in cobertas:
+                    continue
+                particao = interpretar_chave(chave)
+                if desde and particao and particao["dt"] < desde.isoformat():
+                    continue
+                # Limita os downloads em andamento (memória constante com milhões de chaves)
+                while len(pendentes) >= self.workers * 4:
+                    feitos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+                    for futuro in feitos:
+                        concluir(futuro, pendentes.pop(futuro))
+                futuro = downloads.submit(processar_objeto, self.cliente, self.bucket, chave, self.granularidade)
+                pendentes[futuro] = chave
+            for futuro in list(pendentes):
+                concluir(futuro, pendentes.pop(futuro))
+
+        self.manifesto.processados.update(lidos)
+        self.manifesto.agregado.somar(novo)
+
+        # Partições que não recebem mais logs saem da lista de processados.
+        # Com falhas de leitura, a marca não avança para que sejam relidas.
+        if cobre_tudo and not novo.erros:
+            corte = inicio_execucao - self.fechamento
+            if ate is not None:
+                corte = min(corte, datetime.datetime.combine(ate, datetime.time()) + datetime.timedelta(days=1))
+            ultima_fechada = corte.replace(minute=0, second=0, microsecond=0) - datetime.timedelta(hours=1)
+            self.manifesto.avancar(_hora_particao(ultima_fechada, self.prefixo))
+        self.manifesto.salvar()
+        return novo
+
+
+def _imprimir(titulo: str, contagens: Dict[str, int], top: int) -> None:
+    print(f"\n{titulo}")
+    for nome, total in list(contagens.items())[:top]:
+        print(f"  {total:>8}  {nome}")
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Análise dos logs de diagnóstico no S3")
+    parser.add_argument("--bucket", default=os.getenv("S3_LOG_BUCKET"), required=not os.getenv("S3_LOG_BUCKET"))
+    parser.add_argument("--prefixo", default=LOG_PREFIX)
+    parser.add_argument("--compactados", default=ANALYTICS_COMPACTED_PREFIX,
+                        help="prefixo dos arquivos de log_compaction ('' não os lê)")
+    parser.add_argument("--desde", type=datetime.date.fromisoformat, default=None, help="AAAA-MM-DD")
+    parser.add_argument("--ate", type=datetime.date.fromisoformat, default=None, help="AAAA-MM-DD")
+    parser.add_argument("--granularidade", choices=sorted(GRANULARIDADES), default="dia")
+    parser.add_argument("--workers", type=int, default=ANALYTICS_WORKERS)
+    parser.add_argument("--manifesto", default=ANALYTICS_MANIFEST,
+                        help="checkpoint entre execuções ('' desativa)")
+    parser.add_argument("--fake-s3", default=None, metavar="DIR", help="usa o S3 falso gravado em DIR")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", default=None, help="grava o agregado acumulado neste arquivo")
+    args = parser.parse_args(argv)
+
+    if args.fake_s3:
+        from fake_s3 import FakeS3Client
+
+        cliente = FakeS3Client(diretorio=args.fake_s3)
+    else:
+        from log_shipper import criar_cliente_s3
+
+        cliente = criar_cliente_s3()
+
+    try:
+        analise = LogAnalytics(
+            cliente, args.bucket, args.prefixo, args.workers, args.granularidade, args.manifesto or None,
+            compactados=args.compactados or None,
+        )
+    except ValueError as e:
+        print(f"erro: {e}", file=sys.stderr)
+        return 2
+
+    novo = analise.executar(args.desde, args.ate)
+    total = analise.manifesto.agregado.para_dict()
+
+    print(f"objetos novos: {novo.objetos} ({novo.registros} registros, {novo.erros} erros)")
+    print(f"acumulado: {total['objetos']} objetos, {total['registros']} registros")
+    _imprimir("Sintomas mais frequentes", total["por_sintoma"], args.top)
+    _imprimir("Regras que mais casam", total["por_diagnostico"], args.top)
+    _imprimir("Hosts", total["por_host"], args.top)
+    _imprimir("Por período", dict(list(total["por_periodo"].items())[-args.top:]), args.top)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as arquivo:
+            json.dump(total, arquivo, ensure_ascii=False, indent=2)
+    return 1 if novo.erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
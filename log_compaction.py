@@ -0,0 +1,487 @@
+# log_compaction.py
+# Compactação dos logs de diagnóstico no S3: junta os objetos pequenos de cada hora num arquivo colunar
+#
+# Uso:
+#   python log_compaction.py --bucket meu-bucket                       # Parquet, apaga as fontes verificadas
+#   python log_compaction.py --bucket meu-bucket --formato arrow --acao expirar
+#   python log_compaction.py --fake-s3 /tmp/s3 --bucket bench-logs --simular
+#
+# Requer pyarrow (pip install -r requirements-optional.txt).
+
+import argparse
+import datetime
+import hashlib
+import heapq
+import io
+import json
+import os
+import re
+import sys
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from log_analytics import ler_registros
+from log_keys import LOG_PREFIX, gerar_ulid, interpretar_chave
+
+COMPACTION_PREFIX = os.getenv("COMPACTION_PREFIX", "compactados")
+COMPACTION_FORMAT = os.getenv("COMPACTION_FORMAT", "parquet")  # parquet ou arrow (IPC)
+COMPACTION_WORKERS = int(os.getenv("COMPACTION_WORKERS", "16"))
+# Só compacta horas encerradas há pelo menos isso (o shipper ainda pode estar enviando lotes atrasados)
+COMPACTION_CLOSE_HOURS = float(os.getenv("COMPACTION_CLOSE_HOURS", "6"))
+# O que fazer com os objetos de origem depois da verificação: apagar, expirar (tag para lifecycle) ou manter
+COMPACTION_ACTION = os.getenv("COMPACTION_ACTION", "apagar")
+COMPACTION_EXPIRE_TAG = os.getenv("COMPACTION_EXPIRE_TAG", "hwdiag-compactado")
+
+# Versão do esquema colunar: muda a cada alteração incompatível e faz parte do prefixo
+SCHEMA_VERSION = 1
+EXTENSOES = {"parquet": "parquet", "arrow": "arrow"}
+ACOES = ("apagar", "expirar", "manter")
+
+# Formato antigo: um JSON indentado por diagnóstico (logs/diagnostico_20261017T035008Z.json)
+_LEGADO = re.compile(r"/diagnostico_(?P<dt>\d{8})T(?P<hour>\d{2})\d{4}Z\.json$")
+_CAMPOS_REGISTRO = {
+    "timestamp_utc", "origem", "sintomas", "descricao_extra", "diagnosticos", "versao_regras", "resumo_hardware",
+}
+_CAMPOS_RESUMO = ("hostname", "platform", "platform_release", "cpu_count", "memory_usage_percent")
+
+
+def esquema() -> "pa.Schema":
+    """Esquema colunar versionado; textos repetitivos (sintomas, diagnósticos, host) são dicionários."""
+    texto = pa.dictionary(pa.int32(), pa.string())
+    diagnostico = pa.struct([("diagnostico", texto), ("causa_provavel", texto), ("recomendacao", texto)])
+    return pa.schema(
+        [
+            ("timestamp", pa.timestamp("us", tz="UTC")),
+            ("host", texto),
+            ("origem", texto),
+            ("versao_regras", texto),
+            ("sintomas", pa.list_(texto)),
+            ("diagnosticos", pa.list_(diagnostico)),
+            ("descricao_extra", pa.string()),
+            ("platform", texto),
+            ("platform_release", texto),
+            ("cpu_count", pa.int32()),
+            ("memory_usage_percent", pa.float64()),
+            # Campos fora do esquema, em JSON, para a conversão não perder nada
+            ("extras", pa.string()),
+            # Objeto de origem: permite retomar uma compactação interrompida sem duplicar registros
+            ("objeto", texto),
+        ],
+        metadata={"hwdiag.schema_version": str(SCHEMA_VERSION)},
+    )
+
+
+class CompactionError(Exception):
+    """Arquivo compactado que não confere com as fontes."""
+
+
+# ---------------------------------------------------------------------- conversão
+def particao_da_fonte(chave: str) -> Optional[Tuple[str, str]]:
+    """(dt, hour) de um objeto de log particionado ou do formato antigo; None para outras chaves."""
+    particao = interpretar_chave(chave)
+    if particao:
+        return particao["dt"], particao["hour"]
+    legado = _LEGADO.search(chave)
+    if legado:
+        dt = legado.group("dt")
+        return f"{dt[:4]}-{dt[4:6]}-{dt[6:]}", legado.group("hour")
+    return None
+
+
+def _timestamp(valor: Any) -> Optional[datetime.datetime]:
+    try:
+        momento = datetime.datetime.fromisoformat(str(valor).rstrip("Z"))
+    except ValueError:
+        return None
+    if momento.tzinfo is None:
+        momento = momento.replace(tzinfo=datetime.timezone.utc)
+    return momento.astimezone(datetime.timezone.utc)
+
+
+def linha_do_registro(registro: Dict[str, Any], objeto: str, host_chave: Optional[str] = None) -> Dict[str, Any]:
+    """Registro de log (o payload de diagnosis_service/api) -> linha do esquema colunar."""
+    resumo = registro.get("resumo_hardware") or {}
+    extras = {k: v for k, v in registro.items() if k not in _CAMPOS_REGISTRO}
+    resumo_extra = {k: v for k, v in resumo.items() if k not in _CAMPOS_RESUMO}
+    if resumo_extra:
+        extras["resumo_hardware"] = resumo_extra
+
+    momento = _timestamp(registro.get("timestamp_utc"))
+    if momento is None and registro.get("timestamp_utc") is not None:
+        extras["timestamp_utc"] = registro["timestamp_utc"]
+
+    diagnosticos = []
+    for diagnostico in registro.get("diagnosticos") or []:
+        if not isinstance(diagnostico, dict):
+            # Logs antigos guardavam só o texto do diagnóstico
+            diagnostico = {"diagnostico": str(diagnostico)}
+        diagnosticos.append({campo: diagnostico.get(campo) for campo in ("diagnostico", "causa_provavel", "recomendacao")})
+
+    return {
+        "timestamp": momento,
+        "host": resumo.get("hostname") or host_chave,
+        "origem": registro.get("origem"),
+        "versao_regras": registro.get("versao_regras"),
+        "sintomas": [str(s) for s in registro.get("sintomas") or []],
+        "diagnosticos": diagnosticos,
+        "descricao_extra": registro.get("descricao_extra"),
+        "platform": resumo.get("platform"),
+        "platform_release": resumo.get("platform_release"),
+        "cpu_count": resumo.get("cpu_count"),
+        "memory_usage_percent": (
+            float(resumo["memory_usage_percent"]) if resumo.get("memory_usage_percent") is not None else None
+        ),
+        "extras": json.dumps(extras, ensure_ascii=False, sort_keys=True, default=str) if extras else None,
+        "objeto": objeto,
+    }
+
+
+def registros_da_tabela(tabela: "pa.Table") -> Iterator[Dict[str, Any]]:
+    """Inverso de linha_do_registro: linhas do arquivo compactado -> registros no formato dos logs."""
+    for linha in tabela.to_pylist():
+        registro: Dict[str, Any] = json.loads(linha["extras"]) if linha.get("extras") else {}
+        resumo_extra = registro.pop("resumo_hardware", {})
+        if linha["timestamp"] is not None:
+            registro["timestamp_utc"] = linha["timestamp"].replace(tzinfo=None).isoformat() + "Z"
+        for campo in ("origem", "versao_regras", "descricao_extra"):
+            if linha[campo] is not None:
+                registro[campo] = linha[campo]
+        registro["sintomas"] = linha["sintomas"]
+        registro["diagnosticos"] = [
+            {campo: valor for campo, valor in d.items() if valor is not None} for d in linha["diagnosticos"]
+        ]
+        resumo = {"hostname": linha["host"]}
+        resumo.update({campo: linha[campo] for campo in _CAMPOS_RESUMO[1:] if linha[campo] is not None})
+        resumo.update(resumo_extra)
+        registro["resumo_hardware"] = resumo
+        yield registro
+
+
+def _assinatura(linhas: Iterable[Dict[str, Any]]) -> str:
+    """SHA-256 do conteúdo das linhas, para conferir o arquivo relido com o que foi montado."""
+    resumo = hashlib.sha256()
+    for linha in linhas:
+        resumo.update(json.dumps(linha, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8"))
+        resumo.update(b"\n")
+    return resumo.hexdigest()
+
+
+# ---------------------------------------------------------------------- arquivos
+def serializar(linhas: List[Dict[str, Any]], formato: str) -> bytes:
+    """Linhas -> Parquet ou Arrow IPC (zstd), com versão, contagem e assinatura nos metadados."""
+    metadados = dict(esquema().metadata)
+    metadados[b"hwdiag.registros"] = str(len(linhas)).encode()
+    metadados[b"hwdiag.sha256"] = _assinatura(linhas).encode()
+    tabela = pa.Table.from_pylist(linhas, schema=esquema().with_metadata(metadados))
+    saida = io.BytesIO()
+    if formato == "parquet":
+        pq.write_table(tabela, saida, compression="zstd", use_dictionary=True)
+    else:
+        opcoes = pa.ipc.IpcWriteOptions(compression="zstd")
+        with pa.ipc.new_file(saida, tabela.schema, options=opcoes) as escritor:
+            escritor.write_table(tabela)
+    return saida.getvalue()
+
+
+def ler_tabela(corpo: bytes, chave: str, colunas: Optional[List[str]] = None) -> "pa.Table":
+    """Lê um arquivo compactado (Parquet ou Arrow IPC, pela extensão da chave)."""
+    if chave.endswith(".parquet"):
+        return pq.read_table(io.BytesIO(corpo), columns=colunas)
+    tabela = pa.ipc.open_file(pa.BufferReader(corpo)).read_all()
+    return tabela.select(colunas) if colunas else tabela
+
+
+def verificar(corpo: bytes, chave: str, linhas: List[Dict[str, Any]]) -> None:
+    """Relê o arquivo gravado e confere versão do esquema, contagem e conteúdo."""
+    tabela = ler_tabela(corpo, chave)
+    metadados = tabela.schema.metadata or {}
+    versao = metadados.get(b"hwdiag.schema_version", b"").decode()
+    if versao != str(SCHEMA_VERSION):
+        raise CompactionError(f"{chave}: versão de esquema {versao or '-'} != {SCHEMA_VERSION}")
+    if tabela.num_rows != len(linhas):
+        raise CompactionError(f"{chave}: {tabela.num_rows} linhas, esperadas {len(linhas)}")
+    esperado = _assinatura(linhas)
+    if metadados.get(b"hwdiag.sha256", b"").decode() != esperado or _assinatura(tabela.to_pylist()) != esperado:
+        raise CompactionError(f"{chave}: conteúdo relido difere das fontes")
+
+
+# ---------------------------------------------------------------------- job
+class LogCompaction:
+    """
+    Compacta as horas encerradas: cada (dt, hour) vira um arquivo
+    `<COMPACTION_PREFIX>/v<versão>/dt=.../hour=.../diagnosticos_<ULID>.<ext>` com os
+    registros de todos os hosts. As fontes só são apagadas (ou marcadas para expirar)
+    depois que o arquivo gravado é relido e conferido. Fontes que já constam em um
+    arquivo da mesma hora (compactação interrompida) não são compactadas de novo.
+    """
+
+    def __init__(
+        self,
+        cliente: Any,
+        bucket: str,
+        prefixo: str = LOG_PREFIX,
+        destino: str = COMPACTION_PREFIX,
+        formato: str = COMPACTION_FORMAT,
+        acao: str = COMPACTION_ACTION,
+        workers: int = COMPACTION_WORKERS,
+        fechamento_horas: float = COMPACTION_CLOSE_HOURS,
+        agora: Optional[datetime.datetime] = None,
+    ) -> None:
+        if pa is None:
+            raise RuntimeError("pyarrow não está instalado (pip install pyarrow)")
+        if formato not in EXTENSOES:
+            raise ValueError(f"formato inválido: {formato}")
+        if acao not in ACOES:
+            raise ValueError(f"ação inválida: {acao}")
+        self.cliente = cliente
+        self.bucket = bucket
+        self.prefixo = prefixo.rstrip("/")
+        self.destino = f"{destino.rstrip('/')}/v{SCHEMA_VERSION}"
+        self.formato = formato
+        self.acao = acao
+        self.workers = workers
+        agora = agora or datetime.datetime.utcnow()
+        # Horas que começam antes deste instante estão encerradas
+        self._corte = agora - datetime.timedelta(hours=fechamento_horas + 1)
+
+    def _fechada(self, particao: Tuple[str, str]) -> bool:
+        inicio = datetime.datetime.strptime(f"{particao[0]}T{particao[1]}", "%Y-%m-%dT%H")
+        return inicio <= self._corte
+
+    def _listar(self, prefixo: str, depois_de: Optional[str]) -> Iterator[Tuple[str, int]]:
+        params: Dict[str, Any] = {"Bucket": self.bucket, "Prefix": prefixo}
+        if depois_de:
+            params["StartAfter"] = depois_de
+        for pagina in self.cliente.get_paginator("list_objects_v2").paginate(**params):
+            for objeto in pagina.get("Contents", []):
+                yield objeto["Key"], objeto.get("Size", 0)
+
+    def _grupos(
+        self, prefixo: str, depois_de: Optional[str], ate: Optional[datetime.date]
+    ) -> Iterator[Tuple[Tuple[str, str], List[Tuple[str, int]]]]:
+        atual: Optional[Tuple[str, str]] = None
+        grupo: List[Tuple[str, int]] = []
+        for chave, tamanho in self._listar(prefixo, depois_de):
+            particao = particao_da_fonte(chave)
+            if particao is None:
+                continue
+            # Chaves em ordem: a primeira hora aberta (ou depois de `ate`) encerra esta listagem
+            if not self._fechada(particao) or (ate and particao[0] > ate.isoformat()):
+                break
+            if particao != atual:
+                if grupo:
+                    yield atual, grupo
+                atual, grupo = particao, []
+            grupo.append((chave, tamanho))
+        if grupo:
+            yield atual, grupo
+
+    def fontes(
+        self, desde: Optional[datetime.date] = None, ate: Optional[datetime.date] = None
+    ) -> Iterator[Tuple[Tuple[str, str], List[Tuple[str, int]]]]:
+        """Grupos (partição, [(chave, tamanho)]) das horas encerradas, em ordem, sem carregar a listagem inteira.
+
+        As duas listagens (hive e formato antigo) já vêm ordenadas por partição; a intercalação junta
+        as fontes de uma mesma hora num único grupo, para que ela gere um só arquivo compactado.
+        """
+        listagens = (
+            self._grupos(f"{self.prefixo}/dt=", f"{self.prefixo}/dt={desde:%Y-%m-%d}" if desde else None, ate),
+            self._grupos(
+                f"{self.prefixo}/diagnostico_", f"{self.prefixo}/diagnostico_{desde:%Y%m%d}" if desde else None, ate
+            ),
+        )
+        atual: Optional[Tuple[str, str]] = None
+        grupo: List[Tuple[str, int]] = []
+        for particao, parte in heapq.merge(*listagens, key=lambda item: item[0]):
+            if particao != atual:
+                if grupo:
+                    yield atual, grupo
+                atual, grupo = particao, []
+            grupo.extend(parte)
+        if grupo:
+            yield atual, grupo
+
+    def _ja_compactadas(self, particao: Tuple[str, str]) -> Set[str]:
+        """Fontes que já constam nos arquivos compactados desta hora."""
+        arquivadas: Set[str] = set()
+        for chave, _ in self._listar(f"{self.destino}/dt={particao[0]}/hour={particao[1]}/", None):
+            corpo = self.cliente.get_object(Bucket=self.bucket, Key=chave)["Body"].read()
+            arquivadas.update(ler_tabela(corpo, chave, ["objeto"]).column("objeto").to_pylist())
+        return arquivadas
+
+    def _ler_fonte(self, chave: str) -> List[Dict[str, Any]]:
+        host = (interpretar_chave(chave) or {}).get("host")
+        resposta = self.cliente.get_object(Bucket=self.bucket, Key=chave)
+        return [linha_do_registro(r, chave, host) for r in ler_registros(chave, resposta) if isinstance(r, dict)]
+
+    def _descartar(self, chaves: List[str]) -> None:
+        if self.acao == "apagar":
+            for inicio in range(0, len(chaves), 1000):
+                bloco = chaves[inicio:inicio + 1000]
+                resposta = self.cliente.delete_objects(
+                    Bucket=self.bucket, Delete={"Objects": [{"Key": c} for c in bloco], "Quiet": True}
+                )
+                if resposta.get("Errors"):
+                    erro = resposta["Errors"][0]
+                    raise CompactionError(f"falha ao apagar {erro.get('Key')}: {erro.get('Message')}")
+        elif self.acao == "expirar":
+            # Uma regra de lifecycle do bucket com filtro por esta tag expira os objetos
+            for chave in chaves:
+                self.cliente.put_object_tagging(
+                    Bucket=self.bucket, Key=chave,
+                    Tagging={"TagSet": [{"Key": COMPACTION_EXPIRE_TAG, "Value": "1"}]},
+                )
+
+    def compactar_particao(
+        self, particao: Tuple[str, str], fontes: List[Tuple[str, int]], downloads: ThreadPoolExecutor,
+        simular: bool = False,
+    ) -> Dict[str, Any]:
+        """Lê as fontes de uma hora, grava e confere o arquivo colunar e descarta as fontes."""
+        arquivadas = self._ja_compactadas(particao)
+        pendentes = [(c, t) for c, t in fontes if c not in arquivadas]
+        resultado: Dict[str, Any] = {
+            "particao": f"dt={particao[0]}/hour={particao[1]}",
+            "fontes": len(pendentes),
+            "bytes_fontes": sum(t for _, t in pendentes),
+            "ja_compactadas": len(fontes) - len(pendentes),
+            "registros": 0,
+            "bytes": 0,
+            "chave": None,
+            "erros": [],
+        }
+        lidas: List[str] = []
+        linhas: List[Dict[str, Any]] = []
+        futuros = {downloads.submit(self._ler_fonte, chave): chave for chave, _ in pendentes}
+        for futuro, chave in futuros.items():
+            try:
+                linhas.extend(futuro.result())
+                lidas.append(chave)
+            except Exception as e:
+                # Fonte ilegível fica no lugar para a próxima execução
+                resultado["erros"].append(f"{chave}: {type(e).__name__}: {e}")
+        tamanhos = dict(pendentes)
+        resultado["fontes"], resultado["bytes_fontes"] = len(lidas), sum(tamanhos[c] for c in lidas)
+        # Ordem estável: por instante e depois pela fonte
+        linhas.sort(key=lambda l: (l["timestamp"] is None, l["timestamp"] or 0, l["objeto"]))
+        resultado["registros"] = len(linhas)
+        if simular:
+            return resultado
+
+        if linhas:
+            chave = (f"{self.destino}/dt={particao[0]}/hour={particao[1]}/"
+                     f"diagnosticos_{gerar_ulid()}.{EXTENSOES[self.formato]}")
+            corpo = serializar(linhas, self.formato)
+            self.cliente.put_object(Bucket=self.bucket, Key=chave, Body=corpo,
+                                    ContentType="application/vnd.apache.parquet" if self.formato == "parquet"
+                                    else "application/vnd.apache.arrow.file")
+            # Confere o que o S3 devolve, não o buffer local
+            verificar(self.cliente.get_object(Bucket=self.bucket, Key=chave)["Body"].read(), chave, linhas)
+            resultado["chave"], resultado["bytes"] = chave, len(corpo)
+
+        # Fontes vazias (sem registros) e já compactadas também são descartadas
+        self._descartar(lidas + sorted(arquivadas & {c for c, _ in fontes}))
+        return resultado
+
+    def executar(
+        self, desde: Optional[datetime.date] = None, ate: Optional[datetime.date] = None, simular: bool = False
+    ) -> Dict[str, Any]:
+        """Compacta todas as horas encerradas no intervalo; devolve o resumo por partição."""
+        particoes: List[Dict[str, Any]] = []
+        # Horas em paralelo (poucas por vez para limitar a memória) e downloads num pool próprio
+        with ThreadPoolExecutor(max_workers=self.workers) as downloads, \
+                ThreadPoolExecutor(max_workers=max(1, self.workers // 4)) as horas:
+            andamento: Dict["Future[Dict[str, Any]]", Tuple[str, str]] = {}
+
+            def concluir(futuro: "Future[Dict[str, Any]]") -> None:
+                particao = andamento.pop(futuro)
+                try:
+                    particoes.append(futuro.result())
+                except Exception as e:
+                    particoes.append({
+                        "particao": f"dt={particao[0]}/hour={particao[1]}", "fontes": 0, "bytes_fontes": 0,
+                        "ja_compactadas": 0, "registros": 0, "bytes": 0, "chave": None,
+                        "erros": [f"{type(e).__name__}: {e}"],
+                    })
+
+            for particao, fontes in self.fontes(desde, ate):
+                while len(andamento) >= max(1, self.workers // 4):
+                    feitos, _ = wait(andamento, return_when=FIRST_COMPLETED)
+                    for futuro in feitos:
+                        concluir(futuro)
+                andamento[horas.submit(self.compactar_particao, particao, fontes, downloads, simular)] = particao
+            for futuro in list(andamento):
+                concluir(futuro)
+
+        particoes.sort(key=lambda p: p["particao"])
+        return {
+            "formato": self.formato,
+            "acao": "nenhuma (simulação)" if simular else self.acao,
+            "versao_esquema": SCHEMA_VERSION,
+            "particoes": particoes,
+            "fontes": sum(p["fontes"] for p in particoes),
+            "registros": sum(p["registros"] for p in particoes),
+            "bytes_fontes": sum(p["bytes_fontes"] for p in particoes),
+            "bytes": sum(p["bytes"] for p in particoes),
+            "erros": sum(len(p["erros"]) for p in particoes),
+        }
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compactação dos logs de diagnóstico em arquivos colunares")
+    parser.add_argument("--bucket", default=os.getenv("S3_LOG_BUCKET"), required=not os.getenv("S3_LOG_BUCKET"))
+    parser.add_argument("--prefixo", default=LOG_PREFIX, help="prefixo dos logs de origem")
+    parser.add_argument("--destino", default=COMPACTION_PREFIX, help="prefixo dos arquivos compactados")
+    parser.add_argument("--formato", choices=sorted(EXTENSOES), default=COMPACTION_FORMAT)
+    parser.add_argument("--acao", choices=ACOES, default=COMPACTION_ACTION,
+                        help="destino das fontes após a verificação")
+    parser.add_argument("--desde", type=datetime.date.fromisoformat, default=None, help="AAAA-MM-DD")
+    parser.add_argument("--ate", type=datetime.date.fromisoformat, default=None, help="AAAA-MM-DD")
+    parser.add_argument("--fechamento-horas", type=float, default=COMPACTION_CLOSE_HOURS)
+    parser.add_argument("--workers", type=int, default=COMPACTION_WORKERS)
+    parser.add_argument("--simular", action="store_true", help="só lista e lê, sem gravar nem apagar")
+    parser.add_argument("--fake-s3", default=None, metavar="DIR", help="usa o S3 falso gravado em DIR")
+    parser.add_argument("--json", default=None, help="grava o resumo neste arquivo")
+    args = parser.parse_args(argv)
+
+    if args.fake_s3:
+        from fake_s3 import FakeS3Client
+
+        cliente = FakeS3Client(diretorio=args.fake_s3)
+    else:
+        from log_shipper import criar_cliente_s3
+
+        cliente = criar_cliente_s3()
+
+    try:
+        job = LogCompaction(cliente, args.bucket, args.prefixo, args.destino, args.formato, args.acao,
+                            args.workers, args.fechamento_horas)
+    except (RuntimeError, ValueError) as e:
+        print(f"erro: {e}", file=sys.stderr)
+        return 2
+
+    resumo = job.executar(args.desde, args.ate, args.simular)
+    for particao in resumo["particoes"]:
+        print(f"  {particao['particao']}: {particao['fontes']} objetos, {particao['registros']} registros, "
+              f"{particao['bytes_fontes']} -> {particao['bytes']} bytes"
+              + (f", {particao['ja_compactadas']} já compactados" if particao["ja_compactadas"] else ""))
+        for erro in particao["erros"]:
+            print(f"    erro: {erro}", file=sys.stderr)
+    print(f"{len(resumo['particoes'])} horas, {resumo['fontes']} objetos -> {resumo['registros']} registros "
+          f"({resumo['formato']}, v{resumo['versao_esquema']}); {resumo['bytes_fontes']} -> {resumo['bytes']} bytes; "
+          f"ação: {resumo['acao']}; erros: {resumo['erros']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as arquivo:
+            json.dump(resumo, arquivo, ensure_ascii=False, indent=2)
+    return 1 if resumo["erros"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
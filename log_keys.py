@@ -0,0 +1,91 @@
+# log_keys.py
+# Esquema de chaves dos logs no S3: partições hive (dt/hour/host) + IDs ordenáveis (ULID)
+
+import datetime
+import os
+import re
+import socket
+import threading
+import time
+from typing import Dict, Optional
+
+LOG_PREFIX = "logs"
+
+# Alfabeto Crockford base32 usado pelo ULID
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_HOST_INVALIDO = re.compile(r"[^A-Za-z0-9._-]+")
+_CHAVE = re.compile(
+    r"^(?P<prefixo>.+?)/dt=(?P<dt>\d{4}-\d{2}-\d{2})/hour=(?P<hour>\d{2})/host=(?P<host>[^/]+)/"
+    r"(?P<nome>[^/]+)$"
+)
+
+_ulid_lock = threading.Lock()
+_ultimo_ms = -1
+_ultimo_aleatorio = 0
+
+
+def _base32(valor: int, digitos: int) -> str:
+    saida = []
+    for _ in range(digitos):
+        saida.append(_CROCKFORD[valor & 31])
+        valor >>= 5
+    return "".join(reversed(saida))
+
+
+def gerar_ulid(agora_ms: Optional[int] = None) -> str:
+    """
+    Gera um ULID (48 bits de milissegundos + 80 bits aleatórios, 26 caracteres).
+    Dentro do mesmo milissegundo a parte aleatória é incrementada, então IDs
+    gerados no mesmo processo são estritamente crescentes.
+    """
+    global _ultimo_ms, _ultimo_aleatorio
+    ms = int(time.time() * 1000) if agora_ms is None else agora_ms
+    with _ulid_lock:
+        if ms <= _ultimo_ms:
+            ms = _ultimo_ms
+            aleatorio = (_ultimo_aleatorio + 1) & ((1 << 80) - 1)
+        else:
+            aleatorio = int.from_bytes(os.urandom(10), "big")
+        _ultimo_ms = ms
+        _ultimo_aleatorio = aleatorio
+    return _base32(ms, 10) + _base32(aleatorio, 16)
+
+
+def host_local() -> str:
+    """Hostname da máquina, normalizado para uso seguro em chaves S3."""
+    return normalizar_host(socket.gethostname())
+
+
+def normalizar_host(host: str) -> str:
+    return _HOST_INVALIDO.sub("-", host or "desconhecido").strip("-") or "desconhecido"
+
+
+def particao(momento: datetime.datetime, host: str) -> str:
+    """Partição hive `dt=YYYY-MM-DD/hour=HH/host=<host>` (momento em UTC)."""
+    return f"dt={momento:%Y-%m-%d}/hour={momento:%H}/host={normalizar_host(host)}"
+
+
+def particao_do_timestamp(timestamp_utc: Optional[str], host: str) -> str:
+    """Partição a partir do `timestamp_utc` ISO do payload; usa o horário atual se inválido."""
+    try:
+        momento = datetime.datetime.strptime((timestamp_utc or "")[:13], "%Y-%m-%dT%H")
+    except ValueError:
+        momento = datetime.datetime.utcnow()
+    return particao(momento, host)
+
+
+def montar_chave_log(particao_hive: str, extensao: str = "ndjson.gz", prefixo: str = LOG_PREFIX) -> str:
+    """Chave única e ordenável dentro da partição: `<prefixo>/<particao>/diagnostico_<ULID>.<ext>`."""
+    return f"{prefixo}/{particao_hive}/diagnostico_{gerar_ulid()}.{extensao}"
+
+
+def interpretar_chave(chave: str) -> Optional[Dict[str, str]]:
+    """Extrai prefixo, dt, hour, host e nome de uma chave particionada (None se não for)."""
+    achado = _CHAVE.match(chave)
+    return achado.groupdict() if achado else None
+
+
+def prefixo_periodo(dia: datetime.date, hora: Optional[int] = None, prefixo: str = LOG_PREFIX) -> str:
+    """Prefixo de listagem restrito a um dia (e opcionalmente uma hora)."""
+    base = f"{prefixo}/dt={dia:%Y-%m-%d}/"
+    return base if hora is None else f"{base}hour={hora:02d}/"
@@ -0,0 +1,297 @@
+# log_shipper.py
+# Envio assíncrono e em lotes dos logs de diagnóstico para o S3
+
+import atexit
+import gzip
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from log_keys import host_local, montar_chave_log, particao_do_timestamp
+import metrics
+from offload import executar_bloqueante
+
+AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
+S3_LOG_BUCKET = os.getenv("S3_LOG_BUCKET")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # ex.: moto_server ou MinIO local
+
+S3_LOG_QUEUE_SIZE = int(os.getenv("S3_LOG_QUEUE_SIZE", "10000"))
+S3_LOG_BATCH_SIZE = int(os.getenv("S3_LOG_BATCH_SIZE", "200"))
+S3_LOG_BATCH_BYTES = int(os.getenv("S3_LOG_BATCH_BYTES", str(1024 * 1024)))
+S3_LOG_FLUSH_SECONDS = float(os.getenv("S3_LOG_FLUSH_SECONDS", "5"))
+S3_LOG_GZIP = os.getenv("S3_LOG_GZIP", "1").lower() not in ("0", "false", "no")
+S3_LOG_MAX_RETRIES = int(os.getenv("S3_LOG_MAX_RETRIES", "5"))
+# Fração da fila a partir da qual o envio adiado (servidor sob carga) é retomado para não descartar registros
+S3_LOG_DEFER_MAX_FILL = float(os.getenv("S3_LOG_DEFER_MAX_FILL", "0.8"))
+
+# Marcador interno usado por flush() para sincronizar com o worker
+_FLUSH = object()
+
+
+def criar_cliente_s3(region: str = AWS_REGION, endpoint_url: Optional[str] = S3_ENDPOINT_URL) -> Any:
+    """Cria o cliente S3 de longa duração usado pelo worker."""
+    import boto3
+
+    session = boto3.session.Session(region_name=region)
+    return session.client("s3", endpoint_url=endpoint_url)
+
+
+class S3LogShipper:
+    """
+    Fila limitada em memória + worker que agrupa logs em NDJSON (opcionalmente gzip)
+    e envia um objeto por partição do lote, quando o lote atinge tamanho, bytes ou
+    idade máxima. As chaves seguem `log_keys` (dt/hour/host + ULID), sem colisões
+    entre workers.
+    Quem chama `enviar` apenas enfileira e retorna; a fila cheia descarta o registro
+    e contabiliza nas métricas de contrapressão.
+    """
+
+    def __init__(
+        self,
+        bucket: Optional[str],
+        client_factory: Optional[Callable[[], Any]] = None,
+        max_fila: int = S3_LOG_QUEUE_SIZE,
+        max_lote: int = S3_LOG_BATCH_SIZE,
+        max_bytes_lote: int = S3_LOG_BATCH_BYTES,
+        max_idade_lote: float = S3_LOG_FLUSH_SECONDS,
+        comprimir: bool = S3_LOG_GZIP,
+        max_tentativas: int = S3_LOG_MAX_RETRIES,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        host: Optional[str] = None,
+    ) -> None:
+        self.bucket = bucket
+        self.client_factory = client_factory or criar_cliente_s3
+        self.max_lote = max_lote
+        self.max_bytes_lote = max_bytes_lote
+        self.max_idade_lote = max_idade_lote
+        self.comprimir = comprimir
+        self.max_tentativas = max_tentativas
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.host = host or host_local()
+
+        self._fila: "queue.Queue[Any]" = queue.Queue(maxsize=max_fila)
+        self._cliente: Any = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._encerrado = False
+        # Instante (monotônico) até o qual o worker não consome a fila; ver adiar_envio
+        self._adiado_ate = 0.0
+        self._retomar = threading.Event()
+
+        self._metricas: Dict[str, Any] = {
+            "enfileirados": 0,
+            "descartados_fila_cheia": 0,
+            "lotes_enviados": 0,
+            "registros_enviados": 0,
+            "bytes_enviados": 0,
+            "retentativas": 0,
+            "lotes_perdidos": 0,
+            "registros_perdidos": 0,
+            "maior_fila": 0,
+            "adiamentos": 0,
+            "ultimo_erro": None,
+        }
+
+    # ------------------------------------------------------------------ API pública
+    def enviar(self, payload: Dict[str, Any]) -> bool:
+        """Enfileira um registro sem bloquear. Retorna False se ele foi descartado."""
+        if not self.bucket or self._encerrado:
+            return False
+        self._garantir_worker()
+        try:
+            self._fila.put_nowait(payload)
+        except queue.Full:
+            with self._lock:
+                self._metricas["descartados_fila_cheia"] += 1
+            metrics.S3_FAILURES.inc(etapa="fila_cheia")
+            return False
+        with self._lock:
+            self._metricas["enfileirados"] += 1
+            tamanho = self._fila.qsize()
+            if tamanho > self._metricas["maior_fila"]:
+                self._metricas["maior_fila"] = tamanho
+        return True
+
+    def adiar_envio(self, segundos: float) -> None:
+        """
+        Suspende a serialização, compressão e envio por `segundos` (estendendo um adiamento
+        em curso), liberando CPU para as requisições quando o servidor está sob carga.
+        Os registros continuam sendo enfileirados; o worker retoma antes do prazo se a
+        fila passar de S3_LOG_DEFER_MAX_FILL, e flush/shutdown cancelam o adiamento.
+        """
+        prazo = time.monotonic() + segundos
+        if prazo > self._adiado_ate:
+            if self._adiado_ate <= time.monotonic():
+                with self._lock:
+                    self._metricas["adiamentos"] += 1
+            self._adiado_ate = prazo
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Força o envio de tudo que já foi enfileirado. Retorna False em timeout."""
+        self._adiado_ate = 0.0
+        self._retomar.set()
+        if self._thread is None or not self._thread.is_alive():
+            return self._fila.empty()
+        concluido = threading.Event()
+        try:
+            self._fila.put((_FLUSH, concluido), timeout=timeout)
+        except queue.Full:
+            return False
+        return concluido.wait(timeout)
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """Envia o que restou na fila e encerra o worker (registrado no atexit)."""
+        if self._encerrado:
+            return
+        self.flush(timeout)
+        self._encerrado = True
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            try:
+                self._fila.put(None, timeout=timeout)
+            except queue.Full:
+                return
+            thread.join(timeout)
+
+    def metricas(self) -> Dict[str, Any]:
+        """Contadores de contrapressão e envio, incluindo o tamanho atual da fila."""
+        with self._lock:
+            dados = dict(self._metricas)
+        dados["fila_atual"] = self._fila.qsize()
+        dados["fila_capacidade"] = self._fila.maxsize
+        return dados
+
+    # ------------------------------------------------------------------ worker
+    def _garantir_worker(self) -> None:
+        # Caminho rápido só compara o pid: Thread.is_alive() cede o loop sob gevent.
+        # O worker só termina no shutdown, e depois dele enviar() não chega aqui.
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            # Após fork, o cliente herdado não deve ser reaproveitado
+            self._cliente = None
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._executar, name="s3-log-shipper", daemon=True)
+            self._thread.start()
+
+    def _executar(self) -> None:
+        # (partição hive, linha NDJSON)
+        lote: List[Tuple[str, bytes]] = []
+        bytes_lote = 0
+        inicio_lote = 0.0
+
+        while True:
+            adiamento = self._adiado_ate - time.monotonic()
+            if adiamento > 0 and self._fila.qsize() < self._fila.maxsize * S3_LOG_DEFER_MAX_FILL:
+                # Servidor sob carga: deixa os registros na fila até o prazo
+                self._retomar.wait(min(adiamento, 1.0))
+                self._retomar.clear()
+                continue
+
+            if lote:
+                espera = max(0.0, self.max_idade_lote - (time.monotonic() - inicio_lote))
+            else:
+                espera = None
+            try:
+                item = self._fila.get(timeout=espera)
+            except queue.Empty:
+                item = _FLUSH
+
+            sinal_flush: Optional[threading.Event] = None
+            encerrar = item is None
+            if isinstance(item, tuple) and item and item[0] is _FLUSH:
+                sinal_flush = item[1]
+                item = _FLUSH
+
+            if item is not None and item is not _FLUSH:
+                try:
+                    linha = json.dumps(item, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+                except (TypeError, ValueError) as e:
+                    with self._lock:
+                        self._metricas["registros_perdidos"] += 1
+                        self._metricas["ultimo_erro"] = f"{type(e).__name__}: {e}"
+                    continue
+                if not lote:
+                    inicio_lote = time.monotonic()
+                timestamp = item.get("timestamp_utc") if isinstance(item, dict) else None
+                lote.append((particao_do_timestamp(timestamp, self.host), linha))
+                bytes_lote += len(linha) + 1
+
+            cheio = len(lote) >= self.max_lote or bytes_lote >= self.max_bytes_lote
+            if lote and (cheio or item is _FLUSH or encerrar):
+                self._enviar_particoes(lote)
+                lote = []
+                bytes_lote = 0
+
+            if sinal_flush is not None:
+                sinal_flush.set()
+            if encerrar:
+                return
+
+    def _enviar_particoes(self, lote: List[Tuple[str, bytes]]) -> None:
+        # Registros de horas diferentes no mesmo lote vão para objetos diferentes
+        por_particao: Dict[str, List[bytes]] = {}
+        for particao_hive, linha in lote:
+            por_particao.setdefault(particao_hive, []).append(linha)
+        for particao_hive, linhas in por_particao.items():
+            self._enviar_lote(particao_hive, linhas)
+
+    def _enviar_lote(self, particao_hive: str, linhas: List[bytes]) -> None:
+        corpo = b"\n".join(linhas) + b"\n"
+        extras: Dict[str, Any] = {"ContentType": "application/x-ndjson; charset=utf-8"}
+        if self.comprimir:
+            # Com worker gevent a compressão de um lote grande não pode segurar as conexões
+            corpo = executar_bloqueante(gzip.compress, corpo, 6)
+            extras["ContentEncoding"] = "gzip"
+        chave = montar_chave_log(particao_hive, "ndjson.gz" if self.comprimir else "ndjson")
+
+        for tentativa in range(1, self.max_tentativas + 1):
+            try:
+                if self._cliente is None:
+                    self._cliente = self.client_factory()
+                self._cliente.put_object(Bucket=self.bucket, Key=chave, Body=corpo, **extras)
+            except Exception as e:
+                metrics.S3_FAILURES.inc(etapa="put_object")
+                with self._lock:
+                    self._metricas["ultimo_erro"] = f"{type(e).__name__}: {e}"
+                    if tentativa < self.max_tentativas:
+                        self._metricas["retentativas"] += 1
+                if tentativa >= self.max_tentativas:
+                    break
+                # Backoff exponencial com jitter
+                atraso = min(self.backoff_max, self.backoff_base * (2 ** (tentativa - 1)))
+                time.sleep(random.uniform(atraso / 2, atraso))
+                continue
+            with self._lock:
+                self._metricas["lotes_enviados"] += 1
+                self._metricas["registros_enviados"] += len(linhas)
+                self._metricas["bytes_enviados"] += len(corpo)
+            return
+
+        metrics.S3_FAILURES.inc(etapa="lote_perdido")
+        with self._lock:
+            self._metricas["lotes_perdidos"] += 1
+            self._metricas["registros_perdidos"] += len(linhas)
+
+_shipper: Optional[S3LogShipper] = None
+_shipper_lock = threading.Lock()
+
+
+def obter_shipper() -> S3LogShipper:
+    """Instância única por processo, configurada pelas variáveis de ambiente."""
+    global _shipper
+    if _shipper is None:
+        with _shipper_lock:
+            if _shipper is None:
+                _shipper = S3LogShipper(bucket=S3_LOG_BUCKET)
+                atexit.register(_shipper.shutdown)
+    return _shipper
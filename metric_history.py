@@ -0,0 +1,264 @@
+# metric_history.py
+# Histórico de métricas de hardware em memória: buffers circulares com resoluções bruta, 1 minuto e 1 hora
+
+import os
+import queue
+import threading
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import hardware_sampler
+
+# Pontos guardados por série em cada resolução (memória fixa: 4 doubles por ponto)
+HISTORY_RAW_POINTS = int(os.getenv("HISTORY_RAW_POINTS", "1800"))  # ~1h com amostras a cada 2s
+HISTORY_MINUTE_POINTS = int(os.getenv("HISTORY_MINUTE_POINTS", "1440"))  # 24h
+HISTORY_HOUR_POINTS = int(os.getenv("HISTORY_HOUR_POINTS", "720"))  # 30 dias
+# Limite de séries (discos e sensores variam de máquina para máquina)
+HISTORY_MAX_SERIES = int(os.getenv("HISTORY_MAX_SERIES", "64"))
+# Amostras pendentes por assinante do stream antes de descartar as mais novas
+HISTORY_SUBSCRIBER_QUEUE = int(os.getenv("HISTORY_SUBSCRIBER_QUEUE", "64"))
+
+RESOLUCOES: Tuple[Tuple[str, int], ...] = (("raw", 0), ("1m", 60), ("1h", 3600))
+
+Ponto = Tuple[float, float, float, float]  # (timestamp, média, mínimo, máximo)
+
+
+class RingBuffer:
+    """Buffer circular de pontos (timestamp, média, mínimo, máximo) em arrays de doubles."""
+
+    __slots__ = ("capacidade", "_ts", "_media", "_minimo", "_maximo", "_proximo", "tamanho")
+
+    def __init__(self, capacidade: int) -> None:
+        self.capacidade = capacidade
+        self._ts = array("d", bytes(8 * capacidade))
+        self._media = array("d", bytes(8 * capacidade))
+        self._minimo = array("d", bytes(8 * capacidade))
+        self._maximo = array("d", bytes(8 * capacidade))
+        self._proximo = 0
+        self.tamanho = 0
+
+    def adicionar(self, ts: float, media: float, minimo: float, maximo: float) -> None:
+        i = self._proximo
+        self._ts[i] = ts
+        self._media[i] = media
+        self._minimo[i] = minimo
+        self._maximo[i] = maximo
+        self._proximo = (i + 1) % self.capacidade
+        if self.tamanho < self.capacidade:
+            self.tamanho += 1
+
+    def _posicao(self, ordem: int) -> int:
+        """Índice físico do ponto `ordem` (0 = mais antigo)."""
+        return (self._proximo - self.tamanho + ordem) % self.capacidade
+
+    def mais_antigo(self) -> Optional[float]:
+        return self._ts[self._posicao(0)] if self.tamanho else None
+
+    def intervalo(self, inicio: float, fim: float) -> List[Ponto]:
+        """Pontos com inicio <= ts <= fim, do mais antigo para o mais novo."""
+        # Busca binária sobre a ordem lógica (os timestamps são crescentes)
+        baixo, alto = 0, self.tamanho
+        while baixo < alto:
+            meio = (baixo + alto) // 2
+            if self._ts[self._posicao(meio)] < inicio:
+                baixo = meio + 1
+            else:
+                alto = meio
+        pontos = []
+        for ordem in range(baixo, self.tamanho):
+            i = self._posicao(ordem)
+            if self._ts[i] > fim:
+                break
+            pontos.append((self._ts[i], self._media[i], self._minimo[i], self._maximo[i]))
+        return pontos
+
+
+class _Agregador:
+    """Acumula amostras da janela corrente e fecha um ponto quando a janela muda."""
+
+    __slots__ = ("segundos", "destino", "_janela", "_soma", "_contagem", "_minimo", "_maximo")
+
+    def __init__(self, segundos: int, destino: RingBuffer) -> None:
+        self.segundos = segundos
+        self.destino = destino
+        self._janela: Optional[float] = None
+        self._soma = 0.0
+        self._contagem = 0
+        self._minimo = 0.0
+        self._maximo = 0.0
+
+    def adicionar(self, ts: float, valor: float) -> None:
+        janela = ts - ts % self.segundos
+        if janela != self._janela:
+            self._fechar()
+            self._janela = janela
+            self._soma, self._contagem, self._minimo, self._maximo = 0.0, 0, valor, valor
+        self._soma += valor
+        self._contagem += 1
+        self._minimo = min(self._minimo, valor)
+        self._maximo = max(self._maximo, valor)
+
+    def _fechar(self) -> None:
+        if self._janela is not None and self._contagem:
+            self.destino.adicionar(self._janela, self._soma / self._contagem, self._minimo, self._maximo)
+
+    def parcial(self) -> Optional[Ponto]:
+        """Ponto da janela ainda aberta (entra nas consultas para não esconder o último minuto/hora)."""
+        if self._janela is None or not self._contagem:
+            return None
+        return (self._janela, self._soma / self._contagem, self._minimo, self._maximo)
+
+
+class _Serie:
+    __slots__ = ("buffers", "agregadores")
+
+    def __init__(self, capacidades: Dict[str, int]) -> None:
+        self.buffers = {nome: RingBuffer(capacidades[nome]) for nome, _ in RESOLUCOES}
+        self.agregadores = {
+            nome: _Agregador(segundos, self.buffers[nome]) for nome, segundos in RESOLUCOES if segundos
+        }
+
+    def adicionar(self, ts: float, valor: float) -> None:
+        self.buffers["raw"].adicionar(ts, valor, valor, valor)
+        for agregador in self.agregadores.values():
+            agregador.adicionar(ts, valor)
+
+    def consultar(self, resolucao: str, inicio: float, fim: float) -> List[Ponto]:
+        pontos = self.buffers[resolucao].intervalo(inicio, fim)
+        agregador = self.agregadores.get(resolucao)
+        parcial = agregador.parcial() if agregador else None
+        if parcial is not None and inicio <= parcial[0] <= fim:
+            pontos.append(parcial)
+        return pontos
+
+
+def extrair_series(info: Dict[str, Any]) -> Dict[str, float]:
+    """Valores numéricos de um snapshot de hardware, por nome de série."""
+    valores: Dict[str, float] = {}
+    if info.get("cpu_usage_percent") is not None:
+        valores["cpu"] = float(info["cpu_usage_percent"])
+    if info.get("memory_usage_percent") is not None:
+        valores["memory"] = float(info["memory_usage_percent"])
+    for disk in info.get("disks") or []:
+        valores[f"disk:{disk['mountpoint']}"] = float(disk["percent"])
+    for sensor, temperatura in (info.get("temperatures") or {}).items():
+        if temperatura is not None:
+            valores[f"temp:{sensor}"] = float(temperatura)
+    return valores
+
+
+class MetricHistory:
+    """
+    Histórico por série (cpu, memory, disk:<ponto de montagem>, temp:<sensor>) com
+    memória fixa. Cada amostra entra na resolução bruta e alimenta as janelas de
+    1 minuto e 1 hora (média, mínimo e máximo). Assinantes recebem cada amostra
+    nova por uma fila própria, usada pelo stream SSE.
+    """
+
+    def __init__(
+        self,
+        raw: int = HISTORY_RAW_POINTS,
+        minuto: int = HISTORY_MINUTE_POINTS,
+        hora: int = HISTORY_HOUR_POINTS,
+        max_series: int = HISTORY_MAX_SERIES,
+    ) -> None:
+        self.capacidades = {"raw": raw, "1m": minuto, "1h": hora}
+        self.max_series = max_series
+        self._series: Dict[str, _Serie] = {}
+        self._lock = threading.Lock()
+        self._assinantes: List["queue.Queue[Dict[str, Any]]"] = []
+
+    def registrar(self, info: Dict[str, Any], ts: Optional[float] = None) -> None:
+        """Ouvinte do amostrador: guarda os valores de um snapshot e avisa os assinantes."""
+        ts = time.time() if ts is None else ts
+        valores = extrair_series(info)
+        with self._lock:
+            for nome, valor in valores.items():
+                serie = self._series.get(nome)
+                if serie is None:
+                    if len(self._series) >= self.max_series:
+                        continue
+                    serie = self._series[nome] = _Serie(self.capacidades)
+                serie.adicionar(ts, valor)
+            assinantes = list(self._assinantes)
+
+        evento = {"ts": ts, "valores": valores}
+        for fila in assinantes:
+            try:
+                fila.put_nowait(evento)
+            except queue.Full:
+                # Cliente lento: perde amostras em vez de segurar o amostrador
+                pass
+
+    def series(self) -> List[str]:
+        with self._lock:
+            return sorted(self._series)
+
+    def _resolucao_para(self, inicio: float) -> str:
+        """
+        Resolução mais fina cujo histórico ainda cobre o início pedido: o buffer
+        ainda não deu a volta (tem tudo desde o início do processo) ou o ponto
+        mais antigo é anterior ao início.
+        """
+        for nome, _ in RESOLUCOES[:-1]:
+            buffers = [s.buffers[nome] for s in self._series.values()]
+            if all(b.tamanho < b.capacidade or (b.mais_antigo() or 0) <= inicio for b in buffers):
+                return nome
+        return RESOLUCOES[-1][0]
+
+    def consultar(
+        self,
+        series: Optional[Iterable[str]] = None,
+        inicio: Optional[float] = None,
+        fim: Optional[float] = None,
+        resolucao: str = "auto",
+    ) -> Dict[str, Any]:
+        """Pontos das séries pedidas entre inicio e fim (timestamps Unix)."""
+        fim = time.time() if fim is None else fim
+        inicio = fim - 3600 if inicio is None else inicio
+        with self._lock:
+            if resolucao == "auto":
+                resolucao = self._resolucao_para(inicio)
+            if resolucao not in self.capacidades:
+                raise ValueError(f"resolução inválida: {resolucao}")
+            nomes = sorted(self._series) if series is None else [s for s in series if s in self._series]
+            dados = {
+                nome: [list(p) for p in self._series[nome].consultar(resolucao, inicio, fim)] for nome in nomes
+            }
+        return {"resolucao": resolucao, "inicio": inicio, "fim": fim, "series": dados}
+
+    def assinar(self) -> "queue.Queue[Dict[str, Any]]":
+        fila: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=HISTORY_SUBSCRIBER_QUEUE)
+        with self._lock:
+            self._assinantes.append(fila)
+        return fila
+
+    def cancelar(self, fila: "queue.Queue[Dict[str, Any]]") -> None:
+        with self._lock:
+            if fila in self._assinantes:
+                self._assinantes.remove(fila)
+
+    def assinantes(self) -> int:
+        with self._lock:
+            return len(self._assinantes)
+
+
+_historico: Optional[MetricHistory] = None
+_historico_lock = threading.Lock()
+
+
+def obter_historico() -> MetricHistory:
+    """
+    Histórico do processo, ligado ao amostrador de hardware compartilhado.
+    Garante que o amostrador esteja rodando, já que é ele quem alimenta o histórico.
+    """
+    global _historico
+    if _historico is None:
+        with _historico_lock:
+            if _historico is None:
+                _historico = MetricHistory()
+    sampler = hardware_sampler.sampler
+    sampler.adicionar_ouvinte(_historico.registrar)
+    sampler.start()
+    return _historico
@@ -0,0 +1,357 @@
+# metrics.py
+# Métricas no formato de texto do Prometheus, agregadas entre os workers do gunicorn
+
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from itertools import zip_longest
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Diretório compartilhado pelos workers; vazio usa `<tmp>/hwdiag-metrics-<pid do master do gunicorn>`
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "2"))
+
+BUCKETS_PADRAO: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+Rotulos = Tuple[Tuple[str, str], ...]
+
+_registro: Dict[str, "_Metrica"] = {}
+_gauges: Dict[str, Tuple[str, Callable[[], Dict[Rotulos, float]]]] = {}
+
+
+def pid_master() -> int:
+    """PID do master do gunicorn (exportado por gunicorn.conf.py); fora dele, o do processo pai."""
+    valor = os.getenv("HWDIAG_MASTER_PID", "")
+    return int(valor) if valor.isdigit() else os.getppid()
+
+
+def diretorio_compartilhado(configurado: str, prefixo: str) -> str:
+    """
+    `configurado` ou, se vazio, `<tmp>/<prefixo>-<pid do master>`. Resolvido no uso e não
+    no import: com --preload o import roda no próprio master, cujo pai é outro processo.
+    """
+    return configurado or os.path.join(tempfile.gettempdir(), f"{prefixo}-{pid_master()}")
+
+
+def diretorio_metricas() -> str:
+    return diretorio_compartilhado(METRICS_DIR, "hwdiag-metrics")
+
+
+def _rotulos(labelnames: Sequence[str], valores: Dict[str, Any]) -> Rotulos:
+    return tuple((nome, str(valores.get(nome, ""))) for nome in labelnames)
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, labelnames: Sequence[str] = ()) -> None:
+        self.nome = nome
+        self.ajuda = ajuda
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registro[nome] = self
+
+
+class Counter(_Metrica):
+    """Contador monotônico por combinação de rótulos."""
+
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(nome, ajuda, labelnames)
+        self._valores: Dict[Rotulos, float] = {}
+
+    def inc(self, valor: float = 1.0, **labels: Any) -> None:
+        chave = _rotulos(self.labelnames, labels)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0.0) + valor
+        _garantir_flusher()
+
+    def estado(self) -> List[Tuple[Rotulos, float]]:
+        with self._lock:
+            return list(self._valores.items())
+
+
+class Histogram(_Metrica):
+    """Histograma com buckets fixos (contagens não cumulativas internamente)."""
+
+    tipo = "histogram"
+
+    def __init__(
+        self, nome: str, ajuda: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = BUCKETS_PADRAO
+    ) -> None:
+        super().__init__(nome, ajuda, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # rótulos -> [contagens por bucket (+Inf no fim), soma, total]
+        self._valores: Dict[Rotulos, List[Any]] = {}
+
+    def observe(self, valor: float, **labels: Any) -> None:
+        chave = _rotulos(self.labelnames, labels)
+        posicao = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            atual = self._valores.get(chave)
+            if atual is None:
+                atual = self._valores[chave] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            atual[0][posicao] += 1
+            atual[1] += valor
+            atual[2] += 1
+        _garantir_flusher()
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - inicio, **labels)
+
+    def estado(self) -> List[Tuple[Rotulos, List[Any]]]:
+        with self._lock:
+            return [(k, [list(v[0]), v[1], v[2]]) for k, v in self._valores.items()]
+
+
+def registrar_gauge(nome: str, ajuda: str, funcao: Callable[[], Dict[Rotulos, float]]) -> None:
+    """
+    Gauge calculado no momento da exportação (ex.: tamanho da fila de logs).
+    Cada worker exporta o próprio valor com o rótulo `pid`.
+    """
+    _gauges[nome] = (ajuda, funcao)
+
+
+# ---------------------------------------------------------------------- métricas da aplicação
+DIAGNOSE_SECONDS = Histogram("hwdiag_diagnose_seconds", "Latência de expert_system.diagnose")
+EXTRACT_SECONDS = Histogram("hwdiag_symptom_extract_seconds", "Latência da extração de sintomas da descrição livre")
+SYSINFO_SECONDS = Histogram("hwdiag_get_system_info_seconds", "Latência de get_system_info")
+S3_LOG_SECONDS = Histogram("hwdiag_salvar_log_s3_seconds", "Latência de salvar_log_s3 no caminho da requisição")
+RENDER_SECONDS = Histogram(
+    "hwdiag_render_template_seconds", "Latência de renderização de templates", ("template",)
+)
+DIAGNOSES_TOTAL = Counter("hwdiag_diagnoses_total", "Diagnósticos executados", ("origem",))
+DIAGNOSES_BY_SYMPTOM = Counter(
+    "hwdiag_diagnoses_by_symptom_total", "Diagnósticos por sintoma informado", ("sintoma",)
+)
+DIAGNOSES_BY_RULE = Counter(
+    "hwdiag_diagnoses_by_rule_total", "Diagnósticos por regra que casou", ("diagnostico",)
+)
+S3_FAILURES = Counter("hwdiag_s3_log_failures_total", "Falhas no registro de logs no S3", ("etapa",))
+INGEST_SECONDS = Histogram("hwdiag_telemetry_ingest_seconds", "Latência de diagnóstico de um lote de telemetria")
+TELEMETRY_SAMPLES = Counter("hwdiag_telemetry_samples_total", "Amostras de telemetria recebidas da frota")
+TELEMETRY_BY_RULE = Counter(
+    "hwdiag_telemetry_matches_total", "Amostras de telemetria por regra que casou", ("regra",)
+)
+TELEMETRY_REJECTED = Counter("hwdiag_telemetry_rejected_total", "Lotes de telemetria recusados", ("motivo",))
+ADMISSION_DECISIONS = Counter(
+    "hwdiag_admission_decisions_total", "Decisões do controle de admissão", ("rota", "decisao")
+)
+ADMISSION_REJECTED = Counter(
+    "hwdiag_admission_rejected_total", "Requisições recusadas (503) pelo controle de admissão", ("rota", "motivo")
+)
+ADMISSION_QUEUE_SECONDS = Histogram("hwdiag_admission_queue_seconds", "Espera por uma vaga no controle de admissão")
+SLOW_REQUESTS = Counter("hwdiag_slow_requests_total", "Requisições acima de SLOW_REQUEST_MS (pilha capturada)", ("rota",))
+
+
+def contar_diagnostico(origem: str, sintomas: Iterable[str], diagnosticos: Iterable[Dict[str, str]]) -> None:
+    """Conta um diagnóstico por origem, por sintoma e por regra que casou."""
+    DIAGNOSES_TOTAL.inc(origem=origem)
+    for sintoma in set(sintomas):
+        DIAGNOSES_BY_SYMPTOM.inc(sintoma=sintoma)
+    for diagnostico in diagnosticos:
+        DIAGNOSES_BY_RULE.inc(diagnostico=diagnostico["diagnostico"])
+
+
+# ---------------------------------------------------------------------- persistência por worker
+_flusher: Optional[threading.Thread] = None
+_flusher_pid: Optional[int] = None
+_flusher_lock = threading.Lock()
+
+
+def _garantir_flusher() -> None:
+    if _flusher_pid == os.getpid():
+        return
+    _iniciar_flusher()
+
+
+def _iniciar_flusher() -> None:
+    global _flusher, _flusher_pid
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        # Após fork, o processo filho não herda os valores do pai
+        if _flusher_pid is not None:
+            for metrica in _registro.values():
+                with metrica._lock:
+                    metrica._valores.clear()  # type: ignore[attr-defined]
+        _flusher_pid = os.getpid()
+        _flusher = threading.Thread(target=_loop_flush, name="metrics-flusher", daemon=True)
+        _flusher.start()
+
+
+def _loop_flush() -> None:
+    pid = os.getpid()
+    while _flusher_pid == pid:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            gravar_estado()
+        except OSError:
+            pass
+
+
+def _estado_local() -> Dict[str, Any]:
+    metricas = {}
+    for nome, metrica in _registro.items():
+        metricas[nome] = [[list(map(list, k)), v] for k, v in metrica.estado()]  # type: ignore[attr-defined]
+    gauges = {}
+    for nome, (_, funcao) in _gauges.items():
+        try:
+            gauges[nome] = [[list(map(list, k)), v] for k, v in funcao().items()]
+        except Exception:
+            continue
+    return {"pid": os.getpid(), "metricas": metricas, "gauges": gauges}
+
+
+def gravar_estado(diretorio: Optional[str] = None) -> None:
+    """Grava (de forma atômica) o estado deste worker em `<diretorio>/<pid>.json`."""
+    diretorio = diretorio or diretorio_metricas()
+    os.makedirs(diretorio, exist_ok=True)
+    destino = os.path.join(diretorio, f"{os.getpid()}.json")
+    temporario = destino + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(_estado_local(), arquivo, ensure_ascii=False, separators=(",", ":"))
+    os.replace(temporario, destino)
+
+
+def recolher_worker(pid: int, diretorio: Optional[str] = None) -> None:
+    """
+    Chamado no master quando um worker termina (hook child_exit de gunicorn.conf.py): soma
+    os contadores e histogramas de `<pid>.json` em `encerrados.json` e apaga o arquivo, para
+    que reinícios de workers não acumulem arquivos nem façam os totais voltarem para trás.
+    """
+    diretorio = diretorio or diretorio_metricas()
+    origem = os.path.join(diretorio, f"{pid}.json")
+    try:
+        with open(origem, encoding="utf-8") as arquivo:
+            estado = json.load(arquivo)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError):
+        estado = {}
+    destino = os.path.join(diretorio, "encerrados.json")
+    try:
+        with open(destino, encoding="utf-8") as arquivo:
+            encerrados = json.load(arquivo)
+    except (OSError, ValueError):
+        encerrados = {"pid": None, "metricas": {}, "gauges": {}}
+    for nome, series in estado.get("metricas", {}).items():
+        somados = {tuple(map(tuple, r)): v for r, v in encerrados["metricas"].get(nome, [])}
+        for rotulos, valor in series:
+            chave = tuple(map(tuple, rotulos))
+            anterior = somados.get(chave)
+            if anterior is None:
+                somados[chave] = valor
+            elif isinstance(valor, list):
+                contagens = [a + b for a, b in zip_longest(anterior[0], valor[0], fillvalue=0)]
+                somados[chave] = [contagens, anterior[1] + valor[1], anterior[2] + valor[2]]
+            else:
+                somados[chave] = anterior + valor
+        encerrados["metricas"][nome] = [[list(map(list, k)), v] for k, v in somados.items()]
+    temporario = destino + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(encerrados, arquivo, ensure_ascii=False, separators=(",", ":"))
+    os.replace(temporario, destino)
+    os.remove(origem)
+
+
+def _processo_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _ler_estados(diretorio: str) -> List[Dict[str, Any]]:
+    estados = [_estado_local()]
+    try:
+        arquivos = os.listdir(diretorio)
+    except FileNotFoundError:
+        return estados
+    for nome in arquivos:
+        if not nome.endswith(".json") or nome == f"{os.getpid()}.json":
+            continue
+        try:
+            with open(os.path.join(diretorio, nome), encoding="utf-8") as arquivo:
+                estados.append(json.load(arquivo))
+        except (OSError, ValueError):
+            continue
+    return estados
+
+
+def _escapar(valor: Any) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatar_rotulos(rotulos: Sequence[Sequence[str]], extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pares = list(rotulos) + list(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+def exportar(diretorio: Optional[str] = None) -> str:
+    """
+    Texto no formato de exposição do Prometheus somando os arquivos de todos os workers.
+    Contadores e histogramas de workers encerrados continuam somados (são monotônicos);
+    gauges só aparecem para workers vivos.
+    """
+    estados = _ler_estados(diretorio or diretorio_metricas())
+
+    linhas: List[str] = []
+    for nome, metrica in sorted(_registro.items()):
+        linhas.append(f"# HELP {nome} {metrica.ajuda}")
+        linhas.append(f"# TYPE {nome} {metrica.tipo}")
+        if isinstance(metrica, Histogram):
+            somados: Dict[Tuple, List[Any]] = {}
+            for estado in estados:
+                for rotulos, (contagens, soma, total) in estado["metricas"].get(nome, []):
+                    chave = tuple(map(tuple, rotulos))
+                    atual = somados.setdefault(chave, [[0] * (len(metrica.buckets) + 1), 0.0, 0])
+                    for i, c in enumerate(contagens[: len(atual[0])]):
+                        atual[0][i] += c
+                    atual[1] += soma
+                    atual[2] += total
+            for chave, (contagens, soma, total) in sorted(somados.items()):
+                acumulado = 0
+                for limite, contagem in zip(metrica.buckets, contagens):
+                    acumulado += contagem
+                    linhas.append(f"{nome}_bucket{_formatar_rotulos(chave, [('le', repr(limite))])} {acumulado}")
+                linhas.append(f"{nome}_bucket{_formatar_rotulos(chave, [('le', '+Inf')])} {total}")
+                linhas.append(f"{nome}_sum{_formatar_rotulos(chave)} {soma}")
+                linhas.append(f"{nome}_count{_formatar_rotulos(chave)} {total}")
+        else:
+            somas: Dict[Tuple, float] = {}
+            for estado in estados:
+                for rotulos, valor in estado["metricas"].get(nome, []):
+                    chave = tuple(map(tuple, rotulos))
+                    somas[chave] = somas.get(chave, 0.0) + valor
+            for chave, valor in sorted(somas.items()):
+                linhas.append(f"{nome}{_formatar_rotulos(chave)} {valor}")
+
+    for nome, (ajuda, _) in sorted(_gauges.items()):
+        linhas.append(f"# HELP {nome} {ajuda}")
+        linhas.append(f"# TYPE {nome} gauge")
+        for estado in estados:
+            pid = estado.get("pid")
+            if pid is None or (pid != os.getpid() and not _processo_vivo(int(pid))):
+                continue
+            for rotulos, valor in estado["gauges"].get(nome, []):
+                linhas.append(f"{nome}{_formatar_rotulos(rotulos, [('pid', str(pid))])} {valor}")
+
+    return "\n".join(linhas) + "\n"
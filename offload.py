@@ -0,0 +1,50 @@
+# offload.py
+# Execução de chamadas bloqueantes (psutil, compressão) fora do loop de eventos quando o worker é gevent
+
+import os
+import sys
+import threading
+from typing import Any, Callable, Optional, TypeVar
+
+# Threads reais reservadas para chamadas bloqueantes por worker
+OFFLOAD_THREADS = int(os.getenv("OFFLOAD_THREADS", "4"))
+
+T = TypeVar("T")
+
+_pool_lock = threading.Lock()
+_pool: Any = None
+
+
+def cooperativo() -> bool:
+    """True quando o processo roda com o monkey patching do gevent (worker `gevent` do gunicorn)."""
+    # Sem gevent já importado não há patch: evita carregar o pacote nos workers sync/gthread
+    monkey = sys.modules.get("gevent.monkey")
+    return monkey is not None and monkey.is_module_patched("threading")
+
+
+def _obter_pool() -> Any:
+    """Pool de threads nativas do hub do gevent, limitado a OFFLOAD_THREADS."""
+    global _pool
+    import gevent
+
+    hub = gevent.get_hub()
+    if _pool is not hub.threadpool:
+        with _pool_lock:
+            if _pool is not hub.threadpool:
+                hub.threadpool.maxsize = OFFLOAD_THREADS
+                _pool = hub.threadpool
+    return _pool
+
+
+def executar_bloqueante(funcao: Callable[..., T], *args: Any, timeout: Optional[float] = None) -> T:
+    """
+    Roda `funcao(*args)` sem travar as demais conexões do worker.
+    Com gevent, psutil e zlib são chamadas em C que seguram o hub inteiro; elas vão
+    para uma thread nativa do pool (no máximo OFFLOAD_THREADS ao mesmo tempo, o
+    excedente espera na fila) e só o greenlet que chamou aguarda o resultado.
+    Nos workers sync/gthread cada requisição já tem a sua thread, e a chamada é direta.
+    """
+    if not cooperativo():
+        return funcao(*args)
+    resultado = _obter_pool().spawn(funcao, *args)
+    return resultado.get(timeout=timeout)
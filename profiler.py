@@ -0,0 +1,443 @@
+# profiler.py
+# Profiler por amostragem sob demanda nos workers em produção e captura de requisições lentas
+#
+# Uso:
+#   python profiler.py --servidor http://127.0.0.1:5000 --segundos 15 --saida perfil.folded
+#   python profiler.py --servidor http://127.0.0.1:5000 --workers 3          # um perfil por worker
+#   python profiler.py --servidor http://127.0.0.1:5000 --lentas             # requisições lentas capturadas
+# O arquivo .folded abre direto no speedscope.app ou no flamegraph.pl.
+
+import _thread
+import argparse
+import collections
+import datetime
+import hmac
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from flask import Blueprint, Flask, Response, g, jsonify, request
+
+from offload import cooperativo
+import metrics
+
+# Sem token os endpoints /admin respondem 404
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "10"))
+# Faixa aceita para o intervalo entre amostras de um perfil sob demanda
+_INTERVALO_MINIMO_MS = 1.0
+_INTERVALO_MAXIMO_MS = 1000.0
+# Requisições mais lentas que isso têm a pilha capturada (0 desativa)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+SLOW_REQUEST_KEEP = int(os.getenv("SLOW_REQUEST_KEEP", "20"))  # por rota
+
+_PROFUNDIDADE_MAXIMA = 128
+# Pilhas distintas guardadas por requisição lenta
+_MAX_PILHAS_REQUISICAO = 200
+# Endpoints de longa duração por natureza, fora da captura e do perfil
+_SEM_CAPTURA = frozenset({"api_metricas.stream"})
+
+Pilha = Tuple[str, Tuple[Any, ...]]  # (raiz, code objects da base para o topo)
+
+
+def _primitivas_nativas() -> Tuple[Callable[..., Any], Callable[[float], None], Callable[[], int]]:
+    """
+    start_new_thread, sleep e get_ident reais. Com gevent, uma thread "normal" viraria
+    greenlet e só amostraria quando o código amostrado cedesse o loop, justamente o que
+    não acontece num trecho preso na CPU.
+    """
+    if cooperativo():
+        from gevent import monkey
+
+        return (
+            monkey.get_original("_thread", "start_new_thread"),
+            monkey.get_original("time", "sleep"),
+            monkey.get_original("_thread", "get_ident"),
+        )
+    return _thread.start_new_thread, time.sleep, _thread.get_ident
+
+
+def _greenlet_atual() -> Any:
+    if not cooperativo():
+        return None
+    import greenlet
+
+    return greenlet.getcurrent()
+
+
+def _codigos(frame: Any) -> Tuple[Any, ...]:
+    codigos = []
+    while frame is not None and len(codigos) < _PROFUNDIDADE_MAXIMA:
+        codigos.append(frame.f_code)
+        frame = frame.f_back
+    codigos.reverse()
+    return tuple(codigos)
+
+
+def _rotulo(codigo: Any) -> str:
+    return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})"
+
+
+def colapsar(contagens: Dict[Pilha, int]) -> List[str]:
+    """Linhas no formato "raiz;f1;f2 N" (collapsed stacks do flamegraph.pl), da mais frequente para a menos."""
+    rotulos: Dict[Any, str] = {}
+    linhas: Dict[str, int] = {}
+    for (raiz, codigos), total in contagens.items():
+        partes = [raiz.replace(";", ":")]
+        for codigo in codigos:
+            rotulo = rotulos.get(codigo)
+            if rotulo is None:
+                rotulo = rotulos[codigo] = _rotulo(codigo).replace(";", ":")
+            partes.append(rotulo)
+        linha = ";".join(partes)
+        linhas[linha] = linhas.get(linha, 0) + total
+    return [f"{linha} {total}" for linha, total in sorted(linhas.items(), key=lambda item: (-item[1], item[0]))]
+
+
+class _Requisicao:
+    __slots__ = ("rota", "metodo", "inicio", "inicio_unix", "thread", "greenlet", "amostras")
+
+    def __init__(self, rota: str, metodo: str, thread: int, greenlet: Any) -> None:
+        self.rota = rota
+        self.metodo = metodo
+        self.inicio = time.monotonic()
+        self.inicio_unix = time.time()
+        self.thread = thread
+        self.greenlet = greenlet
+        self.amostras: Dict[Pilha, int] = {}
+
+
+class Profiler:
+    """
+    Amostrador de pilhas por processo (cada worker do gunicorn tem o seu).
+    - As requisições em andamento ficam num dicionário (inclusão e remoção a cada
+      requisição, sem outro custo no caminho normal).
+    - perfilar(): uma thread nativa lê a pilha de cada requisição em andamento a cada
+      intervalo, por N segundos, e conta as pilhas. É um perfil de tempo de parede,
+      então espera por I/O (S3, psutil) aparece tanto quanto CPU.
+    - Requisições lentas: a mesma thread verifica as requisições em andamento a cada
+      SLOW_REQUEST_MS/20; as que passam da metade do limiar têm a pilha amostrada e,
+      se terminarem acima do limiar, ficam guardadas (últimas SLOW_REQUEST_KEEP por rota).
+    """
+
+    def __init__(self, limiar_lenta_ms: float = SLOW_REQUEST_MS, guardar: int = SLOW_REQUEST_KEEP) -> None:
+        self.limiar_lenta = limiar_lenta_ms / 1000
+        self.guardar = guardar
+        self._em_andamento: Dict[int, _Requisicao] = {}
+        self._lentas: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._iniciar_thread, self._dormir, self._ident_nativo = _primitivas_nativas()
+        self._pid: Optional[int] = None
+        # Perfil sob demanda em curso: (fim monotônico, intervalo, todas as threads, contagens)
+        self._perfil: Optional[Tuple[float, float, bool, Dict[Pilha, int]]] = None
+        self._perfil_amostras = 0
+
+    # ------------------------------------------------------------------ requisições
+    def inicio_requisicao(self, rota: str, metodo: str) -> _Requisicao:
+        self._garantir_thread()
+        greenlet = _greenlet_atual()
+        registro = _Requisicao(rota, metodo, self._ident_nativo(), greenlet)
+        self._em_andamento[id(greenlet) if greenlet is not None else registro.thread] = registro
+        return registro
+
+    def fim_requisicao(self, registro: _Requisicao, status: Optional[int]) -> None:
+        chave = id(registro.greenlet) if registro.greenlet is not None else registro.thread
+        if self._em_andamento.get(chave) is registro:
+            del self._em_andamento[chave]
+        duracao = time.monotonic() - registro.inicio
+        if not self.limiar_lenta or duracao < self.limiar_lenta:
+            return
+        metrics.SLOW_REQUESTS.inc(rota=registro.rota)
+        captura = {
+            "rota": registro.rota,
+            "metodo": registro.metodo,
+            "status": status,
+            "inicio_utc": datetime.datetime.utcfromtimestamp(registro.inicio_unix).isoformat() + "Z",
+            "duracao_ms": round(duracao * 1000, 1),
+            "pilhas": colapsar(dict(registro.amostras)),
+        }
+        with self._lock:
+            fila = self._lentas.setdefault(registro.rota, collections.deque(maxlen=self.guardar))
+            fila.append(captura)
+
+    def lentas(self, rota: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Requisições lentas capturadas neste worker, da mais recente para a mais antiga."""
+        with self._lock:
+            capturas = [c for r, fila in self._lentas.items() if rota is None or r == rota for c in fila]
+        return sorted(capturas, key=lambda c: c["inicio_utc"], reverse=True)
+
+    # ------------------------------------------------------------------ perfil sob demanda
+    def perfilar(self, segundos: float, intervalo: float = PROFILER_INTERVAL_MS / 1000,
+                 todas: bool = False) -> Tuple[List[str], int]:
+        """
+        Amostra por `segundos` e devolve (linhas colapsadas, número de amostras).
+        Com `todas`, inclui as threads de fundo (raiz = nome da thread) além das requisições.
+        Levanta RuntimeError se já houver um perfil em curso neste worker e ValueError se
+        o intervalo não for finito ou estiver fora da faixa aceita.
+        """
+        if not _INTERVALO_MINIMO_MS <= intervalo * 1000 <= _INTERVALO_MAXIMO_MS:
+            raise ValueError(
+                f"intervalo_ms deve estar entre {_INTERVALO_MINIMO_MS:g} e {_INTERVALO_MAXIMO_MS:g}"
+            )
+        with self._lock:
+            if self._perfil is not None:
+                raise RuntimeError("já existe um perfil em andamento neste worker")
+            contagens: Dict[Pilha, int] = {}
+            self._perfil_amostras = 0
+            self._perfil = (time.monotonic() + segundos, intervalo, todas, contagens)
+        self._garantir_thread()
+        try:
+            # Com gevent, time.sleep aqui cede o loop; a amostragem roda na thread nativa
+            while self._perfil is not None and time.monotonic() < self._perfil[0] + 0.05:
+                time.sleep(min(0.05, segundos))
+        finally:
+            with self._lock:
+                self._perfil = None
+        # Cópia: a thread de amostragem pode estar concluindo a última leitura
+        return colapsar(dict(contagens)), self._perfil_amostras
+
+    # ------------------------------------------------------------------ thread de amostragem
+    def _garantir_thread(self) -> None:
+        # Caminho rápido só compara o pid, como no log_shipper
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # Após um fork as requisições do processo pai não existem aqui
+            self._em_andamento = {}
+            self._iniciar_thread(self._executar, ())
+
+    def _executar(self) -> None:
+        proprio = self._ident_nativo()
+        nomes: Dict[int, str] = {}
+        while True:
+            try:
+                perfil = self._perfil
+                verificar_lentas = bool(self.limiar_lenta) and bool(self._em_andamento)
+                if perfil is None and not verificar_lentas:
+                    self._dormir(max(self.limiar_lenta / 20, 0.01) if self.limiar_lenta else 0.1)
+                    continue
+
+                frames = sys._current_frames()
+                agora = time.monotonic()
+                requisicoes = list(self._em_andamento.values())
+                threads_de_requisicao = set()
+                for registro in requisicoes:
+                    threads_de_requisicao.add(registro.thread)
+                    frame = registro.greenlet.gr_frame if registro.greenlet is not None else None
+                    if frame is None:
+                        # Thread da requisição, ou greenlet rodando neste instante na thread principal
+                        if registro.greenlet is not None and not registro.greenlet:
+                            continue
+                        frame = frames.get(registro.thread)
+                    if frame is None:
+                        continue
+                    pilha = (f"{registro.metodo} {registro.rota}", _codigos(frame))
+                    if perfil is not None:
+                        perfil[3][pilha] = perfil[3].get(pilha, 0) + 1
+                    if verificar_lentas and agora - registro.inicio >= self.limiar_lenta / 2:
+                        amostras = registro.amostras
+                        if pilha in amostras or len(amostras) < _MAX_PILHAS_REQUISICAO:
+                            amostras[pilha] = amostras.get(pilha, 0) + 1
+
+                if perfil is not None:
+                    if perfil[2]:
+                        if len(nomes) != threading.active_count():
+                            nomes = {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+                        for ident, frame in frames.items():
+                            if ident != proprio and ident not in threads_de_requisicao:
+                                pilha = (nomes.get(ident, f"thread-{ident}"), _codigos(frame))
+                                perfil[3][pilha] = perfil[3].get(pilha, 0) + 1
+                    self._perfil_amostras += 1
+                    intervalo = perfil[1]
+                else:
+                    intervalo = max(self.limiar_lenta / 20, 0.01)
+                del frames
+                self._dormir(intervalo)
+            except Exception:
+                # Uma amostra com erro não pode encerrar a thread: perfis e capturas de lentas parariam em silêncio
+                self._dormir(0.1)
+
+
+_profiler: Optional[Profiler] = None
+_profiler_lock = threading.Lock()
+
+
+def obter_profiler() -> Profiler:
+    """Instância única por processo."""
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = Profiler()
+    return _profiler
+
+
+# ---------------------------------------------------------------------- Flask
+admin = Blueprint("admin", __name__, url_prefix="/admin")
+
+
+def _negado() -> Optional[Tuple[Response, int]]:
+    if not PROFILER_TOKEN:
+        return jsonify({"erro": "não encontrado"}), 404
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {PROFILER_TOKEN}"):
+        return jsonify({"erro": "token inválido"}), 401
+    return None
+
+
+@admin.route("/profile", methods=["GET"])
+def perfil() -> Any:
+    """
+    Perfil de tempo de parede do worker que atendeu a chamada, em collapsed stacks.
+    GET /admin/profile?segundos=10[&intervalo_ms=10][&todas=1]
+    Authorization: Bearer <PROFILER_TOKEN>
+    """
+    negado = _negado()
+    if negado is not None:
+        return negado
+    try:
+        segundos = float(request.args.get("segundos", "10"))
+        intervalo_ms = float(request.args.get("intervalo_ms", PROFILER_INTERVAL_MS))
+    except ValueError:
+        return jsonify({"erro": "segundos e intervalo_ms devem ser numéricos"}), 400
+    if not 0 < segundos <= PROFILER_MAX_SECONDS:
+        return jsonify({"erro": f"segundos deve estar entre 0 e {PROFILER_MAX_SECONDS:g}"}), 400
+    if not _INTERVALO_MINIMO_MS <= intervalo_ms <= _INTERVALO_MAXIMO_MS:
+        return jsonify(
+            {"erro": f"intervalo_ms deve estar entre {_INTERVALO_MINIMO_MS:g} e {_INTERVALO_MAXIMO_MS:g}"}
+        ), 400
+    todas = request.args.get("todas", "").lower() in ("1", "true", "sim", "yes", "on")
+
+    try:
+        linhas, amostras = obter_profiler().perfilar(segundos, intervalo_ms / 1000, todas)
+    except RuntimeError as e:
+        return jsonify({"erro": str(e)}), 409
+    resposta = Response("\n".join(linhas) + ("\n" if linhas else ""), mimetype="text/plain")
+    resposta.headers["X-Profiler-Pid"] = str(os.getpid())
+    resposta.headers["X-Profiler-Samples"] = str(amostras)
+    resposta.headers["Cache-Control"] = "no-store"
+    return resposta
+
+
+@admin.route("/slow-requests", methods=["GET"])
+def requisicoes_lentas() -> Any:
+    """
+    Requisições acima de SLOW_REQUEST_MS capturadas pelo worker que atendeu a chamada.
+    GET /admin/slow-requests[?rota=/diagnosticar]
+    """
+    negado = _negado()
+    if negado is not None:
+        return negado
+    resposta = jsonify(
+        {
+            "pid": os.getpid(),
+            "limiar_ms": SLOW_REQUEST_MS,
+            "requisicoes": obter_profiler().lentas(request.args.get("rota")),
+        }
+    )
+    resposta.headers["Cache-Control"] = "no-store"
+    return resposta
+
+
+def _antes_da_requisicao() -> None:
+    if request.blueprint == admin.name or request.endpoint in _SEM_CAPTURA:
+        return
+    rota = request.url_rule.rule if request.url_rule is not None else request.path
+    g.profiler_requisicao = obter_profiler().inicio_requisicao(rota, request.method)
+
+
+def _depois_da_requisicao(resposta: Response) -> Response:
+    g.profiler_status = resposta.status_code
+    return resposta
+
+
+def _fim_da_requisicao(_erro: Optional[BaseException]) -> None:
+    registro = g.pop("profiler_requisicao", None)
+    if registro is not None:
+        obter_profiler().fim_requisicao(registro, g.get("profiler_status", 500))
+
+
+def configurar(app: Flask) -> None:
+    """Registra /admin e os ganchos que acompanham as requisições em andamento."""
+    app.register_blueprint(admin)
+    app.before_request(_antes_da_requisicao)
+    app.after_request(_depois_da_requisicao)
+    app.teardown_request(_fim_da_requisicao)
+
+
+# ---------------------------------------------------------------------- CLI
+def _buscar(url: str, token: str, timeout: float) -> Tuple[int, Dict[str, str], bytes]:
+    pedido = urllib.request.Request(url, headers={"Authorization": f"Bearer {token}"})
+    try:
+        with urllib.request.urlopen(pedido, timeout=timeout) as resposta:
+            return resposta.status, dict(resposta.headers), resposta.read()
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), e.read()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Perfil por amostragem de um worker em produção")
+    parser.add_argument("--servidor", required=True, help="URL base, p.ex. http://127.0.0.1:5000")
+    parser.add_argument("--token", default=PROFILER_TOKEN, help="PROFILER_TOKEN do servidor")
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--intervalo-ms", type=float, default=PROFILER_INTERVAL_MS)
+    parser.add_argument("--todas", action="store_true", help="inclui as threads de fundo")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="pedidos simultâneos; cada worker atende no máximo um (os demais recebem 409)")
+    parser.add_argument("--lentas", action="store_true", help="mostra as requisições lentas capturadas")
+    parser.add_argument("--saida", help="arquivo .folded (padrão: saída padrão)")
+    args = parser.parse_args()
+    if not args.token:
+        parser.error("informe --token ou PROFILER_TOKEN")
+    base = args.servidor.rstrip("/")
+
+    if args.lentas:
+        status, _, corpo = _buscar(f"{base}/admin/slow-requests", args.token, 30)
+        print(corpo.decode("utf-8"))
+        return 0 if status == 200 else 1
+
+    url = f"{base}/admin/profile?segundos={args.segundos:g}&intervalo_ms={args.intervalo_ms:g}"
+    if args.todas:
+        url += "&todas=1"
+    respostas: List[Tuple[int, Dict[str, str], bytes]] = []
+
+    def pedir() -> None:
+        respostas.append(_buscar(url, args.token, args.segundos + 30))
+
+    threads = [threading.Thread(target=pedir) for _ in range(max(args.workers, 1))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    linhas: List[str] = []
+    for status, cabecalhos, corpo in respostas:
+        if status != 200:
+            print(f"HTTP {status}: {corpo.decode('utf-8', 'replace').strip()}", file=sys.stderr)
+            continue
+        pid = cabecalhos.get("X-Profiler-Pid", "?")
+        print(f"worker {pid}: {cabecalhos.get('X-Profiler-Samples', '?')} amostras", file=sys.stderr)
+        for linha in corpo.decode("utf-8").splitlines():
+            # Com mais de um worker, o pid vira a raiz do flamegraph
+            linhas.append(f"worker {pid};{linha}" if args.workers > 1 else linha)
+    if not linhas and not any(status == 200 for status, _, _ in respostas):
+        return 1
+
+    texto = "\n".join(linhas) + "\n"
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto)
+    else:
+        sys.stdout.write(texto)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,381 @@
+# streamlit_app.py
+# Interface Streamlit: streamlit run streamlit_app.py
+# (separada de app.py para os workers Flask do gunicorn não carregarem o Streamlit)
+
+import datetime
+import html
+import os
+
+import streamlit as st
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente do .env em ambiente local
+# (antes dos módulos locais, que leem a configuração ao serem importados)
+load_dotenv()
+
+from diagnosis_service import get_system_info, montar_log_payload, registrar_historico, salvar_log_s3  # noqa: E402
+from expert_system import obter_sistema  # noqa: E402
+import metrics  # noqa: E402
+
+expert_system = obter_sistema()
+
+STREAMLIT_HW_TTL = float(os.getenv("STREAMLIT_HW_TTL", "5"))  # validade do hardware em cache no Streamlit
+STREAMLIT_REFRESH_SECONDS = float(os.getenv("STREAMLIT_REFRESH_SECONDS", "10"))  # atualização dos cards
+
+CUSTOM_CSS = """
+<style>
+:root {
+    --surface-color: rgba(15, 23, 42, 0.72);
+    --surface-border: rgba(148, 163, 184, 0.18);
+    --accent-color: #38bdf8;
+    --accent-gradient: linear-gradient(135deg, #2563eb 0%, #38bdf8 100%);
+}
+[data-testid="stAppViewContainer"] {
+    background: radial-gradient(circle at top left, rgba(56, 189, 248, 0.15), transparent 55%), #0f172a;
+    color: #e2e8f0;
+}
+.hero-card {
+    border-radius: 18px;
+    padding: 24px 28px;
+    margin-bottom: 24px;
+    background: rgba(30, 41, 59, 0.72);
+    border: 1px solid var(--surface-border);
+    display: flex;
+    gap: 18px;
+    align-items: center;
+}
+.metric-card, .resource-card, .diagnostic-card {
+    background: var(--surface-color);
+    border-radius: 16px;
+    padding: 18px 20px;
+    border: 1px solid var(--surface-border);
+    box-shadow: 0 24px 40px -32px rgba(15, 23, 42, 0.9);
+}
+.metric-card__icon {
+    font-size: 26px;
+    margin-bottom: 4px;
+}
+.metric-card__title {
+    font-size: 0.85rem;
+    color: #94a3b8;
+    text-transform: uppercase;
+    letter-spacing: 0.04em;
+}
+.metric-card__value {
+    font-size: 1.8rem;
+    font-weight: 600;
+    margin: 8px 0 4px;
+}
+.metric-card__subtitle {
+    font-size: 0.85rem;
+    color: #cbd5f5;
+}
+.section-caption {
+    color: #94a3b8;
+    margin-bottom: 12px;
+}
+.resource-card__header {
+    font-weight: 600;
+    color: #bae6fd;
+    margin-bottom: 6px;
+}
+.resource-card__value {
+    font-size: 1.1rem;
+    font-weight: 600;
+    margin-bottom: 10px;
+}
+.resource-card__bar {
+    width: 100%;
+    height: 8px;
+    background: rgba(148, 163, 184, 0.25);
+    border-radius: 999px;
+    overflow: hidden;
+}
+.resource-card__bar span {
+    display: block;
+    height: 100%;
+    background: var(--accent-gradient);
+}
+.diagnostic-card {
+    margin-bottom: 12px;
+    font-size: 0.95rem;
+    line-height: 1.5;
+    border-left: 3px solid #38bdf8;
+    padding-left: 12px;
+}
+.diagnostic-card strong {
+    color: #f8fafc;
+}
+</style>
+"""
+
+
+def _fragmento(run_every: float):
+    """
+    `st.fragment` (ou `st.experimental_fragment` em versões anteriores) com
+    atualização periódica; sem suporte a fragmentos, o bloco é desenhado a cada rerun.
+    """
+    fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    if fragment is None:
+        return lambda funcao: funcao
+    return fragment(run_every=run_every)
+
+
+# Uma coleta a cada STREAMLIT_HW_TTL segundos, para todas as sessões do processo
+@st.cache_data(ttl=STREAMLIT_HW_TTL, show_spinner=False)
+def _hardware_compartilhado() -> dict:
+    """Snapshot de hardware compartilhado por todas as sessões do Streamlit."""
+    return get_system_info()
+
+
+def _uso_disco_raiz(system_info: dict) -> float:
+    raiz = os.path.abspath(os.sep)
+    for disk in system_info["disks"]:
+        if disk["mountpoint"] == raiz:
+            return disk["percent"]
+    import psutil
+
+    return psutil.disk_usage(raiz).percent
+
+
+def render_metric_card(title: str, value: str, subtitle: str, icon: str) -> None:
+    st.markdown(
+        f"""
+        <div class="metric-card">
+            <div class="metric-card__icon">{icon}</div>
+            <div class="metric-card__title">{title}</div>
+            <div class="metric-card__value">{value}</div>
+            <div class="metric-card__subtitle">{subtitle}</div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+
+def render_resource_card(title: str, percent: float, icon: str) -> None:
+    safe_percent = max(0, min(100, round(percent)))
+    st.markdown(
+        f"""
+        <div class="resource-card">
+            <div class="resource-card__header">{icon} {title}</div>
+            <div class="resource-card__value">{safe_percent}% em uso</div>
+            <div class="resource-card__bar">
+                <span style="width:{safe_percent}%"></span>
+            </div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+
+def painel_metricas() -> None:
+    """Cards de CPU, memória e tempo de atividade (fragmento atualizado sozinho)."""
+    system_info = _hardware_compartilhado()
+    cpu_usage = system_info["cpu_usage_percent"]
+    memory_usage = system_info["memory_usage_percent"]
+    uptime_delta = datetime.datetime.now() - datetime.datetime.strptime(system_info["boot_time"], "%Y-%m-%d %H:%M:%S")
+    uptime_days = uptime_delta.days
+    uptime_hours = uptime_delta.seconds // 3600
+    uptime_minutes = (uptime_delta.seconds % 3600) // 60
+    uptime_label = f"{uptime_days}d {uptime_hours}h" if uptime_days else f"{uptime_hours}h {uptime_minutes}m"
+
+    metric_cols = st.columns(3)
+    with metric_cols[0]:
+        render_metric_card("Uso de CPU", f"{cpu_usage:.0f}%", "Carga instantânea", "🧠")
+    with metric_cols[1]:
+        render_metric_card(
+            "Memória disponível",
+            f"{system_info['available_memory'] / (1024 ** 3):.1f} GB",
+            f"Uso atual {memory_usage:.0f}%",
+            "🧬",
+        )
+    with metric_cols[2]:
+        render_metric_card(
+            "Tempo de atividade",
+            uptime_label,
+            f"Iniciado em {system_info['boot_time']}",
+            "⏱️",
+        )
+
+
+def painel_hardware() -> None:
+    """Resumo do hardware do servidor (fragmento atualizado sozinho)."""
+    system_info = _hardware_compartilhado()
+
+    with st.expander("📊 Visualizar Resumo do Hardware do Servidor", expanded=False):
+        st.subheader("Detalhes do Servidor")
+        col1, col2, col3, col4 = st.columns(4)
+        
+        # Corrigido chaves do dicionário para bater com get_system_info()
+        with col1:
+            st.metric("Sistema", f"{system_info['platform']} {system_info['platform_release']}")
+        with col2:
+            st.metric("Processador", system_info['processor'])
+        with col3:
+            st.metric("Arquitetura", system_info['architecture'])
+        with col4:
+            st.metric("Python", system_info['python_version'])
+
+        st.markdown("#### Uso de Recursos")
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            render_resource_card("CPU", system_info["cpu_usage_percent"], "🧠")
+        with c2:
+            render_resource_card("Memória", system_info["memory_usage_percent"], "🧬")
+        with c3:
+            render_resource_card("Disco", _uso_disco_raiz(system_info), "💾")
+
+        st.markdown("---")
+        st.markdown("#### Informações Detalhadas")
+        st.write(f"**Hostname:** {system_info['hostname']}")
+        st.write(f"**Núcleos da CPU:** {system_info['cpu_count']}")
+        st.write(f"**Frequência da CPU:** {system_info['cpu_freq_current']} MHz")
+        st.write(f"**Memória Total:** {system_info['total_memory'] / (1024 ** 3):.2f} GB")
+        st.write(f"**Memória Disponível:** {system_info['available_memory'] / (1024 ** 3):.2f} GB")
+        st.write(f"**Disco:**")
+        for disk in system_info["disks"]:
+            st.write(f"  - {disk['device']} ({disk['fstype']}): {disk['total'] / (1024 ** 3):.2f} GB")
+        st.caption(f"Amostra de {system_info.get('sampled_at', '-')}")
+
+
+def main():
+    # Configuração da página deve ser a primeira chamada Streamlit
+    st.set_page_config(
+        page_title="Diagnóstico de Hardware Cloud",
+        page_icon="🖥️",
+        layout="wide"
+    )
+
+    expert_system.iniciar_recarga_automatica()
+    regras = expert_system.snapshot()
+
+    st.title("🖥️ Diagnóstico de Hardware e Rede")
+    st.markdown("---")
+    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+
+    st.markdown(
+        """
+        <div class="hero-card">
+            <div style="font-size:44px">⚡</div>
+            <div>
+                <h3 style="margin:0; color:#f8fafc">Visão rápida do servidor</h3>
+                <p style="margin:6px 0 0; color:#cbd5f5">
+                    Monitore o estado da máquina e aplique o diagnóstico inteligente de hardware sem sair daqui.
+                </p>
+            </div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+    # Os cards se atualizam sozinhos, sem rerun do script inteiro
+    _fragmento(STREAMLIT_REFRESH_SECONDS)(painel_metricas)()
+
+    st.markdown("### Diagnóstico de Sintomas")
+    st.markdown(
+        "<p class='section-caption'>Informe os sinais observados para receber recomendações personalizadas.</p>",
+        unsafe_allow_html=True,
+    )
+    sintomas_selecionados = st.multiselect(
+        "Selecione os sintomas que você está enfrentando:",
+        options=[s["value"] for s in regras.sintomas],
+        format_func=lambda value: regras.symptom_labels.get(value, value),
+    )
+
+    # Sessão de inferência da aba: cada mudança no multiselect aplica só a diferença
+    sessao = st.session_state.get("sessao_inferencia")
+    if sessao is None or sessao.snapshot is not regras:
+        sessao = st.session_state["sessao_inferencia"] = expert_system.sessao()
+    sessao.atualizar(sintomas_selecionados)
+
+    # Sintomas que completariam regras quase satisfeitas (fatos intermediários viram os sintomas que os produzem)
+    sugestoes = []
+    for sugestao in sessao.sugestoes():
+        if not sugestao["diagnostico"]:
+            continue
+        faltando = sugestao.get("via") or [sugestao["faltando"]]
+        rotulos = " ou ".join(regras.symptom_labels.get(c, c) for c in faltando)
+        sugestoes.append(f"{rotulos} → {sugestao['diagnostico']}")
+    if sintomas_selecionados and sugestoes:
+        st.caption("Também observou? " + " · ".join(sugestoes))
+
+    descricao_extra = st.text_area("Descrição adicional do problema:")
+
+    if st.button("Diagnosticar"):
+        # Sintomas citados na descrição livre entram junto com os selecionados
+        with metrics.EXTRACT_SECONDS.time():
+            extraidos = [s for s in regras.extrair_sintomas(descricao_extra) if s not in sintomas_selecionados]
+        sintomas_selecionados = sintomas_selecionados + extraidos
+
+        if not sintomas_selecionados:
+            st.warning("Por favor, selecione pelo menos um sintoma ou descreva o problema.")
+        else:
+            with st.spinner("Realizando diagnóstico..."):
+                if extraidos:
+                    # Só para este diagnóstico: o próximo rerun volta a sessão ao multiselect
+                    sessao.atualizar(sintomas_selecionados)
+                # Usa o sistema especialista para obter diagnósticos
+                with metrics.DIAGNOSE_SECONDS.time():
+                    diagnósticos = sessao.diagnosticos()
+                metrics.contar_diagnostico("streamlit", sintomas_selecionados, diagnósticos)
+
+                # Resumo do hardware vem do cache compartilhado, sem nova coleta
+                sysinfo = _hardware_compartilhado()
+
+                # Monta payload de log
+                log_payload = montar_log_payload(
+                    sintomas_selecionados, descricao_extra, diagnósticos, regras.versao, sysinfo, extraidos
+                )
+
+                registrar_historico(log_payload)
+
+                # Tenta salvar no S3 (se configurado)
+                try:
+                    salvar_log_s3(log_payload)
+                    log_status = "Log enfileirado para envio ao S3 (se configurado corretamente)."
+                except Exception as e:
+                    log_status = f"Não foi possível salvar log no S3: {e}"
+
+                st.success("Diagnóstico realizado com sucesso!")
+                if extraidos:
+                    st.caption(
+                        "Identificados na descrição: " + ", ".join(regras.symptom_labels.get(s, s) for s in extraidos)
+                    )
+                st.subheader("Diagnósticos Sugeridos")
+                for diag in diagnósticos:
+                    st.markdown(
+                        f"<div class='diagnostic-card'>💡 <strong>{html.escape(diag['diagnostico'])}</strong><br>"
+                        f"{html.escape(diag['causa_provavel'])}<br>{html.escape(diag['recomendacao'])}</div>",
+                        unsafe_allow_html=True,
+                    )
+
+                # Regras que casaram só em parte, da mais provável para a menos provável
+                ranking = regras.ranquear(sintomas_selecionados, parciais=True)
+                if ranking:
+                    st.subheader("Outras Possibilidades")
+                    for item in ranking:
+                        st.markdown(
+                            f"<div class='diagnostic-card'>🔎 <strong>{html.escape(item['diagnostico'])}</strong> "
+                            f"({item['cobertura']:.0%} dos sinais)<br>"
+                            f"Também observou? {html.escape(', '.join(item['rotulos_faltando']))}<br>"
+                            f"{html.escape(item['recomendacao'])}</div>",
+                            unsafe_allow_html=True,
+                        )
+
+                st.markdown("---")
+                st.write(log_status)
+
+    if st.button("🔄 Atualizar Dados"):
+        # Força uma nova leitura do hardware para todas as sessões
+        _hardware_compartilhado.clear()
+        st.rerun()
+
+    # Seção de Hardware do Servidor (Oculta por padrão)
+    _fragmento(STREAMLIT_REFRESH_SECONDS)(painel_hardware)()
+
+    st.markdown("---")
+
+
+if __name__ == "__main__":
+    # O Streamlit executa o script como __main__; importado, o módulo não desenha nada
+    main()
@@ -0,0 +1,118 @@
+# symptom_extractor.py
+# Extração de sintomas do texto livre (descricao_extra) por dicionário de sinônimos
+
+import os
+import string
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+# Textos maiores são truncados antes da extração
+SYMPTOM_EXTRACT_MAX_CHARS = int(os.getenv("SYMPTOM_EXTRACT_MAX_CHARS", "65536"))
+
+# Palavras que negam o sintoma logo em seguida ("não está esquentando", "nem trava")
+NEGACOES = frozenset({"nao", "nem", "nunca", "jamais", "sem"})
+# Palavras que podem ficar entre a negação e o sintoma sem desfazer a negação
+_LIGACOES = frozenset(
+    {"esta", "estava", "esteve", "fica", "ficou", "anda", "tem", "teve", "apresenta", "apresentou", "mais"}
+)
+_JANELA_NEGACAO = 3
+
+# Pontuação e controles ASCII viram espaço (mais rápido que uma expressão regular)
+_SEPARADORES = str.maketrans({c: " " for c in map(chr, range(128)) if c not in string.ascii_letters + string.digits})
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas e sem acentos ("Memória" -> "memoria")."""
+    return unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii").lower()
+
+
+def tokenizar(texto: str) -> List[str]:
+    """Palavras normalizadas; pontuação e símbolos ("100%", "tela-preta") viram separadores."""
+    return normalizar(texto).translate(_SEPARADORES).split()
+
+
+class SymptomExtractor:
+    """
+    Autômato de Aho-Corasick sobre palavras: cada sinônimo é uma sequência de palavras
+    normalizadas, e o texto é percorrido uma única vez, palavra a palavra, encontrando
+    todos os sinônimos (inclusive sobrepostos) sem voltar atrás. Trabalhar por palavra
+    garante que "trava" não case dentro de "destrava" e reduz os passos a cerca de um
+    sexto de um autômato por caractere.
+    Imutável depois de construído; o RuleSnapshot monta um por versão da base.
+    """
+
+    def __init__(self, sinonimos: Mapping[str, Iterable[str]]) -> None:
+        # Nó 0 é a raiz; `_saidas[no]` são os (código, palavras do sinônimo) que terminam no nó
+        self._transicoes: List[Dict[str, int]] = [{}]
+        self._saidas: List[Tuple[Tuple[str, int], ...]] = [()]
+        self.termos = 0
+        for codigo, termos in sinonimos.items():
+            for termo in termos:
+                palavras = tokenizar(termo)
+                if not palavras:
+                    continue
+                no = 0
+                for palavra in palavras:
+                    proximo = self._transicoes[no].get(palavra)
+                    if proximo is None:
+                        proximo = len(self._transicoes)
+                        self._transicoes[no][palavra] = proximo
+                        self._transicoes.append({})
+                        self._saidas.append(())
+                    no = proximo
+                if (codigo, len(palavras)) not in self._saidas[no]:
+                    self._saidas[no] += ((codigo, len(palavras)),)
+                    self.termos += 1
+
+        # Links de falha em largura: o maior sufixo do caminho que também é prefixo de algum sinônimo
+        self._falhas = [0] * len(self._transicoes)
+        fila = deque(self._transicoes[0].values())
+        while fila:
+            no = fila.popleft()
+            for palavra, filho in self._transicoes[no].items():
+                fila.append(filho)
+                falha = self._falhas[no]
+                while falha and palavra not in self._transicoes[falha]:
+                    falha = self._falhas[falha]
+                self._falhas[filho] = self._transicoes[falha].get(palavra, 0)
+                # Sinônimos que terminam no sufixo também terminam aqui
+                self._saidas[filho] += self._saidas[self._falhas[filho]]
+
+    def __len__(self) -> int:
+        return self.termos
+
+    @staticmethod
+    def _negado(palavras: List[str], inicio: int) -> bool:
+        for posicao in range(inicio - 1, max(-1, inicio - 1 - _JANELA_NEGACAO), -1):
+            if palavras[posicao] in NEGACOES:
+                return True
+            if palavras[posicao] not in _LIGACOES:
+                return False
+        return False
+
+    def extrair(self, texto: str) -> List[str]:
+        """Códigos dos sintomas citados no texto, na ordem da primeira menção afirmativa."""
+        if not texto or not self.termos:
+            return []
+        palavras = tokenizar(texto[:SYMPTOM_EXTRACT_MAX_CHARS])
+        transicoes, falhas, saidas = self._transicoes, self._falhas, self._saidas
+        raiz = transicoes[0]
+        encontrados: Dict[str, None] = {}
+        no = 0
+        for posicao, palavra in enumerate(palavras):
+            if not no:
+                # Caso comum: fora de qualquer sinônimo, só a palavra inicial interessa
+                no = raiz.get(palavra, 0)
+                if not no:
+                    continue
+            else:
+                proximo = transicoes[no].get(palavra)
+                while proximo is None and no:
+                    no = falhas[no]
+                    proximo = transicoes[no].get(palavra)
+                no = proximo or 0
+            for codigo, tamanho in saidas[no]:
+                if codigo not in encontrados and not self._negado(palavras, posicao - tamanho + 1):
+                    encontrados[codigo] = None
+        return list(encontrados)
@@ -0,0 +1,7 @@
+# tests/conftest.py
+# Os módulos da aplicação ficam na raiz do projeto (mesmo esquema de benchmarks/)
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
@@ -0,0 +1,167 @@
+# tests/test_log_analytics.py
+# Análise incremental dos logs (log_analytics.py) sobre o S3 falso: agregação, manifesto e CLI
+
+import datetime
+import gzip
+import json
+
+import pytest
+
+from fake_s3 import FakeS3Client
+from log_analytics import LogAnalytics, ler_registros, main
+from log_keys import montar_chave_log, particao
+
+BUCKET = "logs-teste"
+# Relógio fixo: partições até 09h de 17/10 estão fechadas (ANALYTICS_CLOSE_HOURS = 2)
+AGORA = datetime.datetime(2026, 10, 17, 12, 0)
+
+
+def _registro(momento: datetime.datetime, host: str, sintomas, diagnosticos) -> dict:
+    return {
+        "timestamp_utc": momento.isoformat() + "Z",
+        "sintomas": list(sintomas),
+        "descricao_extra": "",
+        "diagnosticos": [{"diagnostico": d, "causa_provavel": "", "recomendacao": ""} for d in diagnosticos],
+        "versao_regras": "teste",
+        "resumo_hardware": {"hostname": host},
+    }
+
+
+def _gravar_lote(cliente: FakeS3Client, registros, comprimir: bool = True) -> str:
+    """Grava um lote no formato do log_shipper (NDJSON, gzip opcional) na partição do primeiro registro."""
+    primeiro = registros[0]
+    momento = datetime.datetime.fromisoformat(primeiro["timestamp_utc"].rstrip("Z"))
+    corpo = b"".join(json.dumps(r, ensure_ascii=False).encode("utf-8") + b"\n" for r in registros)
+    extras = {}
+    if comprimir:
+        corpo = gzip.compress(corpo)
+        extras["ContentEncoding"] = "gzip"
+    chave = montar_chave_log(
+        particao(momento, primeiro["resumo_hardware"]["hostname"]), "ndjson.gz" if comprimir else "ndjson"
+    )
+    cliente.put_object(Bucket=BUCKET, Key=chave, Body=corpo, **extras)
+    return chave
+
+
+@pytest.fixture
+def cliente():
+    cliente = FakeS3Client()
+    _gravar_lote(cliente, [
+        _registro(datetime.datetime(2026, 10, 16, 8, 5), "web-1", ["lento", "pouca_memoria"], ["Memória"]),
+        _registro(datetime.datetime(2026, 10, 16, 8, 40), "web-1", ["lento"], []),
+    ])
+    _gravar_lote(cliente, [
+        _registro(datetime.datetime(2026, 10, 17, 3, 0), "web-2", ["superaquecendo", "superaquecendo"], ["Térmico"]),
+    ], comprimir=False)
+    # Hora ainda aberta (depois do corte de fechamento)
+    _gravar_lote(cliente, [_registro(datetime.datetime(2026, 10, 17, 11, 30), "web-2", ["lento"], ["Disco"])])
+    return cliente
+
+
+def _analise(cliente: FakeS3Client, manifesto=None, **kwargs) -> LogAnalytics:
+    return LogAnalytics(cliente, BUCKET, workers=2, manifesto=manifesto, agora=lambda: AGORA, **kwargs)
+
+
+def test_agrega_por_sintoma_diagnostico_host_e_dia(cliente):
+    agregado = _analise(cliente).executar()
+
+    assert (agregado.objetos, agregado.registros, agregado.erros) == (3, 4, 0)
+    assert agregado.por_sintoma == {"lento": 3, "pouca_memoria": 1, "superaquecendo": 1}
+    assert agregado.por_diagnostico == {"Memória": 1, "Térmico": 1, "Disco": 1}
+    assert agregado.por_host == {"web-1": 2, "web-2": 2}
+    assert agregado.por_periodo == {"2026-10-16": 2, "2026-10-17": 2}
+    dados = agregado.para_dict()
+    assert dados["por_host_periodo_sintoma"]["web-2"]["2026-10-17"] == {"superaquecendo": 1, "lento": 1}
+
+
+def test_granularidade_por_hora(cliente):
+    agregado = _analise(cliente, granularidade="hora").executar()
+    assert agregado.por_periodo == {"2026-10-16T08": 2, "2026-10-17T03": 1, "2026-10-17T11": 1}
+
+
+def test_desde_lista_so_os_dias_pedidos(cliente):
+    agregado = _analise(cliente).executar(desde=datetime.date(2026, 10, 17))
+    assert (agregado.objetos, agregado.registros) == (2, 2)
+    assert set(agregado.por_periodo) == {"2026-10-17"}
+
+
+def test_manifesto_processa_so_os_objetos_novos(cliente, tmp_path):
+    caminho = str(tmp_path / "manifesto.json")
+    primeira = _analise(cliente, caminho).executar()
+    assert primeira.objetos == 3
+
+    salvo = json.loads(open(caminho, encoding="utf-8").read())
+    # Partições fechadas ficam atrás da marca; só a hora aberta continua em `processados`
+    assert salvo["marca"] == "logs/dt=2026-10-17/hour=09/~"
+    assert len(salvo["processados"]) == 1 and "/hour=11/" in salvo["processados"][0]
+
+    nova = _gravar_lote(cliente, [_registro(datetime.datetime(2026, 10, 17, 11, 45), "web-3", ["lento"], [])])
+    analise = _analise(cliente, caminho)
+    segunda = analise.executar()
+    assert (segunda.objetos, segunda.registros) == (1, 1)
+    assert segunda.por_host == {"web-3": 1}
+    assert nova in analise.manifesto.processados
+
+    acumulado = analise.manifesto.agregado
+    assert (acumulado.objetos, acumulado.registros) == (4, 5)
+    assert acumulado.por_sintoma["lento"] == 4
+
+    # Sem nada novo, a execução seguinte não lê nenhum objeto
+    assert _analise(cliente, caminho).executar().objetos == 0
+
+
+def test_manifesto_com_outra_granularidade_e_recusado(cliente, tmp_path):
+    caminho = str(tmp_path / "manifesto.json")
+    _analise(cliente, caminho).executar()
+    with pytest.raises(ValueError):
+        _analise(cliente, caminho, granularidade="hora")
+
+
+def test_objeto_corrompido_conta_erro_e_nao_avanca_a_marca(cliente, tmp_path):
+    caminho = str(tmp_path / "manifesto.json")
+    cliente.put_object(
+        Bucket=BUCKET,
+        Key="logs/dt=2026-10-16/hour=09/host=web-1/diagnostico_01ZZZZZZZZZZZZZZZZZZZZZZZZ.ndjson.gz",
+        Body=b"nao e gzip",
+    )
+    analise = _analise(cliente, caminho)
+    agregado = analise.executar()
+    assert agregado.erros == 1 and agregado.registros == 4
+    assert analise.manifesto.marca is None
+    # O objeto com erro é relido na próxima execução; os demais não
+    assert _analise(cliente, caminho).executar().objetos == 1
+
+
+def test_formato_antigo_um_json_por_objeto(cliente):
+    legado = _registro(datetime.datetime(2026, 10, 15, 10, 0), "antigo", ["nao_liga"], ["Fonte"])
+    cliente.put_object(
+        Bucket=BUCKET, Key="logs/diagnostico_20261015T100000Z.json", Body=json.dumps(legado, indent=2).encode()
+    )
+    agregado = _analise(cliente).executar()
+    assert agregado.registros == 5
+    assert agregado.por_host["antigo"] == 1
+    assert agregado.por_periodo["2026-10-15"] == 1
+
+
+def test_ler_registros_ndjson_gzip():
+    registros = [{"a": 1}, {"b": "ç"}]
+    corpo = gzip.compress(b"\n".join(json.dumps(r, ensure_ascii=False).encode("utf-8") for r in registros) + b"\n\n")
+    cliente = FakeS3Client()
+    cliente.put_object(Bucket=BUCKET, Key="x.ndjson.gz", Body=corpo)
+    assert list(ler_registros("x.ndjson.gz", cliente.get_object(Bucket=BUCKET, Key="x.ndjson.gz"))) == registros
+
+
+def test_cli_com_s3_falso_em_disco(tmp_path, capsys):
+    cliente = FakeS3Client(diretorio=str(tmp_path / "s3"))
+    _gravar_lote(cliente, [_registro(datetime.datetime(2026, 10, 16, 8, 5), "web-1", ["lento"], ["Memória"])])
+    relatorio = tmp_path / "relatorio.json"
+
+    codigo = main([
+        "--fake-s3", str(tmp_path / "s3"), "--bucket", BUCKET, "--workers", "2",
+        "--manifesto", str(tmp_path / "manifesto.json"), "--json", str(relatorio),
+    ])
+    assert codigo == 0
+    assert "objetos novos: 1 (1 registros, 0 erros)" in capsys.readouterr().out
+    dados = json.loads(relatorio.read_text(encoding="utf-8"))
+    assert dados["por_sintoma"] == {"lento": 1}
+    assert dados["por_diagnostico"] == {"Memória": 1}
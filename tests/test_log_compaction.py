@@ -0,0 +1,171 @@
+# tests/test_log_compaction.py
+# Compactação dos logs (log_compaction.py) sobre o S3 falso: conversão, verificação, retomada e descarte
+
+import datetime
+import gzip
+import json
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from fake_s3 import FakeS3Client
+from log_analytics import LogAnalytics
+from log_compaction import (
+    COMPACTION_EXPIRE_TAG, LogCompaction, ler_tabela, linha_do_registro, registros_da_tabela, serializar,
+)
+from log_keys import montar_chave_log, particao
+
+BUCKET = "logs-teste"
+# Relógio fixo: horas até 05h de 17/10 estão encerradas (COMPACTION_CLOSE_HOURS = 6)
+AGORA = datetime.datetime(2026, 10, 17, 12, 0)
+
+
+def _registro(momento: datetime.datetime, host: str, sintomas, diagnosticos) -> dict:
+    return {
+        "timestamp_utc": momento.isoformat() + "Z",
+        "sintomas": list(sintomas),
+        "descricao_extra": "",
+        "diagnosticos": [{"diagnostico": d, "causa_provavel": "c", "recomendacao": "r"} for d in diagnosticos],
+        "versao_regras": "teste",
+        "resumo_hardware": {"hostname": host},
+    }
+
+
+def _gravar_lote(cliente: FakeS3Client, registros) -> str:
+    primeiro = registros[0]
+    momento = datetime.datetime.fromisoformat(primeiro["timestamp_utc"].rstrip("Z"))
+    corpo = gzip.compress(b"".join(json.dumps(r, ensure_ascii=False).encode("utf-8") + b"\n" for r in registros))
+    chave = montar_chave_log(particao(momento, primeiro["resumo_hardware"]["hostname"]))
+    cliente.put_object(Bucket=BUCKET, Key=chave, Body=corpo, ContentEncoding="gzip")
+    return chave
+
+
+def _chaves(cliente: FakeS3Client, prefixo: str) -> list:
+    return [o["Key"] for o in cliente.list_objects_v2(Bucket=BUCKET, Prefix=prefixo).get("Contents", [])]
+
+
+@pytest.fixture
+def cliente():
+    cliente = FakeS3Client()
+    _gravar_lote(cliente, [
+        _registro(datetime.datetime(2026, 10, 16, 8, 5), "web-1", ["lento", "pouca_memoria"], ["Memória"]),
+        _registro(datetime.datetime(2026, 10, 16, 8, 40), "web-1", ["lento"], []),
+    ])
+    _gravar_lote(cliente, [_registro(datetime.datetime(2026, 10, 16, 8, 10), "web-2", ["superaquecendo"], ["Térmico"])])
+    # Hora ainda aberta: fica de fora
+    _gravar_lote(cliente, [_registro(datetime.datetime(2026, 10, 17, 11, 30), "web-2", ["lento"], ["Disco"])])
+    return cliente
+
+
+def _job(cliente: FakeS3Client, **kwargs) -> LogCompaction:
+    return LogCompaction(cliente, BUCKET, workers=4, agora=AGORA, **kwargs)
+
+
+@pytest.mark.parametrize("formato", ["parquet", "arrow"])
+def test_linha_e_registro_vao_e_voltam_sem_perda(formato):
+    registro = _registro(datetime.datetime(2026, 10, 16, 8, 5), "web-1", ["lento", "pouca_memoria"], ["Memória"])
+    registro["origem"] = "api"
+    registro["campo_novo"] = {"a": [1, 2]}
+    registro["resumo_hardware"].update({"platform": "Linux", "cpu_count": 8, "memory_usage_percent": 41.5, "gpu": "x"})
+    chave = f"arquivo.{formato}"
+
+    tabela = ler_tabela(serializar([linha_do_registro(registro, "logs/origem")], formato), chave)
+    assert tabela.column("objeto").to_pylist() == ["logs/origem"]
+    assert list(registros_da_tabela(tabela)) == [registro]
+
+
+def test_compacta_cada_hora_encerrada_num_arquivo_e_apaga_as_fontes(cliente):
+    aberta = _chaves(cliente, "logs/dt=2026-10-17/")
+    resumo = _job(cliente).executar()
+
+    assert [(p["particao"], p["fontes"], p["registros"]) for p in resumo["particoes"]] == [
+        ("dt=2026-10-16/hour=08", 2, 3)
+    ]
+    (arquivo,) = _chaves(cliente, "compactados/")
+    assert arquivo.startswith("compactados/v1/dt=2026-10-16/hour=08/") and arquivo.endswith(".parquet")
+    assert _chaves(cliente, "logs/") == aberta
+
+
+def test_mesma_hora_no_formato_antigo_e_hive_gera_um_arquivo(cliente):
+    legado = _registro(datetime.datetime(2026, 10, 16, 8, 30), "antigo", ["nao_liga"], ["Fonte"])
+    cliente.put_object(Bucket=BUCKET, Key="logs/diagnostico_20261016T083000Z.json", Body=json.dumps(legado).encode())
+
+    resumo = _job(cliente).executar()
+    assert [(p["particao"], p["fontes"], p["registros"]) for p in resumo["particoes"]] == [
+        ("dt=2026-10-16/hour=08", 3, 4)
+    ]
+    assert len(_chaves(cliente, "compactados/")) == 1
+
+
+def test_arquivo_que_nao_confere_mantem_as_fontes(cliente, monkeypatch):
+    fontes = _chaves(cliente, "logs/dt=2026-10-16/")
+    put_object = cliente.put_object
+
+    def put_truncado(**kwargs):
+        # O S3 guarda um arquivo com uma linha a menos do que foi montado
+        if kwargs["Key"].startswith("compactados/"):
+            tabela = ler_tabela(kwargs["Body"], kwargs["Key"])
+            kwargs["Body"] = serializar(tabela.slice(1).to_pylist(), "parquet")
+        return put_object(**kwargs)
+
+    monkeypatch.setattr(cliente, "put_object", put_truncado)
+    resumo = _job(cliente).executar()
+
+    assert resumo["erros"] == 1
+    assert "CompactionError" in resumo["particoes"][0]["erros"][0]
+    assert _chaves(cliente, "logs/dt=2026-10-16/") == fontes
+
+
+def test_execucao_interrompida_e_retomada_sem_duplicar(cliente, monkeypatch):
+    def falha(**kwargs):
+        raise RuntimeError("interrompido")
+
+    # Primeira execução grava o arquivo mas cai antes de apagar as fontes
+    monkeypatch.setattr(cliente, "delete_objects", falha)
+    assert _job(cliente).executar()["erros"] == 1
+    (arquivo,) = _chaves(cliente, "compactados/")
+    monkeypatch.undo()
+
+    resumo = _job(cliente).executar()
+    (hora,) = resumo["particoes"]
+    assert (hora["fontes"], hora["ja_compactadas"], hora["chave"], hora["erros"]) == (0, 2, None, [])
+    assert _chaves(cliente, "compactados/") == [arquivo]
+    assert _chaves(cliente, "logs/dt=2026-10-16/") == []
+
+
+def test_expirar_marca_as_fontes_com_a_tag(cliente):
+    fontes = _chaves(cliente, "logs/dt=2026-10-16/")
+    assert _job(cliente, acao="expirar").executar()["erros"] == 0
+
+    assert _chaves(cliente, "logs/dt=2026-10-16/") == fontes
+    for chave in fontes:
+        assert cliente.get_object_tagging(Bucket=BUCKET, Key=chave)["TagSet"] == [
+            {"Key": COMPACTION_EXPIRE_TAG, "Value": "1"}
+        ]
+    assert cliente.get_object_tagging(Bucket=BUCKET, Key=_chaves(cliente, "logs/dt=2026-10-17/")[0])["TagSet"] == []
+
+
+@pytest.mark.parametrize("acao", ["apagar", "manter"])
+def test_analise_le_as_horas_compactadas_uma_vez(cliente, tmp_path, acao):
+    caminho = str(tmp_path / "manifesto.json")
+    _job(cliente, acao=acao).executar()
+
+    analise = LogAnalytics(cliente, BUCKET, workers=2, manifesto=caminho, agora=lambda: AGORA)
+    agregado = analise.executar()
+    assert (agregado.registros, agregado.erros) == (4, 0)
+    assert agregado.por_host == {"web-1": 2, "web-2": 2}
+    assert agregado.por_sintoma["lento"] == 3
+
+    # A próxima execução relê o arquivo do dia da marca, mas não conta nada de novo
+    assert LogAnalytics(cliente, BUCKET, workers=2, manifesto=caminho, agora=lambda: AGORA).executar().registros == 0
+
+
+def test_analise_antes_e_depois_da_compactacao_nao_conta_duas_vezes(cliente, tmp_path):
+    caminho = str(tmp_path / "manifesto.json")
+    assert LogAnalytics(cliente, BUCKET, workers=2, manifesto=caminho, agora=lambda: AGORA).executar().registros == 4
+    _job(cliente).executar()
+
+    analise = LogAnalytics(cliente, BUCKET, workers=2, manifesto=caminho, agora=lambda: AGORA)
+    assert analise.executar().registros == 0
+    assert analise.manifesto.agregado.registros == 4
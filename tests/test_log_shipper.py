@@ -0,0 +1,199 @@
+# tests/test_log_shipper.py
+# Envio em lotes ao S3 (log_shipper.py) e esquema de chaves (log_keys.py), contra o S3 falso
+
+import gzip
+import json
+import re
+import threading
+import time
+
+import pytest
+
+from fake_s3 import FakeS3Client
+from log_keys import gerar_ulid, interpretar_chave, montar_chave_log, normalizar_host, particao_do_timestamp
+from log_shipper import S3LogShipper
+
+BUCKET = "logs-teste"
+_ULID = re.compile(r"^[0-9A-HJKMNP-TV-Z]{26}$")
+_CHAVE_LOTE = re.compile(
+    r"^logs/dt=\d{4}-\d{2}-\d{2}/hour=\d{2}/host=[A-Za-z0-9._-]+/diagnostico_[0-9A-HJKMNP-TV-Z]{26}\.ndjson(\.gz)?$"
+)
+
+
+def _payload(timestamp: str, sintomas=("lento",)) -> dict:
+    return {
+        "timestamp_utc": timestamp,
+        "sintomas": list(sintomas),
+        "descricao_extra": "ç e acentos",
+        "diagnosticos": [{"diagnostico": "Teste", "causa_provavel": "", "recomendacao": ""}],
+        "versao_regras": "teste",
+        "resumo_hardware": {"hostname": "web-1"},
+    }
+
+
+def _objetos(cliente: FakeS3Client) -> dict:
+    return {o["Key"]: o for o in cliente.list_objects_v2(Bucket=BUCKET)["Contents"]}
+
+
+def _linhas(cliente: FakeS3Client, chave: str) -> list:
+    resposta = cliente.get_object(Bucket=BUCKET, Key=chave)
+    corpo = resposta["Body"].read()
+    if resposta["ContentEncoding"] == "gzip":
+        corpo = gzip.decompress(corpo)
+    assert corpo.endswith(b"\n")
+    return [json.loads(linha) for linha in corpo.splitlines()]
+
+
+def _milissegundos(ulid: str) -> int:
+    valor = 0
+    for caractere in ulid[:10]:
+        valor = valor * 32 + "0123456789ABCDEFGHJKMNPQRSTVWXYZ".index(caractere)
+    return valor
+
+
+@pytest.fixture
+def cliente():
+    return FakeS3Client()
+
+
+def _shipper(cliente: FakeS3Client, **kwargs) -> S3LogShipper:
+    opcoes = {"client_factory": lambda: cliente, "host": "web 1/a", "max_idade_lote": 60, "backoff_base": 0}
+    opcoes.update(kwargs)
+    return S3LogShipper(BUCKET, **opcoes)
+
+
+# ---------------------------------------------------------------------- chaves
+def test_ulid_tem_26_caracteres_crockford_e_cresce_no_mesmo_milissegundo():
+    ids = [gerar_ulid(1_760_000_000_000) for _ in range(1000)]
+    assert all(_ULID.match(i) for i in ids)
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    # Os 10 primeiros caracteres codificam o milissegundo
+    assert len({i[:10] for i in ids}) == 1
+
+
+def test_ulid_codifica_o_milissegundo_e_nunca_volta_no_tempo():
+    agora = int(time.time() * 1000)
+    primeiro = gerar_ulid(agora)
+    segundo = gerar_ulid(agora + 1)
+    assert _milissegundos(segundo) == agora + 1
+    assert segundo > primeiro
+    # Relógio andando para trás: continua crescente, preso ao último milissegundo
+    atrasado = gerar_ulid(agora - 1000)
+    assert atrasado > segundo and _milissegundos(atrasado) == agora + 1
+
+
+def test_chave_usa_particao_hive_do_timestamp_e_host_normalizado():
+    particao = particao_do_timestamp("2026-10-17T03:59:59.123456Z", "web 1/a")
+    assert particao == "dt=2026-10-17/hour=03/host=web-1-a"
+    chave = montar_chave_log(particao)
+    assert _CHAVE_LOTE.match(chave)
+    partes = interpretar_chave(chave)
+    assert partes["prefixo"] == "logs"
+    assert (partes["dt"], partes["hour"], partes["host"]) == ("2026-10-17", "03", "web-1-a")
+    assert partes["nome"].endswith(".ndjson.gz")
+
+
+def test_timestamp_invalido_cai_na_hora_atual_e_host_vazio_vira_desconhecido():
+    assert re.match(r"^dt=\d{4}-\d{2}-\d{2}/hour=\d{2}/host=desconhecido$", particao_do_timestamp("lixo", ""))
+    assert normalizar_host("---") == "desconhecido"
+    assert interpretar_chave("logs/diagnostico_20261017T035008Z.json") is None
+
+
+# ---------------------------------------------------------------------- lotes
+def test_lote_gzip_ndjson_volta_igual_um_objeto_por_particao(cliente):
+    shipper = _shipper(cliente)
+    payloads = [_payload("2026-10-17T03:10:00Z"), _payload("2026-10-17T03:50:00Z"), _payload("2026-10-17T04:00:00Z")]
+    for payload in payloads:
+        assert shipper.enviar(payload)
+    assert shipper.flush(timeout=5)
+    shipper.shutdown()
+
+    objetos = _objetos(cliente)
+    assert len(objetos) == 2
+    assert all(_CHAVE_LOTE.match(chave) and chave.endswith(".gz") for chave in objetos)
+    por_hora = {interpretar_chave(chave)["hour"]: _linhas(cliente, chave) for chave in objetos}
+    assert por_hora == {"03": payloads[:2], "04": payloads[2:]}
+    assert {interpretar_chave(chave)["host"] for chave in objetos} == {"web-1-a"}
+
+    metricas = shipper.metricas()
+    assert metricas["lotes_enviados"] == 2
+    assert metricas["registros_enviados"] == 3
+    assert metricas["fila_atual"] == 0
+
+
+def test_sem_gzip_grava_ndjson_puro(cliente):
+    shipper = _shipper(cliente, comprimir=False)
+    payload = _payload("2026-10-17T03:10:00Z")
+    shipper.enviar(payload)
+    shipper.shutdown()
+
+    (chave,) = _objetos(cliente)
+    assert chave.endswith(".ndjson")
+    assert cliente.get_object(Bucket=BUCKET, Key=chave)["ContentEncoding"] is None
+    assert _linhas(cliente, chave) == [payload]
+
+
+def test_lote_cheio_e_enviado_sem_esperar_o_flush(cliente):
+    shipper = _shipper(cliente, max_lote=2)
+    for minuto in range(5):
+        shipper.enviar(_payload(f"2026-10-17T03:{minuto:02d}:00Z"))
+    shipper.shutdown()
+
+    chaves = sorted(_objetos(cliente))
+    assert [len(_linhas(cliente, chave)) for chave in chaves] == [2, 2, 1]
+    # ULIDs crescentes: a ordem das chaves é a ordem de envio
+    registros = [r["timestamp_utc"] for chave in chaves for r in _linhas(cliente, chave)]
+    assert registros == sorted(registros)
+
+
+def test_falhas_temporarias_sao_retentadas(cliente):
+    cliente.falhas_restantes = 2
+    shipper = _shipper(cliente)
+    shipper.enviar(_payload("2026-10-17T03:10:00Z"))
+    shipper.shutdown()
+
+    assert len(_objetos(cliente)) == 1
+    metricas = shipper.metricas()
+    assert metricas["retentativas"] == 2
+    assert metricas["lotes_perdidos"] == 0
+
+
+def test_lote_perdido_apos_esgotar_tentativas(cliente):
+    cliente.falhas_restantes = 10
+    shipper = _shipper(cliente, max_tentativas=3)
+    shipper.enviar(_payload("2026-10-17T03:10:00Z"))
+    shipper.shutdown()
+
+    assert _objetos(cliente) == {}
+    metricas = shipper.metricas()
+    assert metricas["lotes_perdidos"] == 1
+    assert metricas["registros_perdidos"] == 1
+    assert "SlowDown" in metricas["ultimo_erro"]
+
+
+def test_fila_cheia_descarta_sem_bloquear(cliente):
+    enviando, liberar = threading.Event(), threading.Event()
+    put_object = cliente.put_object
+
+    def put_lento(**kwargs):
+        enviando.set()
+        liberar.wait(5)
+        return put_object(**kwargs)
+
+    cliente.put_object = put_lento
+    shipper = _shipper(cliente, max_fila=1, max_lote=1)
+    assert shipper.enviar(_payload("2026-10-17T03:10:00Z"))
+    assert enviando.wait(5)
+    # O worker está preso no envio: um registro cabe na fila, o seguinte é descartado
+    assert shipper.enviar(_payload("2026-10-17T03:11:00Z"))
+    assert shipper.enviar(_payload("2026-10-17T03:12:00Z")) is False
+    assert shipper.metricas()["descartados_fila_cheia"] == 1
+    liberar.set()
+    shipper.shutdown()
+    assert len(_objetos(cliente)) == 2
+
+
+def test_sem_bucket_nao_enfileira(cliente):
+    shipper = S3LogShipper(None, client_factory=lambda: cliente)
+    assert shipper.enviar(_payload("2026-10-17T03:10:00Z")) is False
+    assert shipper.metricas()["enfileirados"] == 0
@@ -0,0 +1,198 @@
+# web_cache.py
+# Cache de páginas renderizadas, assets estáticos com hash de conteúdo e compressão de respostas
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import Flask, Response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "512"))
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "64"))
+
+# Assets referenciados com o hash correto nunca mudam naquela URL
+CACHE_IMUTAVEL = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+
+_TIPOS_COMPRIMIVEIS = (
+    "text/html",
+    "text/css",
+    "text/plain",
+    "text/csv",
+    "application/json",
+    "application/javascript",
+    "image/svg+xml",
+)
+
+
+def comprimir(dados: bytes, codificacao: str) -> bytes:
+    if codificacao == "br":
+        return brotli.compress(dados, quality=5)
+    return gzip.compress(dados, compresslevel=6)
+
+
+def codificacao_aceita() -> Optional[str]:
+    """Melhor codificação aceita pelo cliente (br, depois gzip) ou None."""
+    aceitas = request.accept_encodings
+    if brotli is not None and aceitas["br"]:
+        return "br"
+    if aceitas["gzip"]:
+        return "gzip"
+    return None
+
+
+class CompressedEntity:
+    """Corpo imutável com ETag e variantes comprimidas calculadas uma única vez."""
+
+    def __init__(self, corpo: bytes, mimetype: str, pre_comprimir: bool = False) -> None:
+        self.corpo = corpo
+        self.mimetype = mimetype
+        self.hash = hashlib.sha256(corpo).hexdigest()[:16]
+        self._variantes: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        if pre_comprimir:
+            for codificacao in ("gzip", "br") if brotli is not None else ("gzip",):
+                self.variante(codificacao)
+
+    def variante(self, codificacao: str) -> bytes:
+        dados = self._variantes.get(codificacao)
+        if dados is None:
+            with self._lock:
+                dados = self._variantes.get(codificacao)
+                if dados is None:
+                    dados = self._variantes[codificacao] = comprimir(self.corpo, codificacao)
+        return dados
+
+    def responder(self, cache_control: str) -> Response:
+        """Resposta negociada: 304 se o cliente já tem a variante, senão a melhor variante."""
+        codificacao = codificacao_aceita() if len(self.corpo) >= COMPRESSION_MIN_BYTES else None
+        # Cada codificação é outra sequência de bytes, então tem a sua própria ETag
+        etag = f"{self.hash}-{codificacao}" if codificacao else self.hash
+        if request.if_none_match.contains_weak(etag):
+            resposta = Response(status=304)
+        else:
+            corpo = self.variante(codificacao) if codificacao else self.corpo
+            resposta = Response(corpo, mimetype=self.mimetype)
+            if codificacao:
+                resposta.headers["Content-Encoding"] = codificacao
+        resposta.set_etag(etag)
+        resposta.headers["Cache-Control"] = cache_control
+        resposta.vary.add("Accept-Encoding")
+        return resposta
+
+
+class StaticAssets:
+    """
+    Lê os arquivos de `static/` uma vez, calcula o hash do conteúdo e prepara as
+    variantes gzip/brotli. `url_for('static', ...)` passa a incluir `?v=<hash>`, e
+    essas URLs são servidas com Cache-Control imutável.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        self.app = app
+        self.pasta = app.static_folder or ""
+        self._arquivos: Dict[str, CompressedEntity] = {}
+        self._lock = threading.Lock()
+        self._original: Callable[..., Response] = app.view_functions["static"]
+        app.view_functions["static"] = self.servir
+        app.url_defaults(self._adicionar_hash)
+
+    def _carregar(self, filename: str) -> Optional[CompressedEntity]:
+        entidade = self._arquivos.get(filename)
+        if entidade is not None:
+            return entidade
+        caminho = os.path.realpath(os.path.join(self.pasta, filename))
+        if not caminho.startswith(os.path.realpath(self.pasta) + os.sep) or not os.path.isfile(caminho):
+            return None
+        with open(caminho, "rb") as arquivo:
+            corpo = arquivo.read()
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        comprimivel = mimetype.startswith(_TIPOS_COMPRIMIVEIS)
+        entidade = CompressedEntity(corpo, mimetype, pre_comprimir=comprimivel)
+        with self._lock:
+            self._arquivos[filename] = entidade
+        return entidade
+
+    def hash_de(self, filename: str) -> Optional[str]:
+        entidade = self._carregar(filename)
+        return entidade.hash if entidade else None
+
+    def _adicionar_hash(self, endpoint: str, values: Dict[str, str]) -> None:
+        if endpoint != "static" or "filename" not in values or "v" in values:
+            return
+        versao = self.hash_de(values["filename"])
+        if versao:
+            values["v"] = versao
+
+    def servir(self, filename: str) -> Response:
+        entidade = self._carregar(filename)
+        if entidade is None:
+            return self._original(filename=filename)
+        imutavel = request.args.get("v") == entidade.hash
+        return entidade.responder(CACHE_IMUTAVEL if imutavel else CACHE_REVALIDAR)
+
+
+class PageCache:
+    """LRU de páginas renderizadas, indexado por uma chave que cobre tudo que muda a página."""
+
+    def __init__(self, capacidade: int = PAGE_CACHE_SIZE) -> None:
+        self.capacidade = capacidade
+        self._itens: "OrderedDict[Tuple, CompressedEntity]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave: Tuple, renderizar: Callable[[], str]) -> CompressedEntity:
+        with self._lock:
+            entidade = self._itens.get(chave)
+            if entidade is not None:
+                self._itens.move_to_end(chave)
+                return entidade
+        entidade = CompressedEntity(renderizar().encode("utf-8"), "text/html", pre_comprimir=True)
+        with self._lock:
+            self._itens[chave] = entidade
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+        return entidade
+
+
+def comprimir_resposta(resposta: Response) -> Response:
+    """after_request: comprime respostas textuais dinâmicas conforme Accept-Encoding."""
+    if (
+        resposta.status_code < 200
+        or resposta.status_code in (204, 304)
+        or resposta.direct_passthrough
+        or resposta.is_streamed
+        or "Content-Encoding" in resposta.headers
+        or not (resposta.mimetype or "").startswith(_TIPOS_COMPRIMIVEIS)
+    ):
+        return resposta
+
+    resposta.vary.add("Accept-Encoding")
+    corpo = resposta.get_data()
+    if len(corpo) < COMPRESSION_MIN_BYTES:
+        return resposta
+    codificacao = codificacao_aceita()
+    if codificacao is None:
+        return resposta
+
+    resposta.set_data(comprimir(corpo, codificacao))
+    resposta.headers["Content-Encoding"] = codificacao
+    if resposta.headers.get("ETag") and not resposta.headers["ETag"].startswith("W/"):
+        # A representação comprimida é outra sequência de bytes
+        resposta.headers["ETag"] = "W/" + resposta.headers["ETag"]
+    return resposta
+
+
+def configurar(app: Flask) -> PageCache:
+    """Liga assets com hash, compressão das respostas e devolve o cache de páginas."""
+    app.extensions["static_assets"] = StaticAssets(app)
+    app.after_request(comprimir_resposta)
+    return PageCache()